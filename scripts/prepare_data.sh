@@ -6,31 +6,38 @@ cd "$ROOT_DIR"
 
 GROUP_ID="${GROUP_ID:-floor_id}"
 GROUP_SLUG="${GROUP_ID%_id}"
-RECENTERED_CSV="${RECENTERED_CSV:-data/processed/sdd_recentered/recentered_${GROUP_SLUG}_geometries.csv}"
+FORMAT="${FORMAT:-parquet}"
+# RECENTERED_CSV is the older name of RECENTERED and is still honored.
+RECENTERED="${RECENTERED:-${RECENTERED_CSV:-data/processed/sdd_recentered/recentered_${GROUP_SLUG}_geometries.${FORMAT}}}"
 START_ROW="${START_ROW:-0}"
 END_ROW="${END_ROW:-200}"
 PLOT_SAMPLE="${PLOT_SAMPLE:-true}"
 OUTLINE="${OUTLINE:-true}"
 RUN_BOUNDS="${RUN_BOUNDS:-true}"
 RUN_XRAY="${RUN_XRAY:-true}"
+FORCE="${FORCE:-false}"
+METRICS="${METRICS:-}"
 
-recenter_args=(--group-id "$GROUP_ID")
+# All stages run in one process (vssv1.pipeline); stages whose inputs and
+# parameters are unchanged since the last run are skipped.
+pipeline_args=(--group-id "$GROUP_ID" --recentered "$RECENTERED" --start-row "$START_ROW" --end-row "$END_ROW")
 if [ "$PLOT_SAMPLE" = "true" ]; then
-  recenter_args+=(--plot-sample)
+  pipeline_args+=(--plot-sample)
 fi
-
-renderer_args=(--recentered-csv "$RECENTERED_CSV" --start-row "$START_ROW" --end-row "$END_ROW")
 if [ "$OUTLINE" = "true" ]; then
-  renderer_args+=(--outline)
+  pipeline_args+=(--outline)
 fi
-
-python -m vssv1.recenter "${recenter_args[@]}"
-python -m vssv1.fp_renderer "${renderer_args[@]}"
-
-if [ "$RUN_BOUNDS" = "true" ]; then
-  python -m vssv1.boundaries --recentered-csv "$RECENTERED_CSV" --method percentile
-fi
-
 if [ "$RUN_XRAY" = "true" ]; then
-  python -m vssv1.init_outline --xray --contour
+  pipeline_args+=(--xray)
 fi
+if [ "$RUN_BOUNDS" != "true" ]; then
+  pipeline_args+=(--no-bounds)
+fi
+if [ "$FORCE" = "true" ]; then
+  pipeline_args+=(--force)
+fi
+if [ -n "$METRICS" ]; then
+  pipeline_args+=(--metrics "$METRICS")
+fi
+
+python -m vssv1.pipeline "${pipeline_args[@]}"
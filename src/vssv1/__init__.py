@@ -3,9 +3,20 @@
 __all__ = [
     "paths",
     "bookie",
+    "geostore",
     "recenter",
     "fp_renderer",
+    "maisonnette",
+    "raster",
+    "render_index",
     "boundaries",
+    "extents",
+    "splitter",
+    "pairs",
+    "mixer",
+    "pipeline",
+    "synthetic",
+    "incremental",
     "init_outline",
     "hochbauzeichner",
 ]
@@ -1,19 +1,19 @@
 from __future__ import annotations
 
+import csv
 import hashlib
 import os
 import time
 from pathlib import Path
 from typing import Iterable
 
-import cv2
-import pandas as pd
 from tqdm import tqdm
 
-try:
-    from line_profiler import LineProfiler
-except Exception:  # pragma: no cover - optional dependency
-    LineProfiler = None
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+shapely = lazy_import("shapely")
 
 
 def next_available_filename(directory: Path | str, base_filename: str, suffix: str = ".png") -> Path:
@@ -28,6 +28,38 @@ def next_available_filename(directory: Path | str, base_filename: str, suffix: s
         i += 1
 
 
+def id_text(value) -> str:
+    # Ids read back as float64 when the column has gaps; print 12.0 as 12.
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class ManifestWriter:
+    """Append rows to a CSV manifest, writing the header only for a new file."""
+
+    def __init__(self, path: Path | str, columns: list):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        new_file = not self.path.exists() or self.path.stat().st_size == 0
+        self._handle = open(self.path, "a", newline="")
+        self._writer = csv.writer(self._handle)
+        if new_file:
+            self._writer.writerow(columns)
+
+    def write(self, row) -> None:
+        self._writer.writerow([id_text(value) for value in row])
+
+    def close(self) -> None:
+        self._handle.close()
+
+    def __enter__(self) -> "ManifestWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
 def _extract_suffix_number(path: Path) -> int | None:
     stem = path.stem
     if "_" not in stem:
@@ -54,6 +86,8 @@ def get_latest_image(dir_path: Path | str) -> Path | None:
 
 
 def show_image(image, delay: int = 3, wait_time: int = 1000) -> None:
+    import cv2
+
     for i in range(delay, 0, -1):
         print(f"\npng will close in {i} seconds")
         cv2.imshow(str(i), image)
@@ -69,7 +103,12 @@ def show_plt(filename: Path | str, delay: int = 3) -> None:
         time.sleep(1)
 
 
-def read_csv_with_progress(filepath: Path | str, chunksize: int = 100, usecols: Iterable[str] | None = None) -> pd.DataFrame:
+def read_csv_with_progress(
+    filepath: Path | str,
+    chunksize: int = 100,
+    usecols: Iterable[str] | None = None,
+    dtype: dict | None = None,
+) -> pd.DataFrame:
     if usecols is None:
         usecols = [
             "site_id",
@@ -81,7 +120,7 @@ def read_csv_with_progress(filepath: Path | str, chunksize: int = 100, usecols:
         ]
 
     chunks = []
-    for chunk in tqdm(pd.read_csv(filepath, chunksize=chunksize, usecols=list(usecols))):
+    for chunk in tqdm(pd.read_csv(filepath, chunksize=chunksize, usecols=list(usecols), dtype=dtype)):
         chunks.append(chunk)
 
     return pd.concat(chunks, axis=0)
@@ -95,44 +134,54 @@ def read_avg_csv_with_progress(filepath: Path | str, chunksize: int = 100) -> pd
     )
 
 
-def do_profile(follow=None):
-    if follow is None:
-        follow = []
-
-    def inner(func):
-        def profiled_func(*args, **kwargs):
-            if LineProfiler is None:
-                raise RuntimeError("line_profiler is not installed. Install it to use profiling.")
-            profiler = LineProfiler()
-            profiler.add_function(func)
-            for f in follow:
-                profiler.add_function(f)
-            profiler.enable_by_count()
-            try:
-                return func(*args, **kwargs)
-            finally:
-                profiler.print_stats()
-
-        return profiled_func
-
-    return inner
-
-
-def check_encountered_apartment_ids(
-    row_number: int,
-    apartment_id,
-    encountered_apartment_ids: list,
-    end_row_number: int,
-) -> bool:
-    if apartment_id in encountered_apartment_ids or pd.isna(apartment_id):
-        return True
-
-    encountered_apartment_ids.append(apartment_id)
-    print(f"\nfound apartment No. {len(encountered_apartment_ids)} @ row {row_number} of {end_row_number}")
-    return False
+def build_unit_index(df: pd.DataFrame, group_id: str):
+    # One entry per (site_id, group_id) unit in order of first appearance, with
+    # [start, stop) slices into unit_rows, the frame's row positions grouped by unit.
+    rows = np.flatnonzero(df[group_id].notna().to_numpy())
+    keys = df.iloc[rows][["site_id", group_id]]
+    codes = keys.groupby(["site_id", group_id], sort=False).ngroup().to_numpy()
+
+    order = np.argsort(codes, kind="stable")
+    unit_rows = rows[order]
+    counts = np.bincount(codes, minlength=codes.max() + 1 if len(codes) else 0)
+    stops = np.cumsum(counts)
+    starts = stops - counts
+
+    first_rows = unit_rows[starts]
+    units = pd.DataFrame(
+        {
+            "site_id": df["site_id"].to_numpy()[first_rows],
+            group_id: df[group_id].to_numpy()[first_rows],
+            "first_row": first_rows,
+            "start": starts,
+            "stop": stops,
+        }
+    )
+    return units, unit_rows
+
+
+def select_units(
+    units: pd.DataFrame,
+    start_row: int = 0,
+    end_row: int | None = None,
+    start_unit: int | None = None,
+    end_unit: int | None = None,
+) -> pd.DataFrame:
+    # Unit ordinals take precedence; otherwise keep units whose first row lies in
+    # the inclusive row range, so contiguous row ranges never share a unit.
+    if start_unit is not None or end_unit is not None:
+        stop = None if end_unit is None else end_unit + 1
+        return units.iloc[start_unit or 0 : stop]
+
+    first_rows = units["first_row"]
+    mask = first_rows >= start_row
+    if end_row is not None:
+        mask &= first_rows <= end_row
+    return units[mask]
 
 
 def get_unit_hash(unit_df: pd.DataFrame) -> str:
+    unit_df = unit_df.assign(recentered_geometry=unit_df["recentered_geometry"].map(str))
     sorted_df = unit_df.sort_values(by=["recentered_geometry", "entity_subtype"])
     combined_string = "".join([str(geom) for geom in sorted_df["recentered_geometry"]]) + "".join(
         [str(val) for val in sorted_df["entity_subtype"]]
@@ -141,6 +190,115 @@ def get_unit_hash(unit_df: pd.DataFrame) -> str:
     return hashlib.md5(combined_string.encode()).hexdigest()
 
 
+def get_unit_fingerprint(unit_df: pd.DataFrame, quantum: float = 1e-3) -> str:
+    # Canonical unit hash from coordinates snapped to a grid of `quantum` units
+    # (1 mm by default): rows are hashed individually and sorted, so row order
+    # and float noise below the grid do not change the fingerprint.
+    geometries = np.asarray(unit_df["recentered_geometry"].to_numpy(), dtype=object)
+    coords, coord_index = shapely.get_coordinates(geometries, return_index=True)
+    quantized = np.round(coords / quantum).astype("<i8")
+    bounds = np.searchsorted(coord_index, np.arange(len(geometries) + 1))
+    type_ids = shapely.get_type_id(geometries)
+    subtypes = unit_df["entity_subtype"].astype(str).to_numpy()
+
+    row_digests = sorted(
+        hashlib.blake2b(
+            f"{type_ids[i]}|{subtypes[i]}|".encode() + quantized[bounds[i] : bounds[i + 1]].tobytes(),
+            digest_size=16,
+        ).digest()
+        for i in range(len(geometries))
+    )
+    return hashlib.blake2b(b"".join(row_digests), digest_size=16).hexdigest()
+
+
+def unit_keys(units: pd.DataFrame, group_id: str) -> pd.DataFrame:
+    # Text keys for units, so ids read back as int64, float64 or str compare equal.
+    return pd.DataFrame(
+        {
+            "site_id": [id_text(value) for value in units["site_id"]],
+            group_id: [id_text(value) for value in units[group_id]],
+        }
+    )
+
+
+def unit_source_hashes(df: pd.DataFrame, group_id: str, columns, units=None, unit_rows=None) -> pd.DataFrame:
+    # Order-insensitive content hash per unit: row hashes of `columns` summed
+    # modulo 2**64, plus the row count. Geometry columns should hold WKT or WKB.
+    if units is None or unit_rows is None:
+        units, unit_rows = build_unit_index(df, group_id)
+    keys = unit_keys(units, group_id)
+    if len(units) == 0:
+        keys["source_hash"] = pd.Series(dtype=str)
+        return keys
+
+    row_hashes = pd.util.hash_pandas_object(df[list(columns)], index=False).to_numpy(np.uint64)
+    sums = np.add.reduceat(row_hashes[unit_rows], units["start"].to_numpy())
+    counts = (units["stop"] - units["start"]).to_numpy()
+    keys["source_hash"] = [f"{total:016x}-{count}" for total, count in zip(sums, counts)]
+    return keys
+
+
+def area_polygon_mask(unit_df: pd.DataFrame) -> np.ndarray:
+    geometries = np.asarray(unit_df["recentered_geometry"].to_numpy(), dtype=object)
+    mask = (unit_df["entity_type"] == "area").to_numpy() & (shapely.get_type_id(geometries) == 3)
+    mask[mask] = shapely.is_valid(geometries[mask])
+    return mask
+
+
+def area_polygons(unit_df: pd.DataFrame, mask: np.ndarray | None = None) -> np.ndarray:
+    # Valid single polygons of entity_type "area", reduced to their exterior ring
+    # like the renderer's original per-row check.
+    if mask is None:
+        mask = area_polygon_mask(unit_df)
+    geometries = np.asarray(unit_df["recentered_geometry"].to_numpy(), dtype=object)
+    return shapely.polygons(shapely.get_exterior_ring(geometries[mask]))
+
+
+def overlapping_pairs(polygons, threshold: float = 0.5, groups=None):
+    # Bulk version of is_significantly_overlapping: candidate pairs come from an
+    # STRtree, intersection areas are computed in one vectorized call. With
+    # `groups`, only pairs inside the same group count.
+    polygons = np.asarray(polygons, dtype=object)
+    if len(polygons) < 2:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    if groups is None:
+        left, right = shapely.STRtree(polygons).query(polygons, predicate="intersects")
+    else:
+        left, right = _group_candidates(polygons, np.asarray(groups))
+    keep = left < right
+    left, right = left[keep], right[keep]
+
+    areas = shapely.area(polygons)
+    intersection = shapely.area(shapely.intersection(polygons[left], polygons[right]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        significant = intersection / np.minimum(areas[left], areas[right]) > threshold
+    return left[significant], right[significant]
+
+
+def _group_candidates(polygons, groups):
+    # Recentered units all sit on the origin, so one tree over every polygon
+    # pairs nearly each of them with polygons of every other unit. Lay the
+    # groups' bounding boxes out on a grid of disjoint tiles first: the tree
+    # then only yields pairs inside a group, and their number grows with the
+    # units rather than with their square. Pairs whose boxes touch but whose
+    # polygons do not have zero intersection area and drop out later.
+    bounds = shapely.bounds(polygons)
+    codes, uniques = pd.factorize(groups)
+    stride = np.nanmax(bounds[:, 2:] - np.nanmin(bounds[:, :2], axis=0)) + 1.0
+    columns = int(np.ceil(np.sqrt(len(uniques))))
+    offsets = np.column_stack([codes % columns, codes // columns]) * stride
+    boxes = shapely.box(*(bounds + np.hstack([offsets, offsets])).T)
+    left, right = shapely.STRtree(boxes).query(boxes)
+    same = groups[left] == groups[right]
+    return left[same], right[same]
+
+
+def has_significant_overlap(polygons, threshold: float = 0.5) -> bool:
+    left, _right = overlapping_pairs(polygons, threshold)
+    return len(left) > 0
+
+
 def is_significantly_overlapping(polygon, polygons) -> bool:
     for existing_polygon in polygons:
         if polygon.intersects(existing_polygon):
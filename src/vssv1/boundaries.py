@@ -3,56 +3,245 @@ from __future__ import annotations
 import argparse
 from pathlib import Path
 
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import numpy as np
-from shapely import wkt
-from shapely.geometry import box
+from . import geostore, paths
+from .lazy import lazy_import
 
-from . import bookie, paths
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+shapely = lazy_import("shapely")
 
-# Bounding box helper for recentered geometries.
+# Bounding box helper for recentered geometries. matplotlib and geopandas are
+# only imported to draw the preview.
 
 
-def all_bounds(gdf: gpd.GeoDataFrame):
-    union_of_all = gdf["recentered_geometry"].unary_union
-    minx, miny, maxx, maxy = union_of_all.bounds
+def all_bounds(gdf: pd.DataFrame):
+    minx, miny, maxx, maxy = shapely.total_bounds(gdf["recentered_geometry"].to_numpy())
 
     print(f"Bounding Box: ({minx}, {miny}, {maxx}, {maxy})")
     return minx, miny, maxx, maxy
 
 
-def percentile_bounds(gdf: gpd.GeoDataFrame, percentile: int = 5):
-    all_x_coords = []
-    all_y_coords = []
+def union_bounds(boxes):
+    # Combine per-chunk (minx, miny, maxx, maxy) boxes like all_bounds on the whole set.
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    minx, miny = np.nanmin(boxes[:, :2], axis=0)
+    maxx, maxy = np.nanmax(boxes[:, 2:], axis=0)
 
-    for geom in gdf["recentered_geometry"]:
-        if geom.type == "Polygon":
-            x, y = geom.exterior.coords.xy
-            all_x_coords.extend(x)
-            all_y_coords.extend(y)
-        elif geom.type == "MultiPolygon":
-            for polygon in geom.geoms:
-                x, y = polygon.exterior.coords.xy
-                all_x_coords.extend(x)
-                all_y_coords.extend(y)
+    print(f"Bounding Box: ({minx}, {miny}, {maxx}, {maxy})")
+    return minx, miny, maxx, maxy
+
+
+def percentile_bounds(gdf: pd.DataFrame, percentile: int = 5):
+    return coordinate_percentile_bounds(geostore.exterior_coordinates(gdf["recentered_geometry"]), percentile)
 
-    minx = np.percentile(all_x_coords, percentile)
-    maxx = np.percentile(all_x_coords, 100 - percentile)
-    miny = np.percentile(all_y_coords, percentile)
-    maxy = np.percentile(all_y_coords, 100 - percentile)
+
+def coordinate_percentile_bounds(coords: np.ndarray, percentile: float = 5):
+    minx, maxx = np.percentile(coords[:, 0], [percentile, 100 - percentile])
+    miny, maxy = np.percentile(coords[:, 1], [percentile, 100 - percentile])
 
     print(f"Bounding Box (using percentiles): ({minx}, {miny}, {maxx}, {maxy})")
     return minx, miny, maxx, maxy
 
 
-def parse_args() -> argparse.Namespace:
+class CoordinateHistogram:
+    """Fixed-bin x/y histogram of exterior vertices.
+
+    Bins of width ``resolution`` span [-limit, limit]; the two outer bins
+    stretch to the observed minimum and maximum, so quantiles are exact to
+    within one bin. Histograms with the same grid merge by addition, which
+    makes shard results combine into the same bounds as a single pass.
+    """
+
+    def __init__(self, limit: float = 100.0, resolution: float = 0.01):
+        self.limit = float(limit)
+        self.resolution = float(resolution)
+        self.bins = int(round(2 * self.limit / self.resolution))
+        self.counts = np.zeros((2, self.bins + 2), dtype=np.int64)
+        self.low = np.full(2, np.inf)
+        self.high = np.full(2, -np.inf)
+
+    @property
+    def total(self) -> int:
+        return int(self.counts[0].sum())
+
+    def add(self, coords: np.ndarray) -> None:
+        if len(coords) == 0:
+            return
+        index = np.floor((coords + self.limit) / self.resolution).astype(np.int64) + 1
+        np.clip(index, 0, self.bins + 1, out=index)
+        for axis in range(2):
+            self.counts[axis] += np.bincount(index[:, axis], minlength=self.bins + 2)
+        self.low = np.minimum(self.low, coords.min(axis=0))
+        self.high = np.maximum(self.high, coords.max(axis=0))
+
+    def update(self, geometries) -> None:
+        self.add(geostore.exterior_coordinates(geometries))
+
+    def merge(self, other: "CoordinateHistogram") -> "CoordinateHistogram":
+        if (self.limit, self.resolution) != (other.limit, other.resolution):
+            raise ValueError(
+                f"cannot merge histograms with different grids: "
+                f"({self.limit}, {self.resolution}) vs ({other.limit}, {other.resolution})"
+            )
+        self.counts += other.counts
+        self.low = np.minimum(self.low, other.low)
+        self.high = np.maximum(self.high, other.high)
+        return self
+
+    def edges(self, axis: int) -> np.ndarray:
+        inner = -self.limit + self.resolution * np.arange(self.bins + 1)
+        return np.concatenate(([min(self.low[axis], -self.limit)], inner, [max(self.high[axis], self.limit)]))
+
+    def quantile(self, axis: int, q: float) -> float:
+        # Linear interpolation between order statistics like np.percentile,
+        # assuming vertices spread evenly inside their bin.
+        counts = self.counts[axis]
+        if counts.sum() == 0:
+            raise ValueError("empty histogram")
+        rank = (counts.sum() - 1) * q
+        cumulative = np.cumsum(counts)
+        index = int(np.searchsorted(cumulative, rank, side="right"))
+        before = cumulative[index] - counts[index]
+        edges = self.edges(axis)
+        fraction = (rank - before + 0.5) / counts[index]
+        value = edges[index] + fraction * (edges[index + 1] - edges[index])
+        return float(np.clip(value, self.low[axis], self.high[axis]))
+
+    def bounds(self, percentile: float = 5):
+        lower, upper = percentile / 100, 1 - percentile / 100
+        return (
+            self.quantile(0, lower),
+            self.quantile(1, lower),
+            self.quantile(0, upper),
+            self.quantile(1, upper),
+        )
+
+    def marginal(self, axis: int, bins: int = 200):
+        # Rebin the occupied span to roughly `bins` bars for plotting.
+        counts = self.counts[axis]
+        occupied = np.flatnonzero(counts)
+        if len(occupied) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(1)
+        first, last = occupied[0], occupied[-1] + 1
+        step = max(1, -(-(last - first) // bins))
+        starts = np.arange(first, last, step)
+        edges = self.edges(axis)
+        return np.add.reduceat(counts[first:last], starts - first), np.append(edges[starts], edges[last])
+
+    def save(self, path: Path | str) -> Path:
+        path = Path(path)
+        with path.open("wb") as handle:
+            np.savez(
+                handle,
+                grid=np.array([self.limit, self.resolution]),
+                counts=self.counts,
+                low=self.low,
+                high=self.high,
+            )
+        return path
+
+    @classmethod
+    def load(cls, path: Path | str) -> "CoordinateHistogram":
+        with np.load(path) as data:
+            histogram = cls(*data["grid"])
+            histogram.counts = data["counts"]
+            histogram.low = data["low"]
+            histogram.high = data["high"]
+        return histogram
+
+
+def stream_histogram(
+    path: Path | str,
+    limit: float = 100.0,
+    resolution: float = 0.01,
+    batch_size: int = 200_000,
+) -> CoordinateHistogram:
+    histogram = CoordinateHistogram(limit, resolution)
+    stream_pass(path, histogram, batch_size=batch_size)
+    return histogram
+
+
+def stream_percentile_bounds(path: Path | str, percentile: float = 5, **kwargs):
+    minx, miny, maxx, maxy = stream_histogram(path, **kwargs).bounds(percentile)
+    print(f"Bounding Box (using streamed percentiles): ({minx}, {miny}, {maxx}, {maxy})")
+    return minx, miny, maxx, maxy
+
+
+class DensityGrid:
+    """2D count grid of polygon outlines over [-limit, limit] squared.
+
+    Exterior rings are segmentized to the cell size before their vertices are
+    binned, so edges show up as continuous lines rather than corner dots.
+    """
+
+    def __init__(self, limit: float = 50.0, resolution: float = 0.05):
+        self.limit = float(limit)
+        self.resolution = float(resolution)
+        self.cells = int(round(2 * self.limit / self.resolution))
+        self.counts = np.zeros((self.cells, self.cells), dtype=np.int64)
+
+    def add(self, coords: np.ndarray) -> None:
+        index = np.floor((coords + self.limit) / self.resolution).astype(np.int64)
+        inside = ((index >= 0) & (index < self.cells)).all(axis=1)
+        flat = index[inside, 1] * self.cells + index[inside, 0]
+        self.counts += np.bincount(flat, minlength=self.cells * self.cells).reshape(self.cells, self.cells)
+
+    def update(self, geometries) -> None:
+        geometries = np.asarray(geometries, dtype=object)
+        polygonal = np.isin(shapely.get_type_id(geometries), (3, 6))
+        rings = shapely.get_exterior_ring(shapely.get_parts(geometries[polygonal]))
+        self.add(shapely.get_coordinates(shapely.segmentize(rings, self.resolution)))
+
+    def merge(self, other: "DensityGrid") -> "DensityGrid":
+        if (self.limit, self.resolution) != (other.limit, other.resolution):
+            raise ValueError("cannot merge density grids with different grids")
+        self.counts += other.counts
+        return self
+
+    def occupied_extent(self):
+        # (xmin, xmax, ymin, ymax) of the cells that received any count.
+        rows = np.flatnonzero(self.counts.any(axis=1))
+        cols = np.flatnonzero(self.counts.any(axis=0))
+        if len(rows) == 0:
+            return -self.limit, self.limit, -self.limit, self.limit
+        to_x = lambda cell: -self.limit + cell * self.resolution
+        return to_x(cols[0]), to_x(cols[-1] + 1), to_x(rows[0]), to_x(rows[-1] + 1)
+
+
+def geometry_batches(path: Path | str, df: pd.DataFrame | None = None, batch_size: int = 200_000):
+    # Recentered geometries in batches of at most batch_size rows, sliced from
+    # the frame in memory or read chunk by chunk from path.
+    if df is not None:
+        geometries = geostore.ensure_geometry(df["recentered_geometry"])
+        for start in range(0, len(geometries), batch_size):
+            yield geometries[start : start + batch_size]
+        return
+    for chunk in geostore.iter_geometry_chunks(path, columns=["recentered_geometry"], batch_size=batch_size):
+        yield chunk["recentered_geometry"].to_numpy()
+
+
+def stream_pass(
+    path: Path | str,
+    histogram: CoordinateHistogram,
+    density: DensityGrid | None = None,
+    batch_size: int = 200_000,
+) -> None:
+    # One chunked read feeding the vertex histogram and, optionally, the density grid.
+    for geometries in geometry_batches(path, batch_size=batch_size):
+        histogram.update(geometries)
+        if density is not None:
+            density.update(geometries)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Compute bounding box for recentered geometries.")
     parser.add_argument(
+        "--recentered",
         "--recentered-csv",
+        dest="recentered",
         type=Path,
-        default=paths.processed_sdd_dir() / "recentered_floor_geometries.csv",
-        help="CSV with recentered geometries.",
+        default=paths.default_recentered_path(),
+        help="Parquet or CSV with recentered geometries.",
     )
     parser.add_argument(
         "--method",
@@ -66,54 +255,156 @@ def parse_args() -> argparse.Namespace:
         default=5,
         help="Percentile for the percentile bounding box.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Single chunked pass into a fixed-bin histogram (constant memory, exact to one bin).",
+    )
+    parser.add_argument("--resolution", type=float, default=0.01, help="Histogram bin width for --stream.")
+    parser.add_argument("--limit", type=float, default=100.0, help="Histogram half-width for --stream.")
+    parser.add_argument("--batch-size", type=int, default=200_000, help="Rows read and binned per chunk.")
+    parser.add_argument("--save-histogram", type=Path, help="Write the streamed histogram to this .npz.")
+    parser.add_argument(
+        "--merge-histograms",
+        type=Path,
+        nargs="+",
+        help="Combine saved shard histograms instead of reading geometries.",
+    )
+    parser.add_argument(
+        "--view",
+        choices=["density", "geometries", "none"],
+        default="density",
+        help="Preview: rasterized outline density (default), one artist per geometry (loads every "
+        "geometry and needs geopandas), or none.",
+    )
+    parser.add_argument("--density-limit", type=float, default=50.0, help="Half-width of the density grid.")
+    parser.add_argument("--density-resolution", type=float, default=0.05, help="Density grid cell size.")
+    parser.add_argument("--output", type=Path, help="Save the preview to this file instead of showing it.")
+    return parser.parse_args(argv)
 
 
-def main() -> None:
-    args = parse_args()
+def plot_marginals(ax, histogram: CoordinateHistogram, bounds=None) -> None:
+    # Marginal vertex histograms on axes attached above and right of the map,
+    # which keeps the map's equal aspect intact.
+    from mpl_toolkits.axes_grid1 import make_axes_locatable
 
-    df = bookie.read_csv_with_progress(args.recentered_csv, usecols=["recentered_geometry"])
-    df["recentered_geometry"] = df["recentered_geometry"].apply(wkt.loads)
-    gdf = gpd.GeoDataFrame(df, geometry="recentered_geometry")
+    divider = make_axes_locatable(ax)
+    ax_xhist = divider.append_axes("top", size="20%", pad=0.1, sharex=ax)
+    ax_yhist = divider.append_axes("right", size="20%", pad=0.1, sharey=ax)
 
-    if args.method == "all":
-        minx, miny, maxx, maxy = all_bounds(gdf)
-    else:
-        minx, miny, maxx, maxy = percentile_bounds(gdf, percentile=args.percentile)
+    counts, edges = histogram.marginal(0)
+    ax_xhist.stairs(counts, edges, orientation="vertical", fill=True, alpha=0.4, color="blue")
+    counts, edges = histogram.marginal(1)
+    ax_yhist.stairs(counts, edges, orientation="horizontal", fill=True, alpha=0.4, color="green")
+
+    if bounds is not None:
+        minx, miny, maxx, maxy = bounds
+        for x in (minx, maxx):
+            ax_xhist.axvline(x, color="red", linewidth=1)
+        for y in (miny, maxy):
+            ax_yhist.axhline(y, color="red", linewidth=1)
+    ax_xhist.tick_params(labelbottom=False)
+    ax_yhist.tick_params(labelleft=False)
 
-    bounding_box_polygon = gpd.GeoSeries(
-        {"geometry": gpd.GeoDataFrame({"geometry": [box(minx, miny, maxx, maxy)]})["geometry"].unary_union}
+
+def plot_density(ax, density: DensityGrid) -> None:
+    xmin, xmax, ymin, ymax = density.occupied_extent()
+    to_cell = lambda value: int(round((value + density.limit) / density.resolution))
+    counts = density.counts[to_cell(ymin) : to_cell(ymax), to_cell(xmin) : to_cell(xmax)]
+    ax.imshow(
+        np.log1p(counts),
+        extent=(xmin, xmax, ymin, ymax),
+        origin="lower",
+        cmap="Greys",
+        interpolation="nearest",
     )
 
-    ax = gdf.plot(edgecolor="black", facecolor="none")
-    bounding_box_polygon.boundary.plot(ax=ax, color="red", linewidth=2)
-    ax.set_adjustable("box")
 
-    all_x_coords = []
-    all_y_coords = []
+def plot_bounds(ax, bounds) -> None:
+    from matplotlib.patches import Rectangle
+
+    minx, miny, maxx, maxy = bounds
+    ax.add_patch(Rectangle((minx, miny), maxx - minx, maxy - miny, edgecolor="red", facecolor="none", linewidth=2))
 
-    for geom in gdf["recentered_geometry"]:
-        if geom.type == "Polygon":
-            x, y = geom.exterior.coords.xy
-            all_x_coords.extend(x)
-            all_y_coords.extend(y)
-        elif geom.type == "MultiPolygon":
-            for polygon in geom.geoms:
-                x, y = polygon.exterior.coords.xy
-                all_x_coords.extend(x)
-                all_y_coords.extend(y)
 
-    ax_xhist = ax.twiny()
-    ax_yhist = ax.twinx()
+def run(args: argparse.Namespace, df: pd.DataFrame | None = None):
+    # Returns (minx, miny, maxx, maxy); df: recentered frame already in memory.
+    view = args.view
+    density = DensityGrid(args.density_limit, args.density_resolution) if view == "density" else None
 
-    ax_xhist.hist(all_x_coords, bins=200, orientation="vertical", alpha=0.4, color="blue")
-    ax_yhist.hist(all_y_coords, bins=200, orientation="horizontal", alpha=0.4, color="green")
+    if args.stream or args.merge_histograms:
+        if args.method == "all":
+            raise ValueError("--stream and --merge-histograms compute percentile bounds only")
+        if view == "geometries":
+            raise ValueError("--view geometries needs the full dataset in memory; drop --stream")
+        if args.merge_histograms:
+            histogram = CoordinateHistogram.load(args.merge_histograms[0])
+            for path in args.merge_histograms[1:]:
+                histogram.merge(CoordinateHistogram.load(path))
+            density = None
+        else:
+            histogram = CoordinateHistogram(args.limit, args.resolution)
+            stream_pass(args.recentered, histogram, density, args.batch_size)
+        if args.save_histogram:
+            print(f"histogram of {histogram.total} vertices saved to {histogram.save(args.save_histogram)}")
 
-    ax_xhist.set_ylim(ax.get_ylim())
-    ax_yhist.set_xlim(ax.get_xlim())
+        bounds = histogram.bounds(args.percentile)
+        print(f"Bounding Box (using streamed percentiles): {bounds}")
+        gdf = None
+    else:
+        # Same chunked pass as --stream, but the vertices (or the chunk boxes
+        # for --method all) are kept for exact bounds. Geometries are only
+        # kept for --view geometries.
+        histogram = CoordinateHistogram(args.limit, args.resolution)
+        coords, boxes, kept = [], [], []
+        for geometries in geometry_batches(args.recentered, df, args.batch_size):
+            batch_coords = geostore.exterior_coordinates(geometries)
+            histogram.add(batch_coords)
+            if density is not None:
+                density.update(geometries)
+            if args.method == "all":
+                boxes.append(shapely.total_bounds(geometries))
+            else:
+                coords.append(batch_coords)
+            if view == "geometries":
+                kept.append(geometries)
 
-    plt.show()
+        if args.method == "all":
+            bounds = union_bounds(boxes)
+        else:
+            bounds = coordinate_percentile_bounds(np.concatenate(coords or [np.zeros((0, 2))]), args.percentile)
+        gdf = None
+        if view == "geometries":
+            import geopandas as gpd
 
+            gdf = gpd.GeoDataFrame({"recentered_geometry": np.concatenate(kept)}, geometry="recentered_geometry")
+
+    if view != "none":
+        import matplotlib.pyplot as plt
+
+        _fig, ax = plt.subplots()
+        if density is not None:
+            plot_density(ax, density)
+        elif gdf is not None:
+            gdf.plot(ax=ax, edgecolor="black", facecolor="none")
+        else:
+            ax.set_xlim(histogram.low[0], histogram.high[0])
+            ax.set_ylim(histogram.low[1], histogram.high[1])
+        plot_bounds(ax, bounds)
+        ax.set_aspect("equal", adjustable="box")
+        plot_marginals(ax, histogram, bounds)
+
+        if args.output:
+            plt.savefig(args.output, dpi=200, bbox_inches="tight")
+            plt.close()
+            print(f"preview saved to {args.output}")
+        else:
+            plt.show()
+    return bounds
+
+
+def main() -> None:
+    run(parse_args())
     print("goodbye")
 
 
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import argparse
+import importlib
+import sys
+
+# `vssv1 <command> [args]`: one entry point for the stage modules. Only the
+# chosen command's module is imported. Each module loads numpy, pandas,
+# shapely, pyarrow and cv2 on first use (vssv1.lazy) and imports optional
+# backends (matplotlib, geopandas, line_profiler) in the code paths that use
+# them, so `vssv1 <command> --help` imports nothing heavy and short jobs do
+# not pay for backends they skip.
+# tools/startup_benchmark.py guards both.
+
+COMMANDS = {
+    "synthetic": ("vssv1.synthetic", "Write a synthetic Swiss Dwellings-like geometries.csv."),
+    "recenter": ("vssv1.recenter", "Recenter Swiss Dwellings geometries."),
+    "render": ("vssv1.fp_renderer", "Render floorplan images from recentered geometries."),
+    "outline": ("vssv1.init_outline", "Generate outline and xray images from rendered floorplans."),
+    "extents": ("vssv1.extents", "Per-unit extents and the square covering a share of units."),
+    "bounds": ("vssv1.boundaries", "Compute bounding box for recentered geometries."),
+    "maisonnette": ("vssv1.maisonnette", "Flag units with significantly overlapping areas."),
+    "pipeline": ("vssv1.pipeline", "Run recenter -> render -> bounds -> outline in one process."),
+    "pairs": ("vssv1.pairs", "Create side-by-side pix2pix training pairs (input | target)."),
+    "split": ("vssv1.splitter", "Split images into train/test by a stable hash of their unit."),
+    "mix": ("vssv1.mixer", "Mix pair sources into a virtual hybrid dataset."),
+}
+
+
+def load_command(name: str):
+    return importlib.import_module(COMMANDS[name][0])
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    width = max(map(len, COMMANDS))
+    parser = argparse.ArgumentParser(
+        prog="vssv1",
+        description="VSSv1 floorplan preprocessing and rendering pipeline.",
+        epilog="commands:\n"
+        + "\n".join(f"  {name:<{width}}  {text}" for name, (_target, text) in COMMANDS.items())
+        + "\n\nRun `vssv1 COMMAND --help` for a command's options.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=COMMANDS, metavar="COMMAND", help="Stage to run (see below).")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments for the command.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    module = load_command(args.command)
+    # The stage modules parse sys.argv themselves; the program name keeps their
+    # usage lines reading `vssv1 <command> ...`.
+    sys.argv = [f"vssv1 {args.command}", *args.args]
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
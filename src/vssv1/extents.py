@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from . import bookie, geostore, paths
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Per-unit extent table: the largest |x| and |y| of each recentered unit's
+# exterior vertices. The smallest centered square that fully contains a given
+# share of units is a quantile of this table; it is cached next to the
+# recentered geometries so fp_renderer --extent auto can read it back.
+
+
+def unit_extents(df: pd.DataFrame, group_id: str, units=None, unit_rows=None) -> pd.DataFrame:
+    if units is None or unit_rows is None:
+        units, unit_rows = bookie.build_unit_index(df, group_id)
+
+    row_unit = np.full(len(df), -1, dtype=np.intp)
+    row_unit[unit_rows] = np.repeat(np.arange(len(units)), (units["stop"] - units["start"]).to_numpy())
+
+    coords, rows = geostore.exterior_coordinates(df["recentered_geometry"], return_index=True)
+    coord_unit = row_unit[rows]
+    keep = coord_unit >= 0
+    coord_unit = coord_unit[keep]
+    coords = np.abs(coords[keep])
+
+    max_x = np.full(len(units), -np.inf)
+    max_y = np.full(len(units), -np.inf)
+    np.maximum.at(max_x, coord_unit, coords[:, 0])
+    np.maximum.at(max_y, coord_unit, coords[:, 1])
+    vertices = np.bincount(coord_unit, minlength=len(units))
+
+    # Units without polygon vertices have no extent.
+    max_x[vertices == 0] = np.nan
+    max_y[vertices == 0] = np.nan
+    return pd.DataFrame(
+        {
+            "site_id": units["site_id"].to_numpy(),
+            group_id: units[group_id].to_numpy(),
+            "max_abs_x": max_x,
+            "max_abs_y": max_y,
+            "extent": np.fmax(max_x, max_y),
+            "vertices": vertices,
+        }
+    )
+
+
+def measure_extents(recentered: Path | str, group_id: str, batch_size: int = 200_000) -> pd.DataFrame:
+    # Chunked variant for stores that do not fit in memory; units split across
+    # chunks are combined afterwards.
+    columns = ["site_id", group_id, "recentered_geometry"]
+    tables = [
+        unit_extents(chunk, group_id)
+        for chunk in geostore.iter_geometry_chunks(recentered, columns=columns, batch_size=batch_size)
+    ]
+    if not tables:
+        return unit_extents(pd.DataFrame(columns=columns), group_id)
+    table = pd.concat(tables, ignore_index=True)
+    return table.groupby(["site_id", group_id], sort=False, as_index=False).agg(
+        max_abs_x=("max_abs_x", "max"),
+        max_abs_y=("max_abs_y", "max"),
+        extent=("extent", "max"),
+        vertices=("vertices", "sum"),
+    )
+
+
+def covering_extent(extents: pd.DataFrame, coverage: float = 0.95) -> float:
+    # Half-width of the smallest centered square that fully contains at least
+    # `coverage` of the units.
+    if not 0 < coverage <= 1:
+        raise ValueError(f"coverage must be in (0, 1], got {coverage}")
+    values = extents["extent"].dropna().to_numpy()
+    if len(values) == 0:
+        raise ValueError("no unit has polygon vertices")
+    return float(np.quantile(values, coverage, method="inverted_cdf"))
+
+
+def cache_path(recentered: Path | str, group_id: str) -> Path:
+    recentered = Path(recentered)
+    return recentered.with_name(f"{recentered.stem}.{group_id.replace('_id', '')}_extents.parquet")
+
+
+def load_or_measure(recentered: Path | str, group_id: str, df=None, units=None, unit_rows=None) -> pd.DataFrame:
+    # Cached extents are reused while they are newer than the recentered file.
+    path = cache_path(recentered, group_id)
+    if path.exists() and path.stat().st_mtime >= Path(recentered).stat().st_mtime:
+        return pd.read_parquet(path)
+
+    print("\nmeasuring unit extents...")
+    if df is None:
+        extents = measure_extents(recentered, group_id)
+    else:
+        extents = unit_extents(df, group_id, units=units, unit_rows=unit_rows)
+    extents.to_parquet(path, index=False)
+    print(f"\nextents of {len(extents)} units cached in {path}")
+    return extents
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Per-unit extents and the square covering a share of units.")
+    parser.add_argument(
+        "--recentered",
+        "--recentered-csv",
+        dest="recentered",
+        type=Path,
+        default=paths.default_recentered_path(),
+        help="Parquet or CSV with recentered geometries.",
+    )
+    parser.add_argument("--group-id", default="apartment_id", help="Group identifier column.")
+    parser.add_argument(
+        "--coverage",
+        type=float,
+        nargs="+",
+        default=[0.9, 0.95, 0.99],
+        help="Share(s) of units the square must fully contain.",
+    )
+    parser.add_argument("--batch-size", type=int, default=200_000, help="Rows per chunk.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    extents = measure_extents(args.recentered, args.group_id, batch_size=args.batch_size)
+    path = cache_path(args.recentered, args.group_id)
+    extents.to_parquet(path, index=False)
+    print(f"\nextents of {len(extents)} units cached in {path}")
+
+    for coverage in args.coverage:
+        extent = covering_extent(extents, coverage)
+        print(f"{coverage:.0%} of units fit in [-{extent:.3f}, {extent:.3f}] (side {2 * extent:.3f})")
+    print("goodbye")
+
+
+if __name__ == "__main__":
+    main()
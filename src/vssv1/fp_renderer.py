@@ -1,212 +1,714 @@
 from __future__ import annotations
 
 import argparse
+import csv
+import io
+import json
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-import matplotlib.pyplot as plt
-import numpy as np
-from matplotlib.patches import Polygon
-from shapely import wkt
-from shapely.geometry import Polygon as ShapelyPolygon
-
-from . import bookie, init_outline, paths
-
-try:
-    from line_profiler import LineProfiler
-except Exception:  # pragma: no cover - optional dependency
-    LineProfiler = None
-
-
-def _default_recentered_csv() -> Path:
-    candidates = [
-        paths.processed_sdd_dir() / "recentered_floor_geometries.csv",
-        paths.source_sdd_dir() / "recentered_floor_geometries.csv",
-    ]
-    for candidate in candidates:
-        if candidate.exists():
-            return candidate
-    return candidates[0]
-
-
-def render_floorplan(
-    row_number: int,
-    df,
-    encountered_ids: list,
-    generated_hashes: set,
-    end_row_number: int,
-    group_id: str,
+from . import bookie, extents, geostore, incremental, maisonnette, metrics, paths, raster
+from .lazy import lazy_import
+from .render_index import RenderIndex
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+shapely = lazy_import("shapely")
+
+# matplotlib, cv2 (raster backend, outlines) and line_profiler are imported
+# where they are used, so --help and runs that skip a backend stay cheap.
+
+
+RENDERED = "rendered"
+DUPLICATE = "duplicate"
+MAISONNETTE = "maisonnette"
+
+COLORS_BY_TYPE = {
+    "area": "white",
+    "separator": "black",
+    "opening": "white",
+    "feature": "gray",
+}
+COLORS_BY_SUBTYPE = {
+    "BATHROOM": "#D3D3D3",
+    "LIVING_ROOM": "#E8E8E8",
+    "BALCONY": "#DCDCDC",
+    "CORRIDOR": "#778899",
+    "ROOM": "#F5F5F5",
+    "BATHTUB": "#696969",
+    "SHOWER": "#696969",
+    "SINK": "#696969",
+    "TOILET": "#696969",
+    "KITCHEN": "#C0C0C0",
+    "RAILING": "dimgray",
+    "WINDOW": "gray",
+    "DOOR": "#D3D3D3",
+    "ENTRANCE_DOOR": "#D3D3D3",
+    "DINING": "#E8E8E8",
+    "SHAFT": "black",
+    "WALL": "#000000",
+    "STAIRCASE": "dimgray",
+    "STAIRS": "black",
+    "STOREROOM": "dimgray",
+    "COLUMN": "#000000",
+    "BASEMENT_COMPARTMENT": "#BC8F8F",
+}
+
+# Class ids of the --mask label maps (0 is background). Ids are part of the
+# output format: append new subtypes at the end and never reorder.
+MASK_CLASSES = (
+    "BACKGROUND",
+    "BATHROOM",
+    "LIVING_ROOM",
+    "BALCONY",
+    "CORRIDOR",
+    "ROOM",
+    "BATHTUB",
+    "SHOWER",
+    "SINK",
+    "TOILET",
+    "KITCHEN",
+    "RAILING",
+    "WINDOW",
+    "DOOR",
+    "ENTRANCE_DOOR",
+    "DINING",
+    "SHAFT",
+    "WALL",
+    "STAIRCASE",
+    "STAIRS",
+    "STOREROOM",
+    "COLUMN",
+    "BASEMENT_COMPARTMENT",
+)
+MASK_UNKNOWN = 255
+MASK_IDS = {subtype: class_id for class_id, subtype in enumerate(MASK_CLASSES)}
+
+
+def render_unit(
+    unit_df,
+    index: RenderIndex,
     color_by: str,
     extent: float,
     fig_size_in: float,
     dpi_value: int,
     write_outline: bool,
-) -> None:
-    curr_row = df.iloc[row_number]
-
-    site_id = curr_row["site_id"]
-    unit_id = curr_row[group_id]
-
-    if bookie.check_encountered_apartment_ids(row_number, unit_id, encountered_ids, end_row_number):
-        return
-
-    unit_df = df[(df["site_id"] == site_id) & (df[group_id] == unit_id)]
-    unit_hash = bookie.get_unit_hash(unit_df)
-
-    if unit_hash in generated_hashes:
-        print("\nalready drawn similar unit and not doing it again...")
-        return
-
-    generated_hashes.add(unit_hash)
-
+    group_id: str = "apartment_id",
+    hash_quantum: float = 1e-3,
+    maisonnette: bool | None = None,
+    maisonnette_threshold: float = maisonnette.THRESHOLD,
+    backend: str = "matplotlib",
+    size: int = 1200,
+    name: str | None = None,
+    write_xray: bool = False,
+    variants=(),
+    write_mask: bool = False,
+    rank: int | None = None,
+):
+    # variants: extra (color_by, size) renders of the same unit, written under
+    # the same name into paths.fp_variant_dir; they share parsing, hashing and
+    # the overlap check with the main render. size is ignored by matplotlib.
+    # write_mask (raster only) adds a class-index mask per size. rank (the unit
+    # ordinal) lets parallel workers settle duplicates like a serial run, see
+    # RenderIndex.claim.
+    metrics.begin_unit()
+    first_row = unit_df.iloc[0]
+    keys = {"site_id": first_row["site_id"], "unit_id": first_row.get(group_id)}
     unit_df = unit_df.copy()
-    unit_df.loc[:, "recentered_geometry"] = unit_df["recentered_geometry"].apply(wkt.loads)
-
-    fig, ax = plt.subplots(figsize=(fig_size_in, fig_size_in))
-    ax.set_xlim(-extent, extent)
-    ax.set_ylim(-extent, extent)
+    with metrics.step("parse"):
+        unit_df["recentered_geometry"] = geostore.ensure_geometry(unit_df["recentered_geometry"])
 
-    colors_by_type = {
-        "area": "white",
-        "separator": "black",
-        "opening": "white",
-        "feature": "gray",
-    }
-    colors_by_subtype = {
-        "BATHROOM": "#D3D3D3",
-        "LIVING_ROOM": "#E8E8E8",
-        "BALCONY": "#DCDCDC",
-        "CORRIDOR": "#778899",
-        "ROOM": "#F5F5F5",
-        "BATHTUB": "#696969",
-        "SHOWER": "#696969",
-        "SINK": "#696969",
-        "TOILET": "#696969",
-        "KITCHEN": "#C0C0C0",
-        "RAILING": "dimgray",
-        "WINDOW": "gray",
-        "DOOR": "#D3D3D3",
-        "ENTRANCE_DOOR": "#D3D3D3",
-        "DINING": "#E8E8E8",
-        "SHAFT": "black",
-        "WALL": "#000000",
-        "STAIRCASE": "dimgray",
-        "STAIRS": "black",
-        "STOREROOM": "dimgray",
-        "COLUMN": "#000000",
-        "BASEMENT_COMPARTMENT": "#BC8F8F",
-    }
-    colors = colors_by_subtype if color_by == "entity_subtype" else colors_by_type
-
-    area_polygons = []
-
-    for _, row in unit_df.iterrows():
-        geom = row["recentered_geometry"]
-        if geom.is_valid and geom.geom_type == "Polygon":
-            coords = np.array(geom.exterior.coords)
-            if len(coords) >= 2:
-                polygon = ShapelyPolygon(coords)
-                if row["entity_type"] == "area":
-                    if bookie.is_significantly_overlapping(polygon, area_polygons):
-                        print("\nMAISONNETTE ALARM: significant overlap detected. Skipping plot.")
-                        return
-                    area_polygons.append(polygon)
-
-    for i, row in unit_df.iterrows():
-        geom = row["recentered_geometry"]
-        color_key = row[color_by]
-        color = colors.get(color_key, "green")
-
-        if geom.is_valid and geom.geom_type == "Polygon":
-            coords = np.array(geom.exterior.coords)
-            if len(coords) >= 2:
-                patch = Polygon(coords, closed=True, edgecolor="black", facecolor=color, alpha=1)
-                ax.add_patch(patch)
-            else:
-                print(f"\nInvalid geometry for row {i}: {geom}")
-        else:
-            print(f"\nInvalid or non-polygon geometry for row {i}: {geom}")
-
-    ax.set_aspect("equal")
-    ax.axis("off")
+    with metrics.step("hash"):
+        unit_hash = bookie.get_unit_fingerprint(unit_df, quantum=hash_quantum)
+    if not index.claim(unit_hash, first_row["site_id"], first_row.get(group_id), rank):
+        print("\nalready drawn similar unit and not doing it again...")
+        metrics.end_unit(DUPLICATE, **keys)
+        return DUPLICATE, unit_hash, None
+
+    if maisonnette is None:
+        with metrics.step("overlap"):
+            maisonnette = bookie.has_significant_overlap(bookie.area_polygons(unit_df), maisonnette_threshold)
+    if maisonnette:
+        print("\nMAISONNETTE ALARM: significant overlap detected. Skipping plot.")
+        index.skip(unit_hash)
+        metrics.end_unit(MAISONNETTE, **keys)
+        return MAISONNETTE, unit_hash, None
 
     out_dir = paths.ensure_dir(paths.fp_complete_dir())
-    filename = bookie.next_available_filename(out_dir, "FP")
-    plt.savefig(filename, bbox_inches="tight", pad_inches=0, dpi=dpi_value)
-
-    if write_outline:
-        init_outline.get_contour()
+    if name is None:
+        filename = bookie.next_available_filename(out_dir, "FP")
+    else:
+        filename = out_dir / f"{name}.png"
+    targets = [filename] + [
+        paths.ensure_dir(paths.fp_variant_dir(variant_color_by, variant_size if backend == "raster" else None))
+        / filename.name
+        for variant_color_by, variant_size in variants
+    ]
+    if backend == "raster":
+        import cv2
+
+        specs = [(color_by, size)] + list(variants)
+        mask_sizes = list(dict.fromkeys(spec_size for _color_by, spec_size in specs)) if write_mask else []
+        with metrics.step("rasterize"):
+            images, masks = draw_raster_variants(unit_df, specs, extent, fig_size_in, mask_sizes)
+        for target, variant_image in zip(targets, images):
+            with metrics.step("encode"):
+                cv2.imwrite(str(target), variant_image)
+        for mask_size, mask in zip(mask_sizes, masks):
+            mask_dir = paths.ensure_dir(paths.fp_mask_dir(None if mask_size == size else mask_size))
+            with metrics.step("encode"):
+                cv2.imwrite(str(mask_dir / filename.name), mask)
+        image = images[0]
+    else:
+        image = None
+        palettes = [color_by] + [variant_color_by for variant_color_by, _size in variants]
+        for number, (target, variant_color_by) in enumerate(zip(targets, palettes)):
+            png = draw_matplotlib(
+                unit_df, palette(variant_color_by), variant_color_by, extent, fig_size_in, dpi_value,
+                report_invalid=number == 0,
+            )
+            with metrics.step("encode"):
+                target.write_bytes(png)
+            if number == 0 and (write_outline or write_xray):
+                import cv2
+
+                image = cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_COLOR)
+    index.finish(unit_hash, filename)
+
+    if write_outline or write_xray:
+        from . import init_outline
+
+        with metrics.step("outline"):
+            init_outline.write_variants(
+                image, init_outline.variant_suffix(filename), contour=write_outline, xray=write_xray
+            )
 
     print("\napartment successfully exported")
-
-
-def parse_args() -> argparse.Namespace:
+    metrics.end_unit(RENDERED, **keys, file=filename.name)
+    return RENDERED, unit_hash, filename
+
+
+def output_name(naming: str, ordinal: int, site_id, unit_id) -> str | None:
+    # Deterministic basenames let several processes write into one folder
+    # without probing for free FP_0001.png slots.
+    if naming == "ordinal":
+        return f"FP_{ordinal:06d}"
+    if naming == "unit":
+        return f"FP_{bookie.id_text(site_id)}_{bookie.id_text(unit_id)}"
+    return None
+
+
+def incremental_plan(df, units, unit_rows, selected, group_id: str, manifest_path: Path, index: RenderIndex):
+    # Diff per-unit content hashes of the recentered rows against the snapshot
+    # saved by the last incremental run. Outputs of deleted units, and of
+    # selected units that changed, are removed from disk, the render index and
+    # the manifest. Returns the mask of selected units to render and the
+    # snapshot to save once they are done.
+    content = df[["site_id", group_id, "entity_type", "entity_subtype"]].copy()
+    content["wkb"] = shapely.to_wkb(geostore.ensure_geometry(df["recentered_geometry"]))
+    current = bookie.unit_source_hashes(content, group_id, ["entity_type", "entity_subtype", "wkb"], units, unit_rows)
+
+    keys = ["site_id", group_id]
+    manifest = incremental.read_manifest(manifest_path)
+    snapshot_path = incremental.sources_path(manifest_path, group_id)
+    previous = incremental.load_sources(snapshot_path)
+    if previous is None and manifest is not None:
+        # First incremental run over an existing manifest: trust what is on disk.
+        previous = current.merge(manifest[keys].drop_duplicates(), on=keys)
+    diff = incremental.diff_units(current, previous, group_id)
+    if manifest is not None:
+        rendered = manifest[keys].drop_duplicates()
+        orphaned = rendered.merge(current[keys], on=keys, how="left", indicator=True)
+        orphaned = orphaned[orphaned["_merge"] == "left_only"][keys].assign(status=incremental.DELETED)
+        diff = pd.concat([diff[diff["status"] != incremental.DELETED], orphaned], ignore_index=True)
+    print(f"\nunits: {incremental.summary(diff)}")
+
+    selected_keys = bookie.unit_keys(selected, group_id)
+    status = selected_keys.merge(diff[keys + ["status"]], on=keys, how="left")["status"]
+    todo = status.isin([incremental.NEW, incremental.CHANGED]).to_numpy()
+
+    stale = diff.loc[diff["status"] == incremental.DELETED, keys]
+    stale = pd.concat([stale, selected_keys[(status == incremental.CHANGED).to_numpy()]], ignore_index=True)
+    if manifest is not None and len(stale):
+        flagged = manifest[keys].merge(stale.drop_duplicates().assign(stale=True), on=keys, how="left")
+        is_stale = flagged["stale"].notna().to_numpy()
+        removed = incremental.remove_render_outputs(manifest[is_stale], index)
+        incremental.rewrite_manifest(manifest_path, manifest[~is_stale])
+        print(f"\nremoved {removed} files of {int(is_stale.sum())} deleted or changed units")
+
+    # Units left for a later run keep their previous hash (or none), so they
+    # still show up as changed (or new) next time.
+    pending = diff[diff["status"].isin([incremental.NEW, incremental.CHANGED])][keys]
+    pending = pending.merge(selected_keys[todo], on=keys, how="left", indicator=True)
+    pending = pending[pending["_merge"] == "left_only"][keys]
+    snapshot = current.merge(pending.assign(pending=True), on=keys, how="left")
+    snapshot = snapshot[snapshot["pending"].isna()].drop(columns="pending")
+    if previous is not None:
+        held = previous.merge(pending, on=keys)
+        snapshot = pd.concat([snapshot, held], ignore_index=True)
+    return todo, snapshot, snapshot_path
+
+
+_WORKER = {}
+
+
+def _init_worker(df, unit_rows, index_path, render_kwargs, record_metrics: bool = False, owner=None) -> None:
+    index = RenderIndex(index_path, config=render_config(render_kwargs), owner=owner)
+    _WORKER.update(df=df, unit_rows=unit_rows, index=index, render_kwargs=render_kwargs)
+    metrics.activate(metrics.Recorder("render", enabled=record_metrics))
+
+
+def render_config(render_kwargs: dict) -> str:
+    # What the render index keys on besides the unit fingerprint: everything
+    # that changes which files a unit produces or what they look like.
+    config = {
+        "backend": render_kwargs["backend"],
+        "renders": [[render_kwargs["color_by"], render_kwargs["size"]], *map(list, render_kwargs.get("variants", ()))],
+        "extent": float(render_kwargs["extent"]),
+        "mask": bool(render_kwargs.get("write_mask")),
+    }
+    if render_kwargs["backend"] == "matplotlib":
+        config.update(fig_size=render_kwargs["fig_size_in"], dpi=render_kwargs["dpi_value"])
+        config["renders"] = [[color_by, None] for color_by, _size in config["renders"]]
+    threshold = render_kwargs.get("maisonnette_threshold", maisonnette.THRESHOLD)
+    if threshold != maisonnette.THRESHOLD:
+        # Decides which units are skipped; left out at the default so existing
+        # indexes stay valid.
+        config["maisonnette_threshold"] = float(threshold)
+    return json.dumps(config, sort_keys=True)
+
+
+def _render_task(task):
+    start, stop, flag, name, site_id, unit_id, ordinal = task
+    unit_df = _WORKER["df"].iloc[_WORKER["unit_rows"][start:stop]]
+    status, unit_hash, filename = render_unit(
+        unit_df, _WORKER["index"], maisonnette=flag, name=name, rank=ordinal, **_WORKER["render_kwargs"]
+    )
+    return status, unit_hash, filename, site_id, unit_id, metrics.active().drain()
+
+
+def _as_duplicate(recorded: dict | None, status: str) -> dict | None:
+    # Rewrite a worker's record of a unit that lost its fingerprint to a
+    # lower ordinal after it was drawn.
+    if recorded is None:
+        return None
+    counts = recorded["counts"]
+    counts[status] -= 1
+    counts[DUPLICATE] = counts.get(DUPLICATE, 0) + 1
+    for unit in recorded["units"]:
+        unit["status"] = DUPLICATE
+        unit.pop("file", None)
+    return recorded
+
+
+def draw_matplotlib(
+    unit_df,
+    colors: dict,
+    color_by: str,
+    extent: float,
+    fig_size_in: float,
+    dpi_value: int,
+    report_invalid: bool = True,
+) -> bytes:
+    # "rasterize" covers building the patches; matplotlib only rasterizes
+    # inside savefig, so "encode" includes the Agg draw.
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Polygon
+
+    with metrics.step("rasterize"):
+        fig, ax = plt.subplots(figsize=(fig_size_in, fig_size_in))
+        ax.set_xlim(-extent, extent)
+        ax.set_ylim(-extent, extent)
+
+        drawn = 0
+        for i, row in unit_df.iterrows():
+            geom = row["recentered_geometry"]
+            color_key = row[color_by]
+            color = colors.get(color_key, "green")
+
+            if geom.is_valid and geom.geom_type == "Polygon":
+                coords = np.array(geom.exterior.coords)
+                if len(coords) >= 2:
+                    patch = Polygon(coords, closed=True, edgecolor="black", facecolor=color, alpha=1)
+                    ax.add_patch(patch)
+                    drawn += 1
+                elif report_invalid:
+                    print(f"\nInvalid geometry for row {i}: {geom}")
+            elif report_invalid:
+                print(f"\nInvalid or non-polygon geometry for row {i}: {geom}")
+        if report_invalid:
+            count_invalid(len(unit_df), drawn)
+
+        ax.set_aspect("equal")
+        ax.axis("off")
+
+    with metrics.step("encode"):
+        buffer = io.BytesIO()
+        plt.savefig(buffer, format="png", bbox_inches="tight", pad_inches=0, dpi=dpi_value)
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+def count_invalid(rows: int, drawn: int) -> None:
+    # Skipped geometries, and units with nothing drawable at all.
+    metrics.count("invalid_geometries", rows - drawn)
+    if drawn == 0:
+        metrics.count("invalid")
+
+
+def palette(color_by: str) -> dict:
+    return COLORS_BY_SUBTYPE if color_by == "entity_subtype" else COLORS_BY_TYPE
+
+
+def raster_exteriors(unit_df):
+    # Polygon rings of a unit, with invalid rows reported once.
+    exteriors = raster.polygon_exteriors(unit_df["recentered_geometry"])
+    drawable = set(exteriors[2])
+    for position, i in enumerate(unit_df.index):
+        if position not in drawable:
+            print(f"\nInvalid or non-polygon geometry for row {i}: {unit_df.at[i, 'recentered_geometry']}")
+    count_invalid(len(unit_df), len(drawable))
+    return exteriors
+
+
+def raster_fills(unit_df, colors: dict, color_by: str) -> list:
+    fills = raster.palette_bgr(colors)
+    fallback = raster.to_bgr("green")
+    return [fills.get(key, fallback) for key in unit_df[color_by]]
+
+
+def mask_labels(unit_df) -> np.ndarray:
+    labels = unit_df["entity_subtype"].map(MASK_IDS)
+    metrics.count("unknown_subtypes", int(labels.isna().sum()))
+    return labels.fillna(MASK_UNKNOWN).astype(np.uint8).to_numpy()
+
+
+def write_mask_classes(path: Path) -> None:
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["id", "entity_subtype"])
+        writer.writerows(enumerate(MASK_CLASSES))
+        writer.writerow([MASK_UNKNOWN, "UNKNOWN"])
+
+
+def draw_raster_variants(unit_df, specs, extent: float, fig_size_in: float, mask_sizes=()):
+    # One image per (color_by, size) plus one class-index mask per mask size:
+    # rings are extracted once, projected once per size and filled once per
+    # palette.
+    exteriors = raster_exteriors(unit_df)
+    rings_by_size: dict = {}
+    fills_by_palette: dict = {}
+    images = []
+    for color_by, size in specs:
+        if size not in rings_by_size:
+            rings_by_size[size] = raster.polygon_rings(None, extent, size, exteriors)
+        if color_by not in fills_by_palette:
+            fills_by_palette[color_by] = raster_fills(unit_df, palette(color_by), color_by)
+        edge_px = max(1, round(size / (fig_size_in * 72)))
+        images.append(raster.rasterize(rings_by_size[size], fills_by_palette[color_by], size, edge_px))
+
+    masks = []
+    if mask_sizes:
+        labels = mask_labels(unit_df)
+        for size in mask_sizes:
+            if size not in rings_by_size:
+                rings_by_size[size] = raster.polygon_rings(None, extent, size, exteriors)
+            masks.append(raster.rasterize_labels(rings_by_size[size], labels, size))
+    return images, masks
+
+
+def extent_arg(value: str):
+    return value if value == "auto" else float(value)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Render floorplan images from recentered geometries.")
     parser.add_argument(
+        "--recentered",
         "--recentered-csv",
+        dest="recentered",
         type=Path,
-        default=_default_recentered_csv(),
-        help="CSV with recentered geometries.",
+        default=paths.default_recentered_path(),
+        help="Parquet or CSV with recentered geometries.",
     )
     parser.add_argument("--group-id", default="apartment_id", help="Group identifier column.")
     parser.add_argument(
         "--color-by",
         choices=["entity_type", "entity_subtype"],
-        default="entity_type",
-        help="Column to map to colors.",
+        nargs="+",
+        default=["entity_type"],
+        help="Column(s) to map to colors. The first goes to fp_complete, others to fp_complete_<palette>_<size>.",
     )
-    parser.add_argument("--start-row", type=int, default=0, help="Start row index.")
+    parser.add_argument("--start-row", type=int, default=0, help="Start row index (units are picked by first row).")
     parser.add_argument("--end-row", type=int, default=1000, help="End row index (inclusive).")
-    parser.add_argument("--extent", type=float, default=12, help="Half-width/height of render window.")
+    parser.add_argument("--start-unit", type=int, default=None, help="First unit ordinal; overrides the row range.")
+    parser.add_argument("--end-unit", type=int, default=None, help="Last unit ordinal (inclusive); overrides the row range.")
+    parser.add_argument(
+        "--extent",
+        type=extent_arg,
+        default=12,
+        help="Half-width/height of render window, or 'auto' for the square covering --coverage of units.",
+    )
+    parser.add_argument("--coverage", type=float, default=0.95, help="Share of units fully inside --extent auto.")
     parser.add_argument("--fig-size", type=float, default=2.0, help="Figure size in inches.")
     parser.add_argument("--dpi", type=int, default=600, help="DPI for saved images.")
-    parser.add_argument("--outline", action="store_true", help="Generate outline images after rendering.")
+    parser.add_argument(
+        "--backend",
+        choices=["matplotlib", "raster"],
+        default="matplotlib",
+        help="Drawing backend. raster paints straight onto a size x size pixel grid with OpenCV.",
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        nargs="+",
+        default=[1200],
+        help="Output size(s) in pixels for --backend raster; every size x --color-by combination is rendered per pass.",
+    )
+    parser.add_argument("--outline", action="store_true", help="Write the outline of each render from memory.")
+    parser.add_argument("--xray", action="store_true", help="Write the xray (edge) image of each render from memory.")
+    parser.add_argument(
+        "--mask",
+        action="store_true",
+        help="Also write single-channel class-index masks per entity_subtype to fp_mask (ids in fp_mask/classes.csv; raster only).",
+    )
     parser.add_argument("--chunksize", type=int, default=100, help="CSV read chunk size.")
-    return parser.parse_args()
-
-
-def main() -> None:
-    args = parse_args()
-
-    usecols = {"site_id", "apartment_id", "entity_type", "entity_subtype", "recentered_geometry", args.group_id}
-    df = bookie.read_csv_with_progress(args.recentered_csv, chunksize=args.chunksize, usecols=usecols)
+    parser.add_argument(
+        "--index",
+        type=Path,
+        default=paths.render_index_path(),
+        help="SQLite dedupe index shared across runs and workers.",
+    )
+    parser.add_argument(
+        "--maisonnette-cache",
+        action="store_true",
+        help="Use cached dataset-wide maisonnette flags instead of checking overlaps per unit.",
+    )
+    parser.add_argument(
+        "--maisonnette-threshold",
+        type=float,
+        default=maisonnette.THRESHOLD,
+        help="Overlap share of the smaller area that marks a unit as a maisonnette.",
+    )
+    parser.add_argument("--no-index", action="store_true", help="Keep the dedupe index in memory for this run only.")
+    parser.add_argument("--workers", type=int, default=1, help="Render units on a process pool of this size.")
+    parser.add_argument(
+        "--naming",
+        choices=["sequential", "ordinal", "unit"],
+        default=None,
+        help="Output names: next free FP_NNNN (serial default), unit ordinal, or site/unit id.",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        default=None,
+        help="CSV mapping output file to site_id/group id/hash. Defaults to fp_complete/manifest.csv.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Render only new or changed units and remove outputs of deleted ones (names default to --naming unit).",
+    )
+    parser.add_argument(
+        "--hash-quantum",
+        type=float,
+        default=1e-3,
+        help="Coordinate grid used for unit fingerprints (dataset units).",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        default=None,
+        help="Append per-unit and per-step timings and counts as JSON lines, or write a Prometheus textfile (.prom).",
+    )
+    parser.add_argument(
+        "--line-profile",
+        action="store_true",
+        help="Line-profile the serial render loop with line_profiler (slow; for development only).",
+    )
+    return parser.parse_args(argv)
+
+
+def run(args: argparse.Namespace, df: pd.DataFrame | None = None) -> None:
+    # df: recentered frame already in memory (e.g. from the pipeline runner);
+    # read from args.recentered otherwise.
+    with metrics.recording("render", args.metrics, items=RENDERED):
+        _run(args, df)
+
+
+def _line_profiler():
+    try:
+        from line_profiler import LineProfiler
+    except ImportError:
+        raise RuntimeError("--line-profile needs line_profiler; pip install line-profiler") from None
+    profiler = LineProfiler()
+    functions = (
+        draw_matplotlib,
+        draw_raster_variants,
+        raster.rasterize,
+        bookie.get_unit_fingerprint,
+        bookie.has_significant_overlap,
+    )
+    for function in functions:
+        profiler.add_function(function)
+    return profiler
+
+
+def _run(args: argparse.Namespace, df: pd.DataFrame | None) -> None:
+    if args.line_profile and args.workers > 1:
+        raise ValueError("--line-profile only works with --workers 1")
+    if args.backend != "raster" and len(set(args.size)) > 1:
+        raise ValueError("several --size values need --backend raster; matplotlib output size follows --fig-size/--dpi")
+    if args.mask and args.backend != "raster":
+        raise ValueError("--mask needs --backend raster so masks line up with the renders pixel for pixel")
+    sizes = list(dict.fromkeys(args.size))
+    palettes = list(dict.fromkeys(args.color_by))
+    # All size x palette combinations; the first one is the main render.
+    specs = [(color_by, size) for size in sizes for color_by in palettes]
+
+    if df is None:
+        usecols = {"site_id", "apartment_id", "entity_type", "entity_subtype", "recentered_geometry", args.group_id}
+        with metrics.step("read"):
+            df = geostore.read_geometries(args.recentered, columns=usecols, chunksize=args.chunksize)
 
     if args.group_id not in df.columns:
-        raise KeyError(f"group-id column '{args.group_id}' not found in CSV")
+        raise KeyError(f"group-id column '{args.group_id}' not found in {args.recentered}")
 
     num_rows = len(df)
     print(f"\nTotal number of rows in the database: {num_rows}")
 
-    start_row = max(args.start_row, 0)
-    end_row = min(args.end_row, num_rows - 1)
+    units, unit_rows = bookie.build_unit_index(df, args.group_id)
+    selected = bookie.select_units(units, max(args.start_row, 0), args.end_row, args.start_unit, args.end_unit)
+    print(f"\nrendering {len(selected)} of {len(units)} units")
 
-    generated_hashes = set()
-    encountered_ids = []
+    if args.extent == "auto":
+        extent_table = extents.load_or_measure(args.recentered, args.group_id, df, units, unit_rows)
+        args.extent = extents.covering_extent(extent_table, args.coverage)
+        print(f"\nextent {args.extent:.3f} covers {args.coverage:.0%} of units")
 
-    if LineProfiler:
-        lp = LineProfiler()
-        worker = lp(render_floorplan)
+    if not args.maisonnette_cache:
+        flags = [None] * len(selected)
     else:
-        lp = None
-        worker = render_floorplan
-
-    for row_number in range(start_row, end_row + 1):
-        worker(
-            row_number,
-            df,
-            encountered_ids,
-            generated_hashes,
-            end_row,
-            args.group_id,
-            args.color_by,
-            args.extent,
-            args.fig_size,
-            args.dpi,
-            args.outline,
+        with metrics.step("overlap"):
+            flag_table = maisonnette.load_or_flag(
+                args.recentered, df, args.group_id, units, unit_rows, args.maisonnette_threshold
+            )
+        flags = selected.merge(flag_table, on=["site_id", args.group_id], how="left")["maisonnette"]
+        flags = [None if pd.isna(flag) else bool(flag) for flag in flags]
+
+    naming = args.naming or ("unit" if args.incremental else "ordinal" if args.workers > 1 else "sequential")
+    if args.workers > 1 and naming == "sequential":
+        raise ValueError("--naming sequential is not safe with --workers; use ordinal or unit")
+    if args.incremental and naming == "ordinal":
+        raise ValueError("--naming ordinal shifts when units are added or removed; use unit with --incremental")
+
+    render_kwargs = {
+        "color_by": specs[0][0],
+        "extent": args.extent,
+        "fig_size_in": args.fig_size,
+        "dpi_value": args.dpi,
+        "write_outline": args.outline,
+        "write_xray": args.xray,
+        "group_id": args.group_id,
+        "hash_quantum": args.hash_quantum,
+        "maisonnette_threshold": args.maisonnette_threshold,
+        "backend": args.backend,
+        "size": specs[0][1],
+        "variants": specs[1:],
+        "write_mask": args.mask,
+    }
+
+    index_path = args.index
+    if args.no_index:
+        index_path = ":memory:" if args.workers == 1 else Path(tempfile.mkdtemp()) / "render_index.sqlite"
+    index = RenderIndex(index_path, config=render_config(render_kwargs))
+    stale = index.release_stale_claims()
+    if stale:
+        print(f"\nreleased {stale} unfinished claims of runs that are no longer alive")
+
+    manifest_path = args.manifest or paths.fp_complete_dir() / "manifest.csv"
+    if args.incremental:
+        with metrics.step("hash"):
+            todo, snapshot, snapshot_path = incremental_plan(
+                df, units, unit_rows, selected, args.group_id, manifest_path, index
+            )
+        metrics.count("skipped", int((~todo).sum()))
+        selected = selected[todo]
+        flags = [flag for flag, keep in zip(flags, todo) if keep]
+        print(f"\nrendering {len(selected)} new or changed units")
+
+    if args.mask:
+        write_mask_classes(paths.ensure_dir(paths.fp_mask_dir()) / "classes.csv")
+    tasks = [
+        (
+            unit.start,
+            unit.stop,
+            flag,
+            output_name(naming, ordinal, unit.site_id, getattr(unit, args.group_id)),
+            unit.site_id,
+            getattr(unit, args.group_id),
+            ordinal,
         )
+        for ordinal, unit, flag in zip(selected.index, selected.itertuples(index=False), flags)
+    ]
+
+    try:
+        _render_tasks(args, df, unit_rows, tasks, index, index_path, render_kwargs, manifest_path)
+    finally:
+        index.release_claims()
+        index.close()
+    if args.incremental:
+        incremental.save_sources(snapshot, snapshot_path)
+
 
-    if lp:
-        lp.print_stats()
+def _render_tasks(args, df, unit_rows, tasks, index, index_path, render_kwargs, manifest_path) -> None:
+    num_rows = len(df)
+    with bookie.ManifestWriter(manifest_path, ["file", "site_id", args.group_id, "hash"]) as manifest:
+        if args.workers > 1:
+            print(f"\nrendering on {args.workers} workers...")
+            with ProcessPoolExecutor(
+                max_workers=args.workers,
+                initializer=_init_worker,
+                initargs=(df, unit_rows, index_path, render_kwargs, metrics.active().enabled, index.owner),
+            ) as pool:
+                # Results come back in ordinal order, so the first unit seen
+                # per fingerprint is the one a serial run would have kept. A
+                # later one only got through before that unit took over its
+                # claim; its outputs are removed again.
+                settled = set()
+                results = pool.map(_render_task, tasks, chunksize=8)
+                for status, unit_hash, filename, site_id, unit_id, recorded in results:
+                    if status in (RENDERED, MAISONNETTE):
+                        if unit_hash in settled:
+                            if status == RENDERED:
+                                incremental.remove_render_outputs(
+                                    pd.DataFrame({"file": [Path(filename).name], "hash": [None]})
+                                )
+                            recorded = _as_duplicate(recorded, status)
+                            status = DUPLICATE
+                        settled.add(unit_hash)
+                    metrics.active().merge(recorded)
+                    if status == RENDERED:
+                        manifest.write([Path(filename).name, site_id, unit_id, unit_hash])
+        else:
+            lp = _line_profiler() if args.line_profile else None
+            worker = lp(render_unit) if lp else render_unit
 
+            for number, (start, stop, flag, name, site_id, unit_id, _ordinal) in enumerate(tasks, start=1):
+                print(f"\nfound unit No. {number} @ row {unit_rows[start]} of {num_rows - 1}")
+                status, unit_hash, filename = worker(
+                    df.iloc[unit_rows[start:stop]], index, maisonnette=flag, name=name, **render_kwargs
+                )
+                if status == RENDERED:
+                    manifest.write([Path(filename).name, site_id, unit_id, unit_hash])
+
+            if lp:
+                lp.print_stats()
+
+
+def main() -> None:
+    run(parse_args())
     print("goodbye")
 
 
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable
+
+from . import bookie
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+shapely = lazy_import("shapely")
+
+# Columnar storage for recentered geometries: Parquet with WKB geometry
+# columns and typed id columns. CSV with WKT stays available as an export.
+
+GEOMETRY_COLUMNS = ("geometry", "recentered_geometry")
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+
+
+def is_parquet(path: Path | str) -> bool:
+    return Path(path).suffix.lower() in PARQUET_SUFFIXES
+
+
+def _typed_id_column(series: pd.Series) -> pd.Series:
+    # Integral ids without gaps become int64; ids with gaps stay float64 and
+    # string ids stay strings, so downstream comparisons keep numpy semantics.
+    if pd.api.types.is_numeric_dtype(series) and not series.isna().any():
+        values = series.to_numpy()
+        if np.array_equal(values, np.round(values)):
+            return series.astype("int64")
+    return series
+
+
+def typed_ids(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    for column in df.columns:
+        if str(column).endswith("_id"):
+            df[column] = _typed_id_column(df[column])
+    return df
+
+
+def _object_array(values) -> np.ndarray:
+    array = np.asarray(values, dtype=object)
+    missing = pd.isna(array)
+    if missing.any():
+        array = array.copy()
+        array[missing] = None
+    return array
+
+
+def _sample(array: np.ndarray):
+    return next((value for value in array if value is not None), None)
+
+
+def is_wkb(values) -> bool:
+    return isinstance(_sample(_object_array(values)), (bytes, bytearray, memoryview))
+
+
+def ensure_geometry(values) -> np.ndarray:
+    # Accept shapely objects, WKT strings or WKB bytes and return shapely objects.
+    array = _object_array(values)
+    if len(array) == 0:
+        return array
+    sample = _sample(array)
+    if isinstance(sample, str):
+        return shapely.from_wkt(array)
+    if isinstance(sample, (bytes, bytearray, memoryview)):
+        return shapely.from_wkb(array)
+    return array
+
+
+def exterior_coordinates(geometries, return_index: bool = False):
+    # Exterior ring vertices of every Polygon and MultiPolygon part, in row
+    # order (closing vertex included); other geometry types contribute nothing.
+    geometries = np.asarray(geometries, dtype=object)
+    polygonal = np.flatnonzero(np.isin(shapely.get_type_id(geometries), (3, 6)))
+    parts, part_index = shapely.get_parts(geometries[polygonal], return_index=True)
+    coords, ring_index = shapely.get_coordinates(shapely.get_exterior_ring(parts), return_index=True)
+    if return_index:
+        return coords, polygonal[part_index[ring_index]]
+    return coords
+
+
+def _chunk_schema(table: pa.Table) -> pa.Schema:
+    # Pin the schema from the first chunk so later chunks with gaps in their
+    # ids (float64 in pandas) or missing strings still cast cleanly.
+    fields = []
+    for field in table.schema:
+        if field.name.endswith("_id"):
+            if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+                field = field.with_type(pa.int64())
+            elif pa.types.is_null(field.type) or pa.types.is_large_string(field.type):
+                field = field.with_type(pa.string())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+class GeometryWriter:
+    """Append DataFrame chunks to a Parquet (WKB) or CSV (WKT) geometry store."""
+
+    def __init__(self, path: Path | str, geometry_columns: Iterable[str] = GEOMETRY_COLUMNS):
+        self.path = Path(path)
+        self.geometry_columns = list(geometry_columns)
+        self.rows = 0
+        self._parquet = is_parquet(self.path)
+        self._writer = None
+        self._schema = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        out = typed_ids(df)
+        for column in self.geometry_columns:
+            if column not in out.columns:
+                continue
+            if self._parquet and is_wkb(out[column]):
+                out[column] = _object_array(out[column])
+                continue
+            geometries = ensure_geometry(out[column])
+            if self._parquet:
+                out[column] = shapely.to_wkb(geometries)
+            else:
+                out[column] = shapely.to_wkt(geometries, rounding_precision=-1)
+
+        if self._parquet:
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(out, preserve_index=False).replace_schema_metadata(None)
+            if self._writer is None:
+                self._schema = _chunk_schema(table)
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            self._writer.write_table(table.cast(self._schema))
+        else:
+            out.to_csv(self.path, index=False, mode="w" if self.rows == 0 else "a", header=self.rows == 0)
+        self.rows += len(out)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> "GeometryWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def write_geometries(
+    df: pd.DataFrame,
+    path: Path | str,
+    geometry_columns: Iterable[str] = GEOMETRY_COLUMNS,
+) -> Path:
+    with GeometryWriter(path, geometry_columns) as writer:
+        writer.write(df)
+    return writer.path
+
+
+def read_geometries(
+    path: Path | str,
+    columns: Iterable[str] | None = None,
+    geometry_columns: Iterable[str] = GEOMETRY_COLUMNS,
+    chunksize: int = 100,
+    parse: bool = True,
+) -> pd.DataFrame:
+    path = Path(path)
+    columns = list(columns) if columns is not None else None
+
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        if columns is not None:
+            available = set(pq.read_schema(path).names)
+            columns = [column for column in columns if column in available]
+        df = pq.read_table(path, columns=columns).to_pandas()
+    else:
+        available = list(pd.read_csv(path, nrows=0).columns)
+        if columns is None:
+            columns = available
+        else:
+            columns = [column for column in columns if column in available]
+        df = bookie.read_csv_with_progress(path, chunksize=chunksize, usecols=columns)
+
+    if parse:
+        for column in geometry_columns:
+            if column in df.columns:
+                df[column] = ensure_geometry(df[column])
+    return df
+
+
+def iter_geometry_chunks(
+    path: Path | str,
+    columns: Iterable[str] | None = None,
+    geometry_columns: Iterable[str] = GEOMETRY_COLUMNS,
+    batch_size: int = 200_000,
+):
+    # Yield the store as DataFrames of at most batch_size rows with parsed
+    # geometry, so whole-dataset passes run in constant memory.
+    path = Path(path)
+    columns = list(columns) if columns is not None else None
+
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        if columns is not None:
+            available = set(parquet.schema_arrow.names)
+            columns = [column for column in columns if column in available]
+        chunks = (batch.to_pandas() for batch in parquet.iter_batches(batch_size=batch_size, columns=columns))
+    else:
+        if columns is not None:
+            available = set(pd.read_csv(path, nrows=0).columns)
+            columns = [column for column in columns if column in available]
+        chunks = pd.read_csv(path, chunksize=batch_size, usecols=columns)
+
+    for df in chunks:
+        for column in geometry_columns:
+            if column in df.columns:
+                df[column] = ensure_geometry(df[column])
+        yield df
@@ -1,5 +1,7 @@
-import cv2
-import numpy as np
+from .lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
 
 def get_outline(image, low_threshold=50, high_threshold=150):
     gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)  # Convert to grayscale
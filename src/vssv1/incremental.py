@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import csv
+from pathlib import Path
+
+from . import paths
+from .lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+# Bookkeeping for incremental refreshes. Each stage keeps a table of per-unit
+# content hashes (see bookie.unit_source_hashes) from its last run; diffing it
+# against the current input tells which units are new, changed, unchanged or
+# deleted, so recenter and fp_renderer only redo the first two and clean up
+# after the last.
+
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+DELETED = "deleted"
+
+
+def sources_path(path: Path | str, group_id: str) -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.stem}.{group_id.replace('_id', '')}_sources.parquet")
+
+
+def load_sources(path: Path) -> pd.DataFrame | None:
+    return pd.read_parquet(path) if path.exists() else None
+
+
+def save_sources(table: pd.DataFrame, path: Path) -> None:
+    table.to_parquet(path, index=False)
+
+
+def diff_units(current: pd.DataFrame, previous: pd.DataFrame | None, group_id: str) -> pd.DataFrame:
+    # One row per unit found in either table, with its status.
+    keys = ["site_id", group_id]
+    if previous is None:
+        previous = current.iloc[:0]
+    merged = current.merge(previous[keys + ["source_hash"]], on=keys, how="outer", suffixes=("", "_previous"))
+    before = merged["source_hash_previous"]
+    now = merged["source_hash"]
+
+    status = pd.Series(UNCHANGED, index=merged.index)
+    status[before.isna()] = NEW
+    status[now.isna()] = DELETED
+    status[now.notna() & before.notna() & (now != before)] = CHANGED
+    merged["status"] = status
+    return merged
+
+
+def summary(diff: pd.DataFrame) -> str:
+    counts = diff["status"].value_counts()
+    return ", ".join(f"{counts.get(status, 0)} {status}" for status in (NEW, CHANGED, UNCHANGED, DELETED))
+
+
+def read_manifest(path: Path) -> pd.DataFrame | None:
+    if not path.exists() or path.stat().st_size == 0:
+        return None
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def rewrite_manifest(path: Path, manifest: pd.DataFrame) -> None:
+    # Later rows of a unit win, as reruns append.
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(list(manifest.columns))
+        writer.writerows(manifest.itertuples(index=False))
+
+
+def remove_render_outputs(rows: pd.DataFrame, index=None) -> int:
+    # Delete the PNGs listed in manifest rows (plus their palette/size
+    # variants, masks and outline/xray images) and drop their fingerprints
+    # from the render index.
+    from .init_outline import variant_suffix
+
+    removed = 0
+    variant_dirs = sorted(paths.fp_png_dir().glob("fp_complete_*")) + sorted(paths.fp_png_dir().glob("fp_mask*"))
+    for file_name, unit_hash in zip(rows["file"], rows["hash"]):
+        render = paths.fp_complete_dir() / file_name
+        suffix = variant_suffix(render)
+        for path in (
+            render,
+            *(variant_dir / file_name for variant_dir in variant_dirs),
+            paths.fp_outline_dir() / f"OL_outline_{suffix}.png",
+            paths.fp_xray_dir() / f"OL_xray_{suffix}.png",
+        ):
+            if path.exists():
+                path.unlink()
+                removed += 1
+        if index is not None and unit_hash:
+            index.forget(unit_hash)
+    return removed
@@ -1,25 +1,32 @@
 from __future__ import annotations
 
 import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
-import cv2
-import numpy as np
+from tqdm import tqdm
 
-from . import bookie, hochbauzeichner, paths
+from . import bookie, hochbauzeichner, metrics, paths
+from .lazy import lazy_import
 
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
 
-def _read_latest_floorplan():
-    latest_image_path = bookie.get_latest_image(paths.fp_complete_dir())
-    if latest_image_path is None:
+
+def _read_floorplan(image_path=None):
+    if image_path is None:
+        image_path = bookie.get_latest_image(paths.fp_complete_dir())
+    if image_path is None:
         raise FileNotFoundError("No rendered floorplan images found in outputs/fp_png/fp_complete")
-    image = cv2.imread(str(latest_image_path))
+    image = cv2.imread(str(image_path))
     if image is None:
-        raise RuntimeError(f"Unable to read image: {latest_image_path}")
+        raise RuntimeError(f"Unable to read image: {image_path}")
     return image
 
 
 def get_xray() -> None:
-    image = _read_latest_floorplan()
+    image = _read_floorplan()
     xray_image = hochbauzeichner.get_outline(image)
 
     out_path = bookie.next_available_filename(paths.ensure_dir(paths.fp_xray_dir()), "OL_xray")
@@ -28,10 +35,7 @@ def get_xray() -> None:
     print("\nxray has been drawn and saved...")
 
 
-def get_contour() -> None:
-    image = _read_latest_floorplan()
-
-    edges = hochbauzeichner.get_outline(image)
+def contour_from_edges(image, edges):
     kernel = np.ones((5, 5), np.uint8)
     closing = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
 
@@ -39,17 +43,138 @@ def get_contour() -> None:
 
     contour_image = np.zeros_like(image)
     cv2.drawContours(contour_image, contours, -1, (255, 0, 0), 3)
-
-    out_path = bookie.next_available_filename(paths.ensure_dir(paths.fp_outline_dir()), "OL_outline")
+    return contour_image
+
+
+def write_variants(image, suffix: str, contour: bool = True, xray: bool = True) -> dict:
+    # Outline and xray for an in-memory render, named OL_outline_<suffix>.png and
+    # OL_xray_<suffix>.png to pair with FP_<suffix>.png. Edges are computed once.
+    written = {}
+    with metrics.step("edges"):
+        edges = hochbauzeichner.get_outline(image)
+    if xray:
+        written["xray"] = paths.ensure_dir(paths.fp_xray_dir()) / f"OL_xray_{suffix}.png"
+        with metrics.step("encode"):
+            cv2.imwrite(str(written["xray"]), edges)
+    if contour:
+        written["outline"] = paths.ensure_dir(paths.fp_outline_dir()) / f"OL_outline_{suffix}.png"
+        with metrics.step("contour"):
+            outline = contour_from_edges(image, edges)
+        with metrics.step("encode"):
+            cv2.imwrite(str(written["outline"]), outline)
+    return written
+
+
+def get_contour(image_path=None, out_path=None) -> None:
+    image = _read_floorplan(image_path)
+    contour_image = contour_from_edges(image, hochbauzeichner.get_outline(image))
+
+    if out_path is None:
+        out_path = bookie.next_available_filename(paths.ensure_dir(paths.fp_outline_dir()), "OL_outline")
     cv2.imwrite(str(out_path), contour_image)
 
     print("outline has been drawn and saved...")
 
 
+def variant_suffix(image_path) -> str:
+    # FP_0042.png pairs with OL_outline_0042.png; other names keep their stem.
+    stem = Path(image_path).stem
+    return stem.split("_", 1)[1] if stem.startswith("FP_") and "_" in stem else stem
+
+
+def _batch_task(task):
+    source, outline_path, xray_path = task
+    metrics.begin_unit()
+    with metrics.step("decode"):
+        image = cv2.imread(str(source))
+    if image is None:
+        metrics.end_unit("invalid", file=source.name)
+        return source, False
+
+    with metrics.step("edges"):
+        edges = hochbauzeichner.get_outline(image)
+    if xray_path is not None:
+        with metrics.step("encode"):
+            cv2.imwrite(str(xray_path), edges)
+    if outline_path is not None:
+        with metrics.step("contour"):
+            outline = contour_from_edges(image, edges)
+        with metrics.step("encode"):
+            cv2.imwrite(str(outline_path), outline)
+    metrics.end_unit("processed", file=source.name)
+    return source, True
+
+
+def _init_batch_worker(record_metrics: bool) -> None:
+    metrics.activate(metrics.Recorder("outline", enabled=record_metrics))
+
+
+def _pool_batch_task(task):
+    source, ok = _batch_task(task)
+    return source, ok, metrics.active().drain()
+
+
+def batch_tasks(input_dir, outline_dir, xray_dir, contour: bool, xray: bool, overwrite: bool = False) -> list:
+    tasks = []
+    for source in sorted(Path(input_dir).glob("*.png")):
+        suffix = variant_suffix(source)
+        outline_path = Path(outline_dir) / f"OL_outline_{suffix}.png" if contour else None
+        xray_path = Path(xray_dir) / f"OL_xray_{suffix}.png" if xray else None
+        if not overwrite:
+            outline_path = None if outline_path is not None and outline_path.exists() else outline_path
+            xray_path = None if xray_path is not None and xray_path.exists() else xray_path
+        if outline_path is not None or xray_path is not None:
+            tasks.append((source, outline_path, xray_path))
+        else:
+            metrics.count("skipped")
+    return tasks
+
+
+def run_batch(tasks: list, workers: int, chunksize: int) -> int:
+    failed = []
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_batch_worker,
+            initargs=(metrics.active().enabled,),
+        ) as pool:
+            results = pool.map(_pool_batch_task, tasks, chunksize=chunksize)
+            for source, ok, recorded in tqdm(results, total=len(tasks)):
+                metrics.active().merge(recorded)
+                if not ok:
+                    failed.append(source)
+    else:
+        for task in tqdm(tasks):
+            source, ok = _batch_task(task)
+            if not ok:
+                failed.append(source)
+
+    for source in failed:
+        print(f"\nUnable to read image: {source}")
+    return len(tasks) - len(failed)
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Generate outline and xray images from rendered floorplans.")
     parser.add_argument("--xray", action="store_true", help="Generate xray output.")
     parser.add_argument("--contour", action="store_true", help="Generate contour output.")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Process every PNG in --input-dir instead of only the latest render.",
+    )
+    parser.add_argument("--input-dir", type=Path, default=None, help="Folder of renders for --batch (default: fp_complete).")
+    parser.add_argument("--outline-dir", type=Path, default=None, help="Outline output folder (default: fp_outline).")
+    parser.add_argument("--xray-dir", type=Path, default=None, help="Xray output folder (default: fp_xray).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Process pool size for --batch.")
+    parser.add_argument("--chunksize", type=int, default=64, help="Images per work item sent to a worker.")
+    parser.add_argument("--overwrite", action="store_true", help="Regenerate outputs that already exist.")
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        default=None,
+        help="Append per-image and per-step timings as JSON lines, or write a Prometheus textfile (.prom).",
+    )
     return parser.parse_args()
 
 
@@ -59,6 +184,17 @@ def main() -> None:
     run_xray = args.xray or not args.contour
     run_contour = args.contour or not args.xray
 
+    if args.batch or args.input_dir is not None:
+        input_dir = args.input_dir or paths.fp_complete_dir()
+        outline_dir = paths.ensure_dir(args.outline_dir or paths.fp_outline_dir())
+        xray_dir = paths.ensure_dir(args.xray_dir or paths.fp_xray_dir())
+        with metrics.recording("outline", args.metrics, items="processed"):
+            tasks = batch_tasks(input_dir, outline_dir, xray_dir, run_contour, run_xray, args.overwrite)
+            print(f"\n{len(tasks)} images in {input_dir} need outputs")
+            done = run_batch(tasks, args.workers, args.chunksize)
+        print(f"\n{done} images processed")
+        return
+
     if run_xray:
         get_xray()
     if run_contour:
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import importlib.util
+import sys
+from types import ModuleType
+
+# Deferred imports for the heavy third-party modules (numpy, pandas, shapely,
+# pyarrow, cv2). The stage modules bind them at import time as usual, but the
+# module only executes on its first attribute access, so `vssv1 <command>
+# --help` and argument errors return without loading them. Once loaded it is
+# the real module, so hot loops pay nothing extra.
+# tools/startup_benchmark.py checks that nothing loads them early.
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Top-level module `name`, executed on first use; submodules need a real import."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
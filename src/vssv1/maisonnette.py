@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from . import bookie, geostore, paths
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Dataset-wide maisonnette pre-pass: flag units whose area polygons overlap
+# significantly (stacked storeys drawn into one unit) once, and cache the flags
+# next to the recentered geometries so fp_renderer can look them up. Flags
+# depend on the threshold, which is part of the cache name.
+
+THRESHOLD = 0.5
+
+
+def flag_units(df: pd.DataFrame, group_id: str, threshold: float = THRESHOLD, units=None, unit_rows=None) -> pd.DataFrame:
+    if units is None or unit_rows is None:
+        units, unit_rows = bookie.build_unit_index(df, group_id)
+
+    row_unit = np.full(len(df), -1, dtype=np.intp)
+    row_unit[unit_rows] = np.repeat(np.arange(len(units)), (units["stop"] - units["start"]).to_numpy())
+
+    rows = np.flatnonzero(row_unit >= 0)
+    mask = bookie.area_polygon_mask(df.iloc[rows])
+    polygons = bookie.area_polygons(df.iloc[rows], mask)
+    polygon_rows = rows[mask]
+
+    left, _right = bookie.overlapping_pairs(polygons, threshold, groups=row_unit[polygon_rows])
+    flags = np.zeros(len(units), dtype=bool)
+    flags[row_unit[polygon_rows[left]]] = True
+
+    return pd.DataFrame({"site_id": units["site_id"], group_id: units[group_id], "maisonnette": flags})
+
+
+def cache_path(recentered: Path | str, group_id: str, threshold: float = THRESHOLD) -> Path:
+    recentered = Path(recentered)
+    group = group_id.replace("_id", "")
+    return recentered.with_name(f"{recentered.stem}.{group}_maisonnettes_{threshold:g}.parquet")
+
+
+def load_or_flag(
+    recentered: Path | str,
+    df: pd.DataFrame,
+    group_id: str,
+    units=None,
+    unit_rows=None,
+    threshold: float = THRESHOLD,
+) -> pd.DataFrame:
+    # Cached flags are reused while they are newer than the recentered file.
+    path = cache_path(recentered, group_id, threshold)
+    if path.exists() and path.stat().st_mtime >= Path(recentered).stat().st_mtime:
+        return pd.read_parquet(path)
+
+    print("\nflagging maisonnettes...")
+    flags = flag_units(df, group_id, threshold, units=units, unit_rows=unit_rows)
+    flags.to_parquet(path, index=False)
+    print(f"\n{int(flags['maisonnette'].sum())} of {len(flags)} units flagged, cached in {path}")
+    return flags
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Flag units with significantly overlapping areas.")
+    parser.add_argument(
+        "--recentered",
+        "--recentered-csv",
+        dest="recentered",
+        type=Path,
+        default=paths.default_recentered_path(),
+        help="Parquet or CSV with recentered geometries.",
+    )
+    parser.add_argument("--group-id", default="apartment_id", help="Group identifier column.")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Overlap share of the smaller area.")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+
+    usecols = ["site_id", "entity_type", "recentered_geometry", args.group_id]
+    df = geostore.read_geometries(args.recentered, columns=usecols)
+
+    flags = flag_units(df, args.group_id, threshold=args.threshold)
+    path = cache_path(args.recentered, args.group_id, args.threshold)
+    flags.to_parquet(path, index=False)
+    print(f"\n{int(flags['maisonnette'].sum())} of {len(flags)} units flagged, cached in {path}")
+    print("goodbye")
+
+
+if __name__ == "__main__":
+    main()
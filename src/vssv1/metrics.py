@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+# Lightweight stage instrumentation. A Recorder accumulates wall time per step
+# (parse, hash, overlap, rasterize, encode, ...) and counters (rendered,
+# duplicate, maisonnette, invalid, skipped, ...) for one stage, plus optional
+# per-unit records. Code deep in a stage reports to the process-wide active
+# recorder through step()/count(), so nothing has to be threaded through call
+# signatures; the default recorder is disabled and costs one attribute lookup.
+# Pool workers record into their own recorder and hand drain() back with each
+# result for the parent to merge().
+#
+# report() appends JSON lines (one per unit, then a stage summary) or, for a
+# .prom path, rewrites a Prometheus textfile (node_exporter textfile
+# collector), keeping the samples other stages wrote there.
+
+_NULL = nullcontext()
+
+
+class Recorder:
+    """Step timings, counters and per-unit records for one stage."""
+
+    def __init__(self, stage: str, enabled: bool = True):
+        self.stage = stage
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.steps: dict = {}
+        self.counts: dict = {}
+        self.units: list = []
+        self._unit_steps: dict | None = None
+        self._unit_started = 0.0
+
+    def step(self, name: str):
+        return self._timed(name) if self.enabled else _NULL
+
+    @contextmanager
+    def _timed(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float, calls: int = 1) -> None:
+        entry = self.steps.setdefault(name, [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+        if self._unit_steps is not None:
+            self._unit_steps[name] = self._unit_steps.get(name, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled and n:
+            self.counts[name] = self.counts.get(name, 0) + int(n)
+
+    def begin_unit(self) -> None:
+        if self.enabled:
+            self._unit_steps = {}
+            self._unit_started = time.perf_counter()
+
+    def end_unit(self, status: str, **keys) -> None:
+        # Closes the unit opened by begin_unit with its status and step times.
+        if not self.enabled or self._unit_steps is None:
+            return
+        self.units.append(
+            {
+                **{key: _plain(value) for key, value in keys.items()},
+                "status": status,
+                "seconds": round(time.perf_counter() - self._unit_started, 6),
+                "steps": {name: round(seconds, 6) for name, seconds in self._unit_steps.items()},
+            }
+        )
+        self._unit_steps = None
+        self.count(status)
+
+    def drain(self) -> dict | None:
+        # Worker side: hand over what was recorded since the last drain.
+        if not self.enabled:
+            return None
+        data = {"steps": self.steps, "counts": self.counts, "units": self.units}
+        self.steps, self.counts, self.units = {}, {}, []
+        return data
+
+    def merge(self, data: dict | None) -> None:
+        if not self.enabled or not data:
+            return
+        for name, (calls, seconds) in data["steps"].items():
+            entry = self.steps.setdefault(name, [0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+        for name, n in data["counts"].items():
+            self.counts[name] = self.counts.get(name, 0) + n
+        self.units.extend(data["units"])
+
+    def summary(self, items: str | None = None) -> dict:
+        # items: counter that measures throughput (e.g. "rendered").
+        seconds = time.perf_counter() - self.started
+        summary = {
+            "stage": self.stage,
+            "timestamp": round(time.time(), 3),
+            "seconds": round(seconds, 6),
+            "steps": {name: {"calls": calls, "seconds": round(total, 6)} for name, (calls, total) in self.steps.items()},
+            "counts": dict(self.counts),
+        }
+        if items is not None and seconds > 0:
+            summary["throughput"] = {"items": items, "per_second": round(self.counts.get(items, 0) / seconds, 3)}
+        return summary
+
+
+_ACTIVE = Recorder("", enabled=False)
+
+
+def active() -> Recorder:
+    return _ACTIVE
+
+
+def activate(recorder: Recorder) -> Recorder:
+    # Make `recorder` the process-wide target of step()/count(); returns the
+    # previous one.
+    global _ACTIVE
+    previous, _ACTIVE = _ACTIVE, recorder
+    return previous
+
+
+@contextmanager
+def recording(stage: str, path: Path | str | None, items: str | None = None):
+    # Active recorder for a stage run, reported to `path` at the end (disabled
+    # when path is None).
+    recorder = Recorder(stage, enabled=path is not None)
+    previous = activate(recorder)
+    try:
+        yield recorder
+    finally:
+        activate(previous)
+        if path is not None:
+            report(recorder, path, items)
+
+
+def step(name: str):
+    return _ACTIVE.step(name)
+
+
+def count(name: str, n: int = 1) -> None:
+    _ACTIVE.count(name, n)
+
+
+def begin_unit() -> None:
+    _ACTIVE.begin_unit()
+
+
+def end_unit(status: str, **keys) -> None:
+    _ACTIVE.end_unit(status, **keys)
+
+
+def _plain(value):
+    # JSON-safe ids (numpy scalars, NaN).
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def report(recorder: Recorder, path: Path | str, items: str | None = None) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    summary = recorder.summary(items)
+    if path.suffix == ".prom":
+        write_prometheus(summary, path)
+        return
+    with open(path, "a") as handle:
+        for unit in recorder.units:
+            handle.write(json.dumps({"stage": recorder.stage, "type": "unit", **unit}) + "\n")
+        handle.write(json.dumps({"type": "stage", **summary}) + "\n")
+
+
+PROMETHEUS_METRICS = {
+    "vssv1_stage_duration_seconds": ("gauge", "Wall time of the last run of a stage."),
+    "vssv1_stage_last_run_timestamp_seconds": ("gauge", "Unix time the last run of a stage finished."),
+    "vssv1_step_duration_seconds": ("gauge", "Time spent in a step during the last run of a stage."),
+    "vssv1_step_calls": ("gauge", "Number of times a step ran during the last run of a stage."),
+    "vssv1_stage_events": ("gauge", "Units/images/pairs by outcome during the last run of a stage."),
+    "vssv1_stage_throughput_per_second": ("gauge", "Throughput of the last run of a stage."),
+}
+
+_SAMPLE = re.compile(r'^(\w+)\{.*stage="([^"]*)"')
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_samples(summary: dict) -> list[str]:
+    stage = _label(summary["stage"])
+    samples = [
+        f'vssv1_stage_duration_seconds{{stage="{stage}"}} {summary["seconds"]}',
+        f'vssv1_stage_last_run_timestamp_seconds{{stage="{stage}"}} {summary["timestamp"]}',
+    ]
+    for name, step in summary["steps"].items():
+        labels = f'stage="{stage}",step="{_label(name)}"'
+        samples.append(f"vssv1_step_duration_seconds{{{labels}}} {step['seconds']}")
+        samples.append(f"vssv1_step_calls{{{labels}}} {step['calls']}")
+    for name, n in summary["counts"].items():
+        samples.append(f'vssv1_stage_events{{stage="{stage}",event="{_label(name)}"}} {n}')
+    if "throughput" in summary:
+        throughput = summary["throughput"]
+        samples.append(
+            f'vssv1_stage_throughput_per_second{{stage="{stage}",items="{_label(throughput["items"])}"}} '
+            f'{throughput["per_second"]}'
+        )
+    return samples
+
+
+def write_prometheus(summary: dict, path: Path) -> None:
+    # Replace this stage's samples and keep the others; written to a temp file
+    # and renamed so the collector never reads a partial file.
+    kept = []
+    if path.exists():
+        for line in path.read_text().splitlines():
+            match = _SAMPLE.match(line)
+            if match and match.group(1) in PROMETHEUS_METRICS and match.group(2) != summary["stage"]:
+                kept.append(line)
+
+    by_metric: dict = {name: [] for name in PROMETHEUS_METRICS}
+    for line in kept + prometheus_samples(summary):
+        by_metric[line.split("{", 1)[0]].append(line)
+
+    lines = []
+    for name, samples in by_metric.items():
+        if samples:
+            kind, text = PROMETHEUS_METRICS[name]
+            lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}", *samples]
+
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import math
+import os
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from . import metrics
+from .pairs import pack_index_path
+from .splitter import hash_fraction, list_images
+
+# Virtual hybrid datasets. A mix is a JSON manifest over existing pair sources
+# (folders of input|target pair images, or make_pix2pix_pairs packs) with a
+# ratio per source, a seed and optional sample caps:
+#
+#   {
+#     "seed": 0,
+#     "size": 512,
+#     "total": 20000,
+#     "sources": [
+#       {"name": "floorplans", "path": "floorplans/train_FP_HD_512", "ratio": 0.8},
+#       {"name": "snowflakes", "path": "snowflakes/paired_512.npy", "ratio": 0.2, "max_samples": 3000}
+#     ]
+#   }
+#
+# Only file names / pack rows are listed up front; pixels are read when a
+# sample is requested, so sweeping ratios never copies images. Each source's
+# samples are ranked by a seeded hash of their name, and a mix takes a prefix
+# of that ranking: raising a source's ratio only adds samples, and adding
+# files to a source does not reshuffle the ones already drawn.
+
+MANIFEST_KEYS = {"seed", "size", "total", "repeat", "sources"}
+SOURCE_KEYS = {"name", "path", "ratio", "max_samples"}
+
+
+class Source:
+    """One pair source: a folder of pair images or a .npy pack."""
+
+    def __init__(self, name: str, path: Path, ratio: float, max_samples: int | None = None):
+        if ratio < 0:
+            raise ValueError(f"source {name}: ratio must be >= 0, got {ratio}")
+        if max_samples is not None and max_samples < 0:
+            raise ValueError(f"source {name}: max_samples must be >= 0, got {max_samples}")
+        self.name = name
+        self.path = path
+        self.ratio = ratio
+        self.max_samples = max_samples
+        self._pack = None
+        self._layout = None
+        if path.suffix == ".npy":
+            self.refs = [str(row) for row in range(self._open_pack().shape[0])]
+        elif path.is_dir():
+            self.refs = [image.name for image in list_images(path)]
+        else:
+            raise FileNotFoundError(f"source {name}: {path} is neither a pair folder nor a .npy pack")
+
+    def _open_pack(self) -> np.ndarray:
+        # Opened lazily (and again after pickling into a worker).
+        if self._pack is None:
+            self._pack = np.load(self.path, mmap_mode="r")
+            index_path = pack_index_path(self.path)
+            layout = json.loads(index_path.read_text()).get("layout") if index_path.exists() else None
+            self._layout = layout or ("split" if self._pack.ndim == 4 else "pair")
+        return self._pack
+
+    def __getstate__(self):
+        return {**self.__dict__, "_pack": None}
+
+    def ranked(self, seed: int) -> list[str]:
+        # Sample order for this seed, capped at max_samples.
+        salt = f"{seed}/{self.name}"
+        refs = sorted(self.refs, key=lambda ref: hash_fraction(ref, salt))
+        return refs[: self.max_samples] if self.max_samples is not None else refs
+
+    def location(self, ref: str) -> str:
+        return str(self.path / ref) if self.path.is_dir() else f"{self.path}[{ref}]"
+
+    def read(self, ref: str, size: int | None = None) -> np.ndarray:
+        # Grayscale (size, 2 * size) input|target pair, as make_pix2pix_pairs writes it.
+        with metrics.step("decode"):
+            if self.path.is_dir():
+                with Image.open(self.path / ref) as img:
+                    pixels = np.asarray(img.convert("L"))
+            else:
+                row = self._open_pack()[int(ref)]
+                pixels = np.concatenate((row[0], row[1]), axis=1) if self._layout == "split" else np.asarray(row)
+        if size is not None and pixels.shape != (size, 2 * size):
+            with metrics.step("resize"):
+                pixels = np.asarray(Image.fromarray(pixels).resize((2 * size, size), Image.NEAREST))
+        return pixels
+
+
+def apportion(total: int, weights: list[float]) -> list[int]:
+    # Largest-remainder split of `total` in proportion to `weights`.
+    scale = sum(weights)
+    shares = [total * weight / scale for weight in weights]
+    counts = [math.floor(share) for share in shares]
+    by_remainder = sorted(range(len(shares)), key=lambda i: counts[i] - shares[i])
+    for i in by_remainder[: total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+class Mix:
+    """Lazy hybrid dataset: len(), mix[i] and iteration read one pair at a time."""
+
+    def __init__(
+        self,
+        sources: list[Source],
+        seed: int = 0,
+        size: int | None = None,
+        total: int | None = None,
+        repeat: bool = False,
+    ):
+        if not sources:
+            raise ValueError("a mix needs at least one source")
+        names = [source.name for source in sources]
+        if len(set(names)) != len(names):
+            raise ValueError(f"source names must be unique: {names}")
+        if sum(source.ratio for source in sources) <= 0:
+            raise ValueError("at least one source needs a positive ratio")
+        self.sources = sources
+        self.seed = seed
+        self.size = size
+
+        pools = [source.ranked(seed) for source in sources]
+        if total is None:
+            # Largest mix that honours the ratios without repeating a sample.
+            scale = sum(source.ratio for source in sources)
+            total = int(min(len(pool) * scale / s.ratio for s, pool in zip(sources, pools) if s.ratio > 0) + 1e-9)
+        elif total < 0:
+            raise ValueError(f"total must be >= 0, got {total}")
+        self.counts = apportion(total, [source.ratio for source in sources])
+        self.available = [len(pool) for pool in pools]
+
+        self.entries: list[tuple[int, str]] = []
+        for position, (source, pool, n) in enumerate(zip(sources, pools, self.counts)):
+            if n > len(pool) and not repeat:
+                raise ValueError(
+                    f"source {source.name}: the mix needs {n} samples but only {len(pool)} are available "
+                    "(lower total, raise max_samples or set repeat)"
+                )
+            if n and not pool:
+                raise ValueError(f"source {source.name} has no samples")
+            self.entries += [(position, pool[i % len(pool)]) for i in range(n)]
+
+    @classmethod
+    def from_manifest(cls, path: Path | str, **overrides) -> Mix:
+        # overrides: seed/size/total/repeat, plus ratios={name: ratio}.
+        path = Path(path)
+        manifest = json.loads(path.read_text())
+        unknown = set(manifest) - MANIFEST_KEYS
+        if unknown:
+            raise ValueError(f"{path}: unknown manifest keys {sorted(unknown)}")
+        ratios = overrides.pop("ratios", None) or {}
+        missing = set(ratios) - {entry.get("name") for entry in manifest.get("sources", [])}
+        if missing:
+            raise ValueError(f"{path}: no source named {sorted(missing)}")
+
+        sources = []
+        for entry in manifest.get("sources", []):
+            unknown = set(entry) - SOURCE_KEYS
+            if unknown:
+                raise ValueError(f"{path}: unknown keys {sorted(unknown)} in source {entry.get('name')}")
+            source_path = Path(entry["path"]).expanduser()
+            if not source_path.is_absolute():
+                source_path = path.parent / source_path
+            sources.append(
+                Source(
+                    entry["name"],
+                    source_path,
+                    float(ratios.get(entry["name"], entry.get("ratio", 1.0))),
+                    entry.get("max_samples"),
+                )
+            )
+        settings = {key: manifest[key] for key in ("seed", "size", "total", "repeat") if key in manifest}
+        settings.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(sources, **settings)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        position, ref = self.entries[index]
+        return self.sources[position].read(ref, self.size)
+
+    def order(self, epoch: int = 0) -> np.ndarray:
+        # Interleaved sample order; a different permutation per epoch.
+        return np.random.default_rng([self.seed, epoch]).permutation(len(self.entries))
+
+    def samples(self, epoch: int = 0):
+        # Yields (source name, sample ref, pixels) in the shuffled order, e.g. for
+        # tf.data.Dataset.from_generator.
+        for index in self.order(epoch):
+            position, ref = self.entries[index]
+            yield self.sources[position].name, ref, self[index]
+
+    def __iter__(self):
+        return (pixels for _name, _ref, pixels in self.samples())
+
+    def summary(self) -> list[dict]:
+        return [
+            {
+                "source": source.name,
+                "ratio": source.ratio,
+                "available": available,
+                "samples": n,
+                "share": round(n / len(self.entries), 4) if self.entries else 0.0,
+            }
+            for source, available, n in zip(self.sources, self.available, self.counts)
+        ]
+
+
+def write_index(mix: Mix, path: Path, epoch: int = 0) -> None:
+    # One row per sample in mix order; folder sources list the image path.
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["position", "source", "sample", "location"])
+        for position, index in enumerate(mix.order(epoch)):
+            source_position, ref = mix.entries[index]
+            source = mix.sources[source_position]
+            writer.writerow([position, source.name, ref, source.location(ref)])
+
+
+def write_pack(mix: Mix, pack: Path, layout: str = "pair", epoch: int = 0) -> None:
+    # Same layout and .json sidecar as make_pix2pix_pairs --pack, rows in mix order.
+    if mix.size is None and len(mix):
+        # Rows need one size: take the first sample's and resize the rest to it.
+        mix.size = mix[0].shape[0]
+    size = mix.size or 0
+    shape = (len(mix), size, 2 * size) if layout == "pair" else (len(mix), 2, size, size)
+    pack.parent.mkdir(parents=True, exist_ok=True)
+    array = np.lib.format.open_memmap(pack, mode="w+", dtype=np.uint8, shape=shape)
+    samples = []
+    for row, (name, ref, pixels) in enumerate(mix.samples(epoch)):
+        metrics.begin_unit()
+        with metrics.step("copy"):
+            if layout == "split":
+                array[row, 0] = pixels[:, :size]
+                array[row, 1] = pixels[:, size:]
+            else:
+                array[row] = pixels
+        samples.append([name, ref])
+        metrics.end_unit("packed", source=name, sample=ref)
+    array.flush()
+    del array
+
+    index = {
+        "format": "vss-pix2pix-pack",
+        "layout": layout,
+        "shape": list(shape),
+        "dtype": "uint8",
+        "size": size,
+        "channels": ["input", "target"],
+        "seed": mix.seed,
+        "epoch": epoch,
+        "sources": {source.name: str(source.path) for source in mix.sources},
+        "samples": samples,
+    }
+    pack_index_path(pack).write_text(json.dumps(index, indent=1))
+
+
+def link_samples(mix: Mix, dest_dir: Path, epoch: int = 0) -> int:
+    # Folder of symlinks in mix order for folder-based training loaders.
+    packs = [source.name for source, n in zip(mix.sources, mix.counts) if n and not source.path.is_dir()]
+    if packs:
+        raise ValueError(f"{', '.join(packs)} are packs; use --pack or the Python API instead of --link-dir")
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    for stale in dest_dir.iterdir():
+        if stale.is_symlink():
+            stale.unlink()
+    for position, index in enumerate(mix.order(epoch)):
+        source_position, ref = mix.entries[index]
+        source = mix.sources[source_position]
+        target = (source.path / ref).resolve()
+        os.symlink(target, dest_dir / f"{position:06d}_{source.name}{target.suffix}")
+    return len(mix)
+
+
+def _ratio(text: str) -> tuple[str, float]:
+    name, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected NAME=RATIO, got {text!r}")
+    return name, float(value)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mix pair sources into a virtual hybrid dataset.")
+    parser.add_argument("manifest", type=Path, help="JSON mix manifest.")
+    parser.add_argument(
+        "--ratio",
+        type=_ratio,
+        action="append",
+        default=[],
+        metavar="NAME=RATIO",
+        help="Override a source's ratio (repeatable), e.g. for ratio sweeps.",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Override the manifest seed.")
+    parser.add_argument("--total", type=int, default=None, help="Override the number of samples in the mix.")
+    parser.add_argument("--size", type=int, default=None, help="Override the pair size (pairs are resized to it).")
+    parser.add_argument("--repeat", action="store_true", default=None, help="Allow repeating samples of small sources.")
+    parser.add_argument("--epoch", type=int, default=0, help="Which shuffled order to write.")
+    parser.add_argument("--index", type=Path, default=None, help="Write the mix as CSV (position, source, sample, location).")
+    parser.add_argument("--pack", type=Path, default=None, help="Stream the mix into a make_pix2pix_pairs-style .npy pack.")
+    parser.add_argument(
+        "--pack-layout",
+        choices=["pair", "split"],
+        default="pair",
+        help="pair: (N, size, 2*size); split: (N, 2, size, size).",
+    )
+    parser.add_argument("--link-dir", type=Path, default=None, help="Materialize the mix as a folder of symlinks.")
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        default=None,
+        help="Append step timings and per-sample records as JSON lines (.prom: Prometheus textfile).",
+    )
+    return parser.parse_args(argv)
+
+
+def run(args: argparse.Namespace) -> Mix:
+    if args.pack is not None:
+        # Sources only read .npy packs, and the pack's .json sidecar must not
+        # land on the manifest (mix.json --pack mix.npy).
+        if args.pack.suffix != ".npy":
+            raise ValueError(f"--pack must be a .npy file, got {args.pack}")
+        if pack_index_path(args.pack).resolve() == args.manifest.resolve():
+            raise ValueError(f"--pack {args.pack} would overwrite the manifest with its index; pick another name")
+    mix = Mix.from_manifest(
+        args.manifest,
+        ratios=dict(args.ratio),
+        seed=args.seed,
+        size=args.size,
+        total=args.total,
+        repeat=args.repeat,
+    )
+    for row in mix.summary():
+        print(
+            f"{row['source']:<20} ratio {row['ratio']:<6g} {row['samples']:>8} of {row['available']:<8} "
+            f"({row['share']:.1%})"
+        )
+    print(f"{len(mix)} samples")
+
+    if args.index is not None:
+        write_index(mix, args.index, args.epoch)
+        print(f"index written to {args.index}")
+    if args.link_dir is not None:
+        link_samples(mix, args.link_dir, args.epoch)
+        print(f"linked {len(mix)} samples into {args.link_dir}")
+    if args.pack is not None:
+        with metrics.recording("mix", args.metrics, items="packed"):
+            write_pack(mix, args.pack, args.pack_layout, args.epoch)
+        print(f"packed {len(mix)} samples into {args.pack}")
+    return mix
+
+
+def main() -> None:
+    run(parse_args())
+    print("goodbye")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from . import metrics
+from .splitter import list_images
+
+# pix2pix training pairs: each input image pasted next to its target as one
+# grayscale (size, 2 * size) image, written as files with a pairs.csv index
+# or packed into a single memory-mapped .npy.
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Create side-by-side pix2pix training pairs (input | target)."
+    )
+    parser.add_argument("--input-dir", required=True, help="Folder with input images.")
+    parser.add_argument("--target-dir", required=True, help="Folder with target images.")
+    parser.add_argument("--output-dir", help="Output folder for paired images.")
+    parser.add_argument(
+        "--pack",
+        type=Path,
+        default=None,
+        help="Write all pairs into one memory-mapped .npy (plus a .json index) instead of image files.",
+    )
+    parser.add_argument(
+        "--pack-layout",
+        choices=["pair", "split"],
+        default="pair",
+        help="pair: (N, size, 2*size) like the PNGs; split: (N, 2, size, size) with contiguous input/target.",
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=512,
+        help="Resize images to size x size before concatenation.",
+    )
+    parser.add_argument(
+        "--match",
+        choices=["name", "order"],
+        default="name",
+        help="Match pairs by filename or by sorted order.",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Optional limit on number of pairs to write.",
+    )
+    parser.add_argument(
+        "--ext",
+        default="png",
+        help="Output image extension (default: png; bmp/tiff write uncompressed).",
+    )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        default=6,
+        choices=range(10),
+        metavar="0-9",
+        help="PNG zlib level; 0-1 trade file size for much faster writes (default: 6).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Build pairs on a process pool of this size (default: 1).",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=64,
+        help="Pairs handed to a worker at a time.",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Rebuild pairs whose output is already newer than both sources.",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        default=None,
+        help="Append per-pair and per-step timings as JSON lines, or write a Prometheus textfile (.prom).",
+    )
+    args = parser.parse_args(argv)
+    if args.output_dir is None and args.pack is None:
+        parser.error("one of --output-dir or --pack is required")
+    return args
+
+
+def pair_by_name(inputs: list[Path], targets: list[Path]) -> list[tuple[Path, Path]]:
+    target_map = {p.name: p for p in targets}
+    pairs = [(inp, target_map[inp.name]) for inp in inputs if inp.name in target_map]
+    if not pairs:
+        raise ValueError("No matching filenames between input and target folders.")
+    return pairs
+
+
+def pair_by_order(inputs: list[Path], targets: list[Path]) -> list[tuple[Path, Path]]:
+    if len(inputs) != len(targets):
+        raise ValueError("Input and target folders must have the same number of images for order matching.")
+    return list(zip(inputs, targets))
+
+
+def is_fresh(out_path: Path, input_path: Path, target_path: Path, previous: dict | None = None) -> bool:
+    # Outputs are named by ordinal, so adding or removing a source shifts the
+    # names: with the last run's pairs.csv (previous) an output only counts as
+    # fresh if it was built from the same two sources.
+    if previous is not None and previous.get(out_path.name) != (str(input_path), str(target_path)):
+        return False
+    try:
+        built = out_path.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return built > input_path.stat().st_mtime and built > target_path.stat().st_mtime
+
+
+# Per-process state: the output canvas is allocated once and fully overwritten
+# by each pair, so workers do not churn through a new image per pair.
+_WORKER: dict = {}
+
+
+def _init_worker(
+    size: int,
+    save_kwargs: dict,
+    pack: Path | None = None,
+    layout: str = "pair",
+    record_metrics: bool | None = None,
+) -> None:
+    # record_metrics: pool workers get their own recorder (see _recorded);
+    # None keeps the caller's.
+    if record_metrics is not None:
+        metrics.activate(metrics.Recorder("pairs", enabled=record_metrics))
+    _WORKER["size"] = size
+    _WORKER["save_kwargs"] = save_kwargs
+    _WORKER["canvas"] = Image.new("L", (size * 2, size))
+    _WORKER["pack"] = np.load(pack, mmap_mode="r+") if pack is not None else None
+    _WORKER["layout"] = layout
+
+
+def compose_pair(input_path: Path, target_path: Path) -> Image.Image:
+    size = _WORKER["size"]
+    canvas = _WORKER["canvas"]
+
+    with metrics.step("decode"):
+        for offset, path in ((0, input_path), (size, target_path)):
+            with Image.open(path) as img:
+                img = img.convert("L")
+                if img.size != (size, size):
+                    img = img.resize((size, size), Image.NEAREST)
+                canvas.paste(img, (offset, 0))
+    return canvas
+
+
+def build_pair(task: tuple[Path, Path, Path]) -> Path:
+    input_path, target_path, out_path = task
+    metrics.begin_unit()
+    canvas = compose_pair(input_path, target_path)
+    with metrics.step("encode"):
+        canvas.save(out_path, **_WORKER["save_kwargs"])
+    metrics.end_unit("built", file=out_path.name)
+    return out_path
+
+
+def pack_pair(task: tuple[int, Path, Path]) -> int:
+    # Decode straight into row `position` of the shared memory map.
+    position, input_path, target_path = task
+    metrics.begin_unit()
+    pixels = np.asarray(compose_pair(input_path, target_path))
+    with metrics.step("copy"):
+        if _WORKER["layout"] == "split":
+            size = _WORKER["size"]
+            _WORKER["pack"][position, 0] = pixels[:, :size]
+            _WORKER["pack"][position, 1] = pixels[:, size:]
+        else:
+            _WORKER["pack"][position] = pixels
+    metrics.end_unit("packed", position=position)
+    return position
+
+
+def _recorded(function, task):
+    # Pool side: run one task and hand back what it recorded.
+    function(task)
+    return metrics.active().drain()
+
+
+def write_pairs_index(tasks: list[tuple[Path, Path, Path]], path: Path) -> None:
+    # Maps each pair image back to its sources, e.g. for the train/test splitter.
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["file", "input", "target"])
+        for input_path, target_path, out_path in tasks:
+            writer.writerow([out_path.name, str(input_path), str(target_path)])
+
+
+def read_pairs_index(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, newline="") as handle:
+        return {row["file"]: (row["input"], row["target"]) for row in csv.DictReader(handle)}
+
+
+def pack_index_path(pack: Path) -> Path:
+    return pack.with_suffix(".json")
+
+
+def pack_is_fresh(pack: Path, pairs: list[tuple[Path, Path]], size: int, layout: str) -> bool:
+    index_path = pack_index_path(pack)
+    if not pack.exists() or not index_path.exists():
+        return False
+    index = json.loads(index_path.read_text())
+    expected = [[str(input_path), str(target_path)] for input_path, target_path in pairs]
+    if index.get("size") != size or index.get("layout") != layout or index.get("pairs") != expected:
+        return False
+    built = pack.stat().st_mtime
+    return all(built > path.stat().st_mtime for pair in pairs for path in pair)
+
+
+def write_pack(pairs: list[tuple[Path, Path]], pack: Path, size: int, layout: str, workers: int, chunksize: int) -> None:
+    # Training can np.load(pack, mmap_mode="r") and slice batches without decoding;
+    # the .json sidecar maps each row back to its source images.
+    shape = (len(pairs), size, 2 * size) if layout == "pair" else (len(pairs), 2, size, size)
+    pack.parent.mkdir(parents=True, exist_ok=True)
+    np.lib.format.open_memmap(pack, mode="w+", dtype=np.uint8, shape=shape).flush()
+
+    tasks = [(position, input_path, target_path) for position, (input_path, target_path) in enumerate(pairs)]
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(size, {}, pack, layout, metrics.active().enabled),
+        ) as pool:
+            for recorded in pool.map(partial(_recorded, pack_pair), tasks, chunksize=chunksize):
+                metrics.active().merge(recorded)
+    else:
+        _init_worker(size, {}, pack, layout)
+        for task in tasks:
+            pack_pair(task)
+        _WORKER["pack"].flush()
+        _WORKER["pack"] = None
+
+    index = {
+        "format": "vss-pix2pix-pack",
+        "layout": layout,
+        "shape": list(shape),
+        "dtype": "uint8",
+        "size": size,
+        "channels": ["input", "target"],
+        "pairs": [[str(input_path), str(target_path)] for input_path, target_path in pairs],
+    }
+    pack_index_path(pack).write_text(json.dumps(index, indent=1))
+
+
+def make_pairs(args: argparse.Namespace) -> None:
+    input_dir = Path(args.input_dir)
+    target_dir = Path(args.target_dir)
+
+    input_images = list_images(input_dir)
+    target_images = list_images(target_dir)
+
+    if not input_images:
+        raise FileNotFoundError(f"No images found in {input_dir}")
+    if not target_images:
+        raise FileNotFoundError(f"No images found in {target_dir}")
+
+    if args.match == "name":
+        pairs = pair_by_name(input_images, target_images)
+    else:
+        pairs = pair_by_order(input_images, target_images)
+
+    if args.limit is not None:
+        pairs = pairs[: args.limit]
+
+    if args.pack is not None:
+        if not args.overwrite and pack_is_fresh(args.pack, pairs, args.size, args.pack_layout):
+            metrics.count("skipped", len(pairs))
+            print(f"{args.pack} is up to date ({len(pairs)} pairs)")
+            return
+        workers = max(1, min(args.workers, len(pairs)))
+        write_pack(pairs, args.pack, args.size, args.pack_layout, workers, args.chunksize)
+        print(f"Packed {len(pairs)} pairs into {args.pack} (index: {pack_index_path(args.pack)})")
+        return
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    tasks = [
+        (input_path, target_path, output_dir / f"{index:05d}.{args.ext}")
+        for index, (input_path, target_path) in enumerate(pairs, start=1)
+    ]
+    previous = read_pairs_index(output_dir / "pairs.csv")
+    write_pairs_index(tasks, output_dir / "pairs.csv")
+    # Pairs of the last run beyond the new count would otherwise linger in the folder.
+    for name in previous.keys() - {out_path.name for _input, _target, out_path in tasks}:
+        (output_dir / name).unlink(missing_ok=True)
+    if not args.overwrite:
+        tasks = [task for task in tasks if not is_fresh(task[2], task[0], task[1], previous)]
+    skipped = len(pairs) - len(tasks)
+    metrics.count("skipped", skipped)
+
+    save_kwargs = {"compress_level": args.compress_level} if args.ext.lower() == "png" else {}
+    workers = max(1, min(args.workers, len(tasks)))
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(args.size, save_kwargs, None, "pair", metrics.active().enabled),
+        ) as pool:
+            for recorded in pool.map(partial(_recorded, build_pair), tasks, chunksize=args.chunksize):
+                metrics.active().merge(recorded)
+    else:
+        _init_worker(args.size, save_kwargs)
+        for task in tasks:
+            build_pair(task)
+
+    print(f"Wrote {len(tasks)} pairs to {output_dir} ({skipped} up to date)")
+
+
+def main() -> None:
+    args = parse_args()
+    items = "packed" if args.pack is not None else "built"
+    with metrics.recording("pairs", args.metrics, items=items):
+        make_pairs(args)
+
+
+if __name__ == "__main__":
+    main()
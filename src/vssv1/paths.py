@@ -34,14 +34,50 @@ def processed_sdd_dir() -> Path:
     return data_root() / "processed" / "sdd_recentered"
 
 
+def recentered_geometries_path(group_id: str = "floor_id", fmt: str = "parquet") -> Path:
+    return processed_sdd_dir() / f"recentered_{group_id.replace('_id', '')}_geometries.{fmt}"
+
+
+def default_recentered_path(group_id: str = "floor_id") -> Path:
+    slug = group_id.replace("_id", "")
+    candidates = [
+        recentered_geometries_path(group_id, "parquet"),
+        recentered_geometries_path(group_id, "csv"),
+        source_sdd_dir() / f"recentered_{slug}_geometries.csv",
+    ]
+    for candidate in candidates:
+        if candidate.exists():
+            return candidate
+    return candidates[0]
+
+
 def fp_png_dir() -> Path:
     return output_root() / "fp_png"
 
 
+def render_index_path() -> Path:
+    return fp_png_dir() / "render_index.sqlite"
+
+
+def pipeline_state_path() -> Path:
+    return output_root() / "pipeline_state.json"
+
+
 def fp_complete_dir() -> Path:
     return fp_png_dir() / "fp_complete"
 
 
+def fp_variant_dir(color_by: str, size: int | None = None) -> Path:
+    # Extra palette/size renders of fp_complete, e.g. fp_complete_subtype_512.
+    name = f"fp_complete_{color_by.replace('entity_', '')}"
+    return fp_png_dir() / (name if size is None else f"{name}_{size}")
+
+
+def fp_mask_dir(size: int | None = None) -> Path:
+    # Class-index masks; extra sizes go to fp_mask_<size>.
+    return fp_png_dir() / ("fp_mask" if size is None else f"fp_mask_{size}")
+
+
 def fp_outline_dir() -> Path:
     return fp_png_dir() / "fp_outline"
 
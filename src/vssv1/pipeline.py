@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import time
+from pathlib import Path
+
+from . import geostore, paths
+
+# Single-process runner for recenter -> render -> bounds -> outline. Stages run
+# in dependency order and hand the recentered frame to each other in memory.
+# Each stage is fingerprinted from its parameters, the files it reads (which
+# include upstream outputs) and its upstream fingerprints; a stage whose
+# fingerprint matches the saved state and whose outputs still exist is
+# skipped. Heavy modules are imported per stage.
+
+STAGES = ("recenter", "render", "bounds", "outline")
+DEPENDS = {
+    "recenter": (),
+    "render": ("recenter",),
+    "bounds": ("recenter",),
+    "outline": ("render",),
+}
+
+
+def file_signature(path: Path) -> list:
+    # Size and mtime stand in for content; cheap enough for multi-GB inputs.
+    path = Path(path)
+    if not path.exists():
+        return [str(path), None, None]
+    stat = path.stat()
+    return [str(path), stat.st_size, stat.st_mtime_ns]
+
+
+def fingerprint(name: str, params: dict, inputs: list, upstream: list) -> str:
+    payload = {
+        "stage": name,
+        "params": params,
+        "inputs": [file_signature(path) for path in inputs],
+        "upstream": upstream,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_state(path: Path) -> dict:
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_state(path: Path, state: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(state, indent=1, sort_keys=True))
+
+
+class Context:
+    """Stage configuration plus the recentered frame shared between stages."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self._recentered = None
+
+    @property
+    def recentered_path(self) -> Path:
+        return self.args.recentered
+
+    @property
+    def recentered(self):
+        # Loaded once from disk when the recenter stage was skipped.
+        if self._recentered is None:
+            print(f"\nloading {self.recentered_path}...")
+            self._recentered = geostore.read_geometries(self.recentered_path)
+        return self._recentered
+
+    @recentered.setter
+    def recentered(self, df) -> None:
+        # The parallel recenter hands rows over as WKB; later stages expect
+        # shapely objects like read_geometries gives them.
+        if df is not None:
+            df = geostore.typed_ids(df)
+            for column in geostore.GEOMETRY_COLUMNS:
+                if column in df.columns:
+                    df[column] = geostore.ensure_geometry(df[column])
+        self._recentered = df
+
+    def bounds_json(self) -> Path:
+        return paths.output_root() / f"bounds_{self.args.group_id.replace('_id', '')}.json"
+
+    def bounds_preview(self) -> Path:
+        return paths.output_root() / f"bounds_{self.args.group_id.replace('_id', '')}.png"
+
+
+def stage_spec(name: str, ctx: Context):
+    # (params, input files, output files) for a stage.
+    args = ctx.args
+    if name == "recenter":
+        return (
+            {"group_id": args.group_id, "output": args.recentered, "incremental": args.incremental},
+            [args.input_csv],
+            [args.recentered],
+        )
+    if name == "render":
+        return (
+            {
+                "group_id": args.render_group_id,
+                "start_row": args.start_row,
+                "end_row": args.end_row,
+                "backend": args.backend,
+                "size": args.size,
+                "extent": args.extent,
+                "color_by": args.color_by,
+                "outline": args.outline,
+                "xray": args.xray,
+                "mask": args.mask,
+                "incremental": args.incremental,
+            },
+            [args.recentered],
+            [paths.fp_complete_dir() / "manifest.csv"],
+        )
+    if name == "bounds":
+        return (
+            {"percentile": args.percentile},
+            [args.recentered],
+            [ctx.bounds_json(), ctx.bounds_preview()],
+        )
+    if name == "outline":
+        return (
+            {"outline": args.outline, "xray": args.xray},
+            [paths.fp_complete_dir() / "manifest.csv"],
+            [],
+        )
+    raise KeyError(name)
+
+
+def run_recenter(ctx: Context) -> None:
+    from . import recenter
+
+    args = ctx.args
+    stage_args = recenter.parse_args(
+        [
+            "--input-csv", str(args.input_csv),
+            "--group-id", args.group_id,
+            "--output", str(args.recentered),
+            "--workers", str(args.workers),
+        ]
+        + (["--plot-sample"] if args.plot_sample else [])
+        + (["--incremental"] if args.incremental else [])
+        + (["--metrics", str(args.metrics)] if args.metrics else [])
+    )
+    ctx.recentered = recenter.run(stage_args)
+
+
+def run_render(ctx: Context) -> None:
+    from . import fp_renderer
+
+    args = ctx.args
+    argv = [
+        "--recentered", str(args.recentered),
+        "--group-id", args.render_group_id,
+        "--start-row", str(args.start_row),
+        "--end-row", str(args.end_row),
+        "--backend", args.backend,
+        "--size", *map(str, args.size),
+        "--extent", str(args.extent),
+        "--color-by", *args.color_by,
+        "--workers", str(args.workers),
+    ]
+    argv += ["--outline"] if args.outline else []
+    argv += ["--xray"] if args.xray else []
+    argv += ["--mask"] if args.mask else []
+    argv += ["--incremental"] if args.incremental else []
+    argv += ["--metrics", str(args.metrics)] if args.metrics else []
+    fp_renderer.run(fp_renderer.parse_args(argv), df=ctx.recentered)
+
+
+def run_bounds(ctx: Context) -> None:
+    from . import boundaries
+
+    stage_args = boundaries.parse_args(
+        [
+            "--recentered", str(ctx.recentered_path),
+            "--percentile", str(ctx.args.percentile),
+            "--view", "density",
+            "--output", str(ctx.bounds_preview()),
+        ]
+    )
+    bounds = boundaries.run(stage_args, df=ctx.recentered)
+    ctx.bounds_json().write_text(json.dumps(dict(zip(("minx", "miny", "maxx", "maxy"), map(float, bounds)))))
+
+
+def run_outline(ctx: Context) -> None:
+    from . import init_outline, metrics
+
+    args = ctx.args
+    with metrics.recording("outline", args.metrics, items="processed"):
+        tasks = init_outline.batch_tasks(
+            paths.fp_complete_dir(),
+            paths.ensure_dir(paths.fp_outline_dir()),
+            paths.ensure_dir(paths.fp_xray_dir()),
+            contour=args.outline,
+            xray=args.xray,
+        )
+        print(f"\n{len(tasks)} renders need outline/xray images")
+        if tasks:
+            init_outline.run_batch(tasks, args.workers, chunksize=64)
+
+
+RUNNERS = {
+    "recenter": run_recenter,
+    "render": run_render,
+    "bounds": run_bounds,
+    "outline": run_outline,
+}
+
+
+def selected_stages(args: argparse.Namespace) -> list[str]:
+    stages = list(args.stages or STAGES)
+    if "bounds" in stages and not args.bounds:
+        stages.remove("bounds")
+    if "outline" in stages and not (args.outline or args.xray):
+        stages.remove("outline")
+    return [name for name in STAGES if name in stages]
+
+
+def run_pipeline(args: argparse.Namespace) -> dict:
+    ctx = Context(args)
+    state = load_state(args.state)
+    fingerprints: dict = {}
+    report = {}
+
+    for name in selected_stages(args):
+        params, inputs, outputs = stage_spec(name, ctx)
+        upstream = [fingerprints.get(dep) or state.get(dep, {}).get("fingerprint") for dep in DEPENDS[name]]
+        current = fingerprint(name, params, inputs, upstream)
+        cached = state.get(name, {})
+        fresh = cached.get("fingerprint") == current and all(Path(path).exists() for path in outputs)
+
+        if fresh and not args.force:
+            print(f"\n[{name}] up to date, skipped")
+            report[name] = "skipped"
+        else:
+            print(f"\n[{name}] running...")
+            start = time.perf_counter()
+            RUNNERS[name](ctx)
+            elapsed = time.perf_counter() - start
+            state[name] = {"fingerprint": current, "seconds": round(elapsed, 3), "outputs": [str(p) for p in outputs]}
+            save_state(args.state, state)
+            print(f"\n[{name}] done in {elapsed:.1f}s")
+            report[name] = "ran"
+        fingerprints[name] = current
+    return report
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run recenter -> render -> bounds -> outline in one process.")
+    parser.add_argument(
+        "--input-csv",
+        type=Path,
+        default=paths.source_sdd_dir() / "geometries.csv",
+        help="Path to geometries.csv from the Swiss Dwellings dataset.",
+    )
+    parser.add_argument("--group-id", default="floor_id", help="Unit column (e.g., apartment_id, floor_id).")
+    parser.add_argument(
+        "--render-group-id",
+        default="apartment_id",
+        help="Unit column the renderer draws one image per (fp_renderer --group-id).",
+    )
+    parser.add_argument(
+        "--recentered",
+        type=Path,
+        default=None,
+        help="Recentered store (.parquet or .csv). Defaults to data/processed/sdd_recentered/.",
+    )
+    parser.add_argument("--plot-sample", action="store_true", help="Plot the first recentered unit.")
+    parser.add_argument("--start-row", type=int, default=0, help="Render units starting at this row.")
+    parser.add_argument("--end-row", type=int, default=200, help="Render units up to this row (inclusive).")
+    parser.add_argument("--backend", choices=["matplotlib", "raster"], default="matplotlib", help="Render backend.")
+    parser.add_argument(
+        "--size",
+        type=int,
+        nargs="+",
+        default=[1200],
+        help="Output size(s) in pixels for --backend raster.",
+    )
+    parser.add_argument("--extent", default="12", help="Render half-width, or 'auto'.")
+    parser.add_argument(
+        "--color-by",
+        choices=["entity_type", "entity_subtype"],
+        nargs="+",
+        default=["entity_type"],
+        help="Column(s) to map to colors; extra palettes are rendered in the same pass.",
+    )
+    parser.add_argument("--outline", action="store_true", help="Write outline images.")
+    parser.add_argument("--xray", action="store_true", help="Write xray images.")
+    parser.add_argument("--mask", action="store_true", help="Write class-index masks (raster backend).")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Recenter and render only new or changed units; remove outputs of deleted ones.",
+    )
+    parser.add_argument("--no-bounds", dest="bounds", action="store_false", help="Skip the bounds stage.")
+    parser.add_argument("--percentile", type=int, default=5, help="Percentile for the bounds stage.")
+    parser.add_argument("--workers", type=int, default=1, help="Process pool size for stages that support it.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=None, help="Run only these stages.")
+    parser.add_argument("--force", action="store_true", help="Rerun stages even if their outputs are valid.")
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        default=None,
+        help="Stage timings and counts as JSON lines, or a Prometheus textfile (.prom), shared by all stages.",
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        default=paths.pipeline_state_path(),
+        help="JSON file with the fingerprints of completed stages.",
+    )
+    args = parser.parse_args(argv)
+    if args.recentered is None:
+        args.recentered = paths.recentered_geometries_path(args.group_id)
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    report = run_pipeline(args)
+    print("\n" + ", ".join(f"{name}: {status}" for name, status in report.items()))
+    print("goodbye")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+shapely = lazy_import("shapely")
+
+# Scanline raster backend for fp_renderer: maps recentered coordinates onto a
+# fixed size x size pixel grid spanning [-extent, extent] and paints polygons
+# with cv2.fillPoly/polylines in row order, the way matplotlib stacks patches.
+# cv2 is imported by the two painting functions only.
+
+SHIFT = 4  # fractional bits for sub-pixel vertex positions
+
+NAMED_COLORS = {
+    "white": "#FFFFFF",
+    "black": "#000000",
+    "gray": "#808080",
+    "dimgray": "#696969",
+    "green": "#008000",
+}
+
+
+def to_bgr(color: str) -> tuple[int, int, int]:
+    value = NAMED_COLORS.get(color, color).lstrip("#")
+    red, green, blue = (int(value[i : i + 2], 16) for i in (0, 2, 4))
+    return blue, green, red
+
+
+def palette_bgr(colors: dict) -> dict:
+    return {key: to_bgr(value) for key, value in colors.items()}
+
+
+def to_pixels(coords: np.ndarray, extent: float, size: int) -> np.ndarray:
+    scale = size / (2 * extent) * (1 << SHIFT)
+    pixels = np.empty((len(coords), 2), dtype=np.float64)
+    pixels[:, 0] = (coords[:, 0] + extent) * scale
+    pixels[:, 1] = (extent - coords[:, 1]) * scale
+    return np.round(pixels).astype(np.int32)
+
+
+def polygon_exteriors(geometries):
+    # Exterior ring vertices of every valid single polygon, in dataset units,
+    # as (coords, ring bounds, rows); size independent, so one call serves
+    # every output size of a unit.
+    geometries = np.asarray(geometries, dtype=object)
+    drawable = shapely.get_type_id(geometries) == 3
+    drawable[drawable] = shapely.is_valid(geometries[drawable])
+
+    coords, ring_index = shapely.get_coordinates(
+        shapely.get_exterior_ring(geometries[drawable]), return_index=True
+    )
+    bounds = np.searchsorted(ring_index, np.arange(np.count_nonzero(drawable) + 1))
+    return coords, bounds, np.flatnonzero(drawable), len(geometries)
+
+
+def polygon_rings(geometries, extent: float, size: int, exteriors=None):
+    # Exterior rings of every valid single polygon as pixel arrays; None marks
+    # rows the renderer skips (invalid or non-polygon geometries).
+    if exteriors is None:
+        exteriors = polygon_exteriors(geometries)
+    coords, bounds, rows, n_rows = exteriors
+    pixels = to_pixels(coords, extent, size)
+
+    rings = [None] * n_rows
+    for ring, row in enumerate(rows):
+        rings[row] = pixels[bounds[ring] : bounds[ring + 1]]
+    return rings
+
+
+def rasterize(
+    rings,
+    fill_colors,
+    size: int,
+    edge_px: int = 1,
+    edge_color=(0, 0, 0),
+    background=(255, 255, 255),
+) -> np.ndarray:
+    import cv2
+
+    canvas = np.empty((size, size, 3), dtype=np.uint8)
+    cv2.rectangle(canvas, (0, 0), (size - 1, size - 1), background, thickness=-1)
+    for ring, fill in zip(rings, fill_colors):
+        if ring is None or len(ring) < 2:
+            continue
+        cv2.fillPoly(canvas, [ring], fill, lineType=cv2.LINE_8, shift=SHIFT)
+        if edge_px > 0:
+            cv2.polylines(canvas, [ring], True, edge_color, thickness=edge_px, lineType=cv2.LINE_8, shift=SHIFT)
+    return canvas
+
+
+def rasterize_labels(rings, labels, size: int) -> np.ndarray:
+    # Single-channel class-index mask: rings painted in row order with their
+    # integer label, no edges and no antialiasing, on 0 background.
+    import cv2
+
+    canvas = np.zeros((size, size), dtype=np.uint8)
+    for ring, label in zip(rings, labels):
+        if ring is None or len(ring) < 2:
+            continue
+        cv2.fillPoly(canvas, [ring], int(label), lineType=cv2.LINE_8, shift=SHIFT)
+    return canvas
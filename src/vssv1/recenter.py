@@ -1,67 +1,232 @@
 from __future__ import annotations
 
 import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 
-import matplotlib.pyplot as plt
-from shapely import wkt
-from shapely.affinity import translate
-from shapely.geometry import MultiPolygon, Polygon
+from tqdm import tqdm
 
-from . import bookie, paths
+from . import bookie, geostore, incremental, metrics, paths
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+shapely = lazy_import("shapely")
 
 # Recenter floorplan geometries so each unit is centered around the origin.
 
+STREAM_CHUNKSIZE = 200_000
+# Applied by both the full and the streaming reader. Without it a chunk whose
+# apartment ids all look numeric would parse them as numbers, and ids would
+# compare and hash differently depending on how the file was read.
+SOURCE_DTYPES = {"apartment_id": "str"}
+
+
+def group_means(geometries, codes, n_groups: int):
+    # Mean of all exterior ring vertices per group, summed in row order so the
+    # offsets do not depend on how groups are batched or sharded.
+    coords, rows = geostore.exterior_coordinates(geometries, return_index=True)
+    coord_codes = np.asarray(codes)[rows]
+
+    counts = np.bincount(coord_codes, minlength=n_groups)
+    sum_x = np.bincount(coord_codes, weights=coords[:, 0], minlength=n_groups)
+    sum_y = np.bincount(coord_codes, weights=coords[:, 1], minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sum_x / counts, sum_y / counts, counts
+
+
+def translate_geometries(geometries, codes, offset_x, offset_y):
+    geometries = np.asarray(geometries, dtype=object)
+    _, coord_index = shapely.get_coordinates(geometries, return_index=True)
+    coord_codes = np.asarray(codes)[coord_index]
+    offsets = np.column_stack([offset_x[coord_codes], offset_y[coord_codes]])
+    return shapely.transform(geometries, lambda coords: coords + offsets)
+
+
+def _sort_by_group(df: pd.DataFrame, group_id: str):
+    has_group = df[group_id].notna()
+    metrics.count("skipped_rows", int(len(df) - has_group.sum()))
+    df = df[has_group]
+    codes, uniques = pd.factorize(df[group_id], sort=True)
+    order = np.argsort(codes, kind="stable")
+    return df.iloc[order].reset_index(drop=True), codes[order], len(uniques)
+
+
+def _recenter_arrays(geometries, codes, n_groups: int):
+    mean_x, mean_y, counts = group_means(geometries, codes, n_groups)
+    recentered = translate_geometries(geometries, codes, -mean_x, -mean_y)
+    recentered[counts[codes] == 0] = None
+    return recentered, counts
+
+
+def _update_stats(stats, counts) -> None:
+    # Units without any polygon vertex stay unmoved and count as invalid.
+    metrics.count("units", int(np.count_nonzero(counts)))
+    metrics.count("invalid", int(len(counts) - np.count_nonzero(counts)))
+    if stats is not None:
+        stats["count"] += int(np.count_nonzero(counts))
+        stats["points"] += int(counts.sum())
+
+
+def recenter_geometries(df: pd.DataFrame, group_id: str, stats=None) -> pd.DataFrame:
+    # Move every group so the mean of its exterior ring vertices sits on the
+    # origin. Rows without a group id are dropped and rows come out ordered by group.
+    df, codes, n_groups = _sort_by_group(df, group_id)
+    with metrics.step("parse"):
+        geometries = geostore.ensure_geometry(df["geometry"])
+    with metrics.step("recenter"):
+        recentered, counts = _recenter_arrays(geometries, codes, n_groups)
+    _update_stats(stats, counts)
+    return df.assign(geometry=geometries, recentered_geometry=recentered)
+
+
+def _recenter_shard(shard):
+    # Worker side: shards arrive as local group codes plus WKT/WKB buffers and
+    # leave as WKB, so no shapely objects are pickled in either direction.
+    codes, geometry = shard
+    geometries = geostore.ensure_geometry(geometry)
+    recentered, counts = _recenter_arrays(geometries, codes, int(codes[-1]) + 1)
+    return shapely.to_wkb(geometries), shapely.to_wkb(recentered), counts
+
+
+def _shard_bounds(codes, n_shards: int):
+    # Row ranges of roughly equal size that never split a group.
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    targets = np.linspace(0, len(codes), n_shards + 1)[1:-1]
+    cuts = starts[np.minimum(np.searchsorted(starts, targets), len(starts) - 1)]
+    return np.unique(np.r_[0, cuts, len(codes)])
+
+
+def recenter_geometries_parallel(df: pd.DataFrame, group_id: str, executor, shards: int, stats=None) -> pd.DataFrame:
+    # Same rows and values as recenter_geometries, with groups sharded over a
+    # process pool. Shards are merged back in group order.
+    df, codes, _n_groups = _sort_by_group(df, group_id)
+    if len(df) == 0:
+        return df.assign(recentered_geometry=pd.Series(dtype=object))
+
+    bounds = _shard_bounds(codes, shards)
+    geometry = df["geometry"].to_numpy()
+    payloads = [(codes[lo:hi] - codes[lo], geometry[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    with metrics.step("recenter"):
+        results = list(executor.map(_recenter_shard, payloads))
+    geometry_wkb = np.concatenate([result[0] for result in results])
+    recentered_wkb = np.concatenate([result[1] for result in results])
+    _update_stats(stats, np.concatenate([result[2] for result in results]))
+    return df.assign(geometry=geometry_wkb, recentered_geometry=recentered_wkb)
+
+
+def iter_recentered_chunks(input_csv, group_id: str, usecols, chunksize: int, stats=None, executor=None, shards: int = 1):
+    # Stream geometries.csv in chunks and yield recentered rows per chunk. Rows of
+    # the group that is still open at a chunk boundary are held back and joined
+    # with the next chunk, so groups must be contiguous in the input file.
+    finished = set()
+    pending = None
+    reader = pd.read_csv(input_csv, chunksize=chunksize, usecols=list(usecols), dtype=SOURCE_DTYPES)
+
+    def recenter_ready(ready):
+        unit_ids = set(ready[group_id].dropna().unique())
+        repeated = unit_ids & finished
+        if repeated:
+            raise ValueError(
+                f"{group_id} '{next(iter(repeated))}' is not contiguous in {input_csv}; "
+                "sort the input by group or recenter without --stream"
+            )
+        finished.update(unit_ids)
+        if executor is not None:
+            return recenter_geometries_parallel(ready, group_id, executor, shards, stats)
+        return recenter_geometries(ready, group_id, stats)
+
+    for chunk in tqdm(reader):
+        if pending is not None and len(pending):
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+
+        last_id = chunk[group_id].iloc[-1]
+        if pd.isna(last_id):
+            held = np.zeros(len(chunk), dtype=bool)
+        else:
+            held = (chunk[group_id] == last_id).to_numpy()
+
+        pending = chunk[held]
+        ready = chunk[~held]
+        if len(ready):
+            yield recenter_ready(ready)
+
+    if pending is not None and len(pending):
+        yield recenter_ready(pending)
 
-def _collect_points(geometry):
-    if isinstance(geometry, Polygon):
-        return list(geometry.exterior.coords)
-    if isinstance(geometry, MultiPolygon):
-        points = []
-        for poly in geometry.geoms:
-            points.extend(list(poly.exterior.coords))
-        return points
-    return []
 
+def _rows_of_units(units: pd.DataFrame, unit_rows, group_id: str, wanted: set) -> np.ndarray:
+    keys = bookie.unit_keys(units, group_id)
+    take = [key in wanted for key in zip(keys["site_id"], keys[group_id])]
+    slices = [unit_rows[start:stop] for start, stop, keep in zip(units["start"], units["stop"], take) if keep]
+    return np.sort(np.concatenate(slices)) if slices else np.zeros(0, dtype=np.intp)
 
-def recenter_geometry_avg_factory(stats):
-    def recenter_geometry_avg(group):
-        all_points = [point for geometry in group["geometry"] for point in _collect_points(geometry)]
-        if not all_points:
-            return group
 
-        avg_x = sum(point[0] for point in all_points) / len(all_points)
-        avg_y = sum(point[1] for point in all_points) / len(all_points)
+def recenter_incremental(
+    df: pd.DataFrame, group_id: str, output_path: Path, stats=None, executor=None, shards: int = 1
+) -> pd.DataFrame:
+    # Recenter only units whose source rows changed since the last run and take
+    # the rest from the existing store. Rows come out ordered by group exactly
+    # like a full run. Returns the unit diff (see incremental.diff_units).
+    hash_columns = sorted(set(df.columns) - {"site_id", group_id})
+    units, unit_rows = bookie.build_unit_index(df, group_id)
+    with metrics.step("hash"):
+        current = bookie.unit_source_hashes(df, group_id, hash_columns, units, unit_rows)
 
-        x_translation = -avg_x
-        y_translation = -avg_y
+    table_path = incremental.sources_path(output_path, group_id)
+    previous = incremental.load_sources(table_path) if output_path.exists() else None
+    diff = incremental.diff_units(current, previous, group_id)
 
-        group["recentered_geometry"] = group["geometry"].apply(
-            lambda geom: translate(geom, x_translation, y_translation)
-        )
+    def keys_with(*statuses) -> set:
+        rows = diff["status"].isin(statuses)
+        return set(zip(diff.loc[rows, "site_id"], diff.loc[rows, group_id]))
 
-        stats["count"] += 1
-        stats["points"] += len(all_points)
-        print(
-            f"\nunit No {stats['count']} successfully relocated to origin. "
-            f"Moved total {stats['points']} points"
-        )
+    metrics.count("skipped", int((diff["status"] == incremental.UNCHANGED).sum()))
+    redo_rows = _rows_of_units(units, unit_rows, group_id, keys_with(incremental.NEW, incremental.CHANGED))
+    if executor is not None:
+        recentered = recenter_geometries_parallel(df.iloc[redo_rows], group_id, executor, shards, stats)
+    else:
+        recentered = recenter_geometries(df.iloc[redo_rows], group_id, stats)
+    # Unchanged Parquet rows keep their WKB as is; CSV rows are parsed so both
+    # parts hold shapely objects. The parallel recenter already returns WKB.
+    parquet = geostore.is_parquet(output_path)
+    if parquet != (executor is not None):
+        convert = shapely.to_wkb if parquet else geostore.ensure_geometry
+        for column in geostore.GEOMETRY_COLUMNS:
+            recentered[column] = convert(recentered[column].to_numpy())
 
-        return group
+    parts = [recentered]
+    if previous is not None:
+        stored = geostore.read_geometries(output_path, parse=not parquet)
+        stored_units, stored_rows = bookie.build_unit_index(stored, group_id)
+        keep_rows = _rows_of_units(stored_units, stored_rows, group_id, keys_with(incremental.UNCHANGED))
+        parts.insert(0, stored.iloc[keep_rows][list(recentered.columns)])
 
-    return recenter_geometry_avg
+    combined, _codes, _n_groups = _sort_by_group(pd.concat(parts, ignore_index=True), group_id)
+
+    tmp_path = output_path.with_name(f".{output_path.stem}.tmp{output_path.suffix}")
+    with metrics.step("write"):
+        geostore.write_geometries(combined, tmp_path)
+    os.replace(tmp_path, output_path)
+    incremental.save_sources(current, table_path)
+    return diff
 
 
 def plot_sample(apartment_data):
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots()
 
-    for _, row in apartment_data.iterrows():
-        if isinstance(row["recentered_geometry"], Polygon):
-            x, y = row["recentered_geometry"].exterior.xy
+    for geometry in geostore.ensure_geometry(apartment_data["recentered_geometry"]):
+        if isinstance(geometry, shapely.Polygon):
+            x, y = geometry.exterior.xy
             ax.fill(x, y, alpha=0.5)
             ax.plot(x, y, color="black")
-        elif isinstance(row["recentered_geometry"], MultiPolygon):
-            for polygon in row["recentered_geometry"].geoms:
+        elif isinstance(geometry, shapely.MultiPolygon):
+            for polygon in geometry.geoms:
                 x, y = polygon.exterior.xy
                 ax.fill(x, y, alpha=0.5)
                 ax.plot(x, y, color="black")
@@ -70,7 +235,7 @@ def plot_sample(apartment_data):
     plt.show()
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv=None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Recenter Swiss Dwellings geometries.")
     parser.add_argument(
         "--input-csv",
@@ -84,33 +249,70 @@ def parse_args() -> argparse.Namespace:
         help="Column to group by for recentering (e.g., apartment_id, floor_id).",
     )
     parser.add_argument(
+        "--output",
         "--output-csv",
+        dest="output",
         type=Path,
         default=None,
-        help="Output CSV path. Defaults to data/processed/sdd_recentered/.",
+        help="Output path (.parquet or .csv). Defaults to data/processed/sdd_recentered/.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["parquet", "csv"],
+        default="parquet",
+        help="Output format when --output is not given. Parquet stores WKB geometry and typed ids.",
     )
     parser.add_argument(
         "--chunksize",
         type=int,
-        default=100,
-        help="CSV read chunk size.",
+        default=None,
+        help="CSV read chunk size (default: 100, or 200000 with --stream).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Recenter chunk by chunk and write rows as they are ready (groups must be contiguous in the input).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Recenter units on a process pool of this size. Output matches the serial run.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Recenter only units whose source rows changed since the last run into the existing --output.",
     )
     parser.add_argument(
         "--plot-sample",
         action="store_true",
         help="Plot the first recentered unit for quick validation.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        default=None,
+        help="Append per-step timings and unit counts as JSON lines, or write a Prometheus textfile (.prom).",
+    )
+    return parser.parse_args(argv)
 
 
-def main() -> None:
-    args = parse_args()
+def run(args: argparse.Namespace):
+    # Returns the recentered frame, or None with --stream/--incremental (rows are not kept).
+    with metrics.recording("recenter", args.metrics, items="units"):
+        return _run(args)
 
-    output_csv = args.output_csv
-    if output_csv is None:
-        output_csv = paths.processed_sdd_dir() / f"recentered_{args.group_id.replace('_id', '')}_geometries.csv"
 
-    print("\nreading source csv...")
+def _run(args: argparse.Namespace):
+    if args.stream and args.incremental:
+        raise ValueError("--incremental reads the whole input; drop --stream")
+
+    output_path = args.output
+    if output_path is None:
+        output_path = paths.recentered_geometries_path(args.group_id, args.format)
+    output_path = Path(output_path)
+
     usecols = {
         "site_id",
         "apartment_id",
@@ -119,15 +321,55 @@ def main() -> None:
         "geometry",
         args.group_id,
     }
-    df = bookie.read_csv_with_progress(args.input_csv, chunksize=args.chunksize, usecols=usecols)
-    print("\ninflating WKT into shapely shapes...")
-    df["geometry"] = df["geometry"].apply(wkt.loads)
-
     stats = {"count": 0, "points": 0}
-    recenter_fn = recenter_geometry_avg_factory(stats)
+    shards = args.workers * 4
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else nullcontext()
 
-    print("\nrecentering geometries...")
-    df = df.groupby(args.group_id).apply(recenter_fn).reset_index(drop=True)
+    with pool as executor:
+        if args.stream:
+            chunksize = args.chunksize or STREAM_CHUNKSIZE
+            paths.ensure_dir(output_path.parent)
+            print(f"\nstreaming recentered data to {output_path}...")
+            first_unit = None
+            with geostore.GeometryWriter(output_path) as writer:
+                for chunk in iter_recentered_chunks(
+                    args.input_csv, args.group_id, usecols, chunksize, stats, executor, shards
+                ):
+                    if first_unit is None and len(chunk):
+                        first_unit = chunk[chunk[args.group_id] == chunk[args.group_id].iloc[0]]
+                    with metrics.step("write"):
+                        writer.write(chunk)
+            print(f"\n{stats['count']} units successfully relocated to origin. Moved total {stats['points']} points")
+
+            if args.plot_sample and first_unit is not None:
+                print("\nplotting the first unit...")
+                plot_sample(first_unit)
+            return None
+
+        print("\nreading source csv...")
+        with metrics.step("read"):
+            df = bookie.read_csv_with_progress(
+                args.input_csv, chunksize=args.chunksize or 100, usecols=usecols, dtype=SOURCE_DTYPES
+            )
+
+        if args.incremental:
+            paths.ensure_dir(output_path.parent)
+            print(f"\nupdating {output_path} incrementally...")
+            diff = recenter_incremental(df, args.group_id, output_path, stats, executor, shards)
+            print(f"\nunits: {incremental.summary(diff)}")
+            print(f"\n{stats['count']} units successfully relocated to origin. Moved total {stats['points']} points")
+            return None
+
+        if executor is not None:
+            print(f"\nrecentering geometries on {args.workers} workers...")
+            df = recenter_geometries_parallel(df, args.group_id, executor, shards, stats)
+        else:
+            print("\ninflating WKT into shapely shapes...")
+            with metrics.step("parse"):
+                df["geometry"] = geostore.ensure_geometry(df["geometry"])
+            print("\nrecentering geometries...")
+            df = recenter_geometries(df, args.group_id, stats)
+    print(f"\n{stats['count']} units successfully relocated to origin. Moved total {stats['points']} points")
 
     if args.plot_sample:
         print("\nplotting the first unit...")
@@ -135,10 +377,15 @@ def main() -> None:
         first_unit = df[df[args.group_id] == first_unit_id]
         plot_sample(first_unit)
 
-    output_csv = Path(output_csv)
-    paths.ensure_dir(output_csv.parent)
-    print(f"\nsaving recentered data to {output_csv}...")
-    df.to_csv(output_csv, index=False)
+    paths.ensure_dir(output_path.parent)
+    print(f"\nsaving recentered data to {output_path}...")
+    with metrics.step("write"):
+        geostore.write_geometries(df, output_path)
+    return df
+
+
+def main() -> None:
+    run(parse_args())
     print("goodbye")
 
 
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import os
+import socket
+import sqlite3
+from pathlib import Path
+
+# Persistent dedupe index for rendered units. Maps a render configuration
+# (backend, palettes, sizes, extent, ...; see fp_renderer.render_config) and a
+# unit fingerprint (see bookie.get_unit_fingerprint) to the PNG it produced,
+# so reruns, crash recovery and parallel workers skip units that are already
+# on disk for that configuration, while a new palette or extent draws them
+# again. Claims carry the host and pid of the run that made them, so a run
+# only ever releases its own claims or those of a run that has died. Within a
+# run, a claim with a lower rank (the unit ordinal) takes a fingerprint over
+# from a higher one, so parallel workers end up with the same unit per
+# fingerprint as a serial run.
+
+CLAIMED = "claimed"
+RENDERED = "rendered"
+SKIPPED = "skipped"
+
+
+class RenderIndex:
+    """SQLite table of unit fingerprints and their render outcome."""
+
+    def __init__(
+        self,
+        path: Path | str = ":memory:",
+        timeout: float = 60.0,
+        config: str = "",
+        owner: str | None = None,
+    ):
+        # owner: run that makes the claims; pool workers pass their parent's.
+        self.path = str(path)
+        self.config = config
+        self.owner = owner or run_owner()
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._ranks = {}
+        self._conn = sqlite3.connect(self.path, timeout=timeout, isolation_level=None)
+        if self.path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(units)")}
+        if columns and "config" not in columns:
+            # Indexes from before the configuration was part of the key cannot
+            # tell which palette/extent a unit was drawn with.
+            self._conn.execute("DROP TABLE units")
+        elif columns and "rank" not in columns:
+            self._conn.execute("ALTER TABLE units ADD COLUMN rank INTEGER")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS units ("
+            "config TEXT NOT NULL, hash TEXT NOT NULL, status TEXT NOT NULL, path TEXT, "
+            "site_id TEXT, unit_id TEXT, owner TEXT, rank INTEGER, PRIMARY KEY (config, hash))"
+        )
+
+    def lookup(self, unit_hash: str):
+        return self._conn.execute(
+            "SELECT status, path FROM units WHERE config = ? AND hash = ?", (self.config, unit_hash)
+        ).fetchone()
+
+    def claim(self, unit_hash: str, site_id=None, unit_id=None, rank: int | None = None) -> bool:
+        # Returns True if this caller owns the unit. Rendered entries whose file
+        # has disappeared are dropped so the unit is drawn again. With a rank,
+        # an entry of this run with a higher rank is taken over; its holder's
+        # finish/skip then no longer apply and its outputs are left to the caller.
+        row = self.lookup(unit_hash)
+        if row is not None and row[0] == RENDERED and row[1] and not Path(row[1]).exists():
+            self._conn.execute(
+                "DELETE FROM units WHERE config = ? AND hash = ? AND status = ?", (self.config, unit_hash, RENDERED)
+            )
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO units (config, hash, status, site_id, unit_id, owner, rank) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.config, unit_hash, CLAIMED, _text(site_id), _text(unit_id), self.owner, rank),
+        )
+        if cursor.rowcount == 0 and rank is not None:
+            cursor = self._conn.execute(
+                "UPDATE units SET status = ?, path = NULL, site_id = ?, unit_id = ?, rank = ? "
+                "WHERE config = ? AND hash = ? AND owner = ? AND rank > ?",
+                (CLAIMED, _text(site_id), _text(unit_id), rank, self.config, unit_hash, self.owner, rank),
+            )
+        if cursor.rowcount == 1:
+            self._ranks[unit_hash] = rank
+        return cursor.rowcount == 1
+
+    def finish(self, unit_hash: str, path: Path | str) -> None:
+        self._conn.execute(
+            "UPDATE units SET status = ?, path = ? WHERE config = ? AND hash = ? AND rank IS ?",
+            (RENDERED, str(path), self.config, unit_hash, self._ranks.get(unit_hash)),
+        )
+
+    def skip(self, unit_hash: str) -> None:
+        self._conn.execute(
+            "UPDATE units SET status = ? WHERE config = ? AND hash = ? AND rank IS ?",
+            (SKIPPED, self.config, unit_hash, self._ranks.get(unit_hash)),
+        )
+
+    def release(self, unit_hash: str) -> None:
+        self._conn.execute(
+            "DELETE FROM units WHERE config = ? AND hash = ? AND status = ?", (self.config, unit_hash, CLAIMED)
+        )
+
+    def forget(self, unit_hash: str) -> None:
+        # Drop a unit whatever its status and configuration, e.g. after
+        # deleting its outputs (which removes every variant of it).
+        self._conn.execute("DELETE FROM units WHERE hash = ?", (unit_hash,))
+
+    def release_claims(self) -> int:
+        # This run's unfinished claims, e.g. after an error; call when done.
+        cursor = self._conn.execute("DELETE FROM units WHERE status = ? AND owner = ?", (CLAIMED, self.owner))
+        return cursor.rowcount
+
+    def release_stale_claims(self) -> int:
+        # Claims left behind by runs on this host that are no longer alive.
+        # Claims of live runs (e.g. other shards) and of other hosts are kept.
+        owners = self._conn.execute("SELECT DISTINCT owner FROM units WHERE status = ?", (CLAIMED,)).fetchall()
+        released = 0
+        for (owner,) in owners:
+            if owner is None or not _owner_alive(owner):
+                cursor = self._conn.execute(
+                    "DELETE FROM units WHERE status = ? AND owner IS ?", (CLAIMED, owner)
+                )
+                released += cursor.rowcount
+        return released
+
+    def rendered_paths(self) -> dict:
+        rows = self._conn.execute(
+            "SELECT hash, path FROM units WHERE config = ? AND status = ?", (self.config, RENDERED)
+        )
+        return dict(rows.fetchall())
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "RenderIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def run_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner: str) -> bool:
+    # Only processes on this host can be checked; others count as alive.
+    host, _sep, pid = owner.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+from . import paths
+
+# Deterministic train/test split. Each sample is assigned from a hash of its
+# unit (or site) id, so the split does not depend on listing order, is stable
+# across reruns and keeps every image of a unit/site on one side. Splits are
+# materialized as hardlinks, symlinks or a single CSV instead of copies, and
+# reruns only touch files whose assignment changed.
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg"}
+SPLITS = ("train", "test")
+
+
+def list_images(folder: Path) -> list[Path]:
+    return sorted(path for path in folder.iterdir() if path.suffix.lower() in IMAGE_SUFFIXES)
+
+
+def hash_fraction(key: str, seed: str = "") -> float:
+    # Uniform in [0, 1), stable across processes and platforms (unlike hash()).
+    digest = hashlib.blake2b(f"{seed}\x00{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+def assign_split(key: str, test_ratio: float, seed: str = "") -> str:
+    return "test" if hash_fraction(key, seed) < test_ratio else "train"
+
+
+def _read_rows(path: Path) -> list[dict]:
+    with open(path, newline="") as handle:
+        return list(csv.DictReader(handle))
+
+
+def load_render_manifest(path: Path) -> dict:
+    # file name -> (site_id, unit id); later rows win, as reruns append.
+    rows = _read_rows(path)
+    if not rows:
+        return {}
+    unit_column = next(column for column in rows[0] if column not in ("file", "site_id", "hash"))
+    return {row["file"]: (row["site_id"], row[unit_column]) for row in rows}
+
+
+def load_pairs_index(path: Path) -> dict:
+    # Pair file name -> target image name (see make_pix2pix_pairs pairs.csv).
+    return {row["file"]: Path(row["target"]).name for row in _read_rows(path)}
+
+
+def sample_key(name: str, group_by: str, units: dict, pairs: dict) -> str:
+    source = pairs.get(name, name)
+    if source not in units:
+        return f"file:{Path(source).stem}"
+    site_id, unit_id = units[source]
+    return f"site:{site_id}" if group_by == "site" else f"unit:{site_id}/{unit_id}"
+
+
+def _materialize(source: Path, dest: Path, mode: str) -> str:
+    if mode == "symlink":
+        dest.symlink_to(source.resolve())
+        return mode
+    if mode == "hardlink":
+        try:
+            os.link(source, dest)
+            return mode
+        except OSError:
+            pass  # cross-device or unsupported; fall back to a copy
+    shutil.copy2(source, dest)
+    return "copy"
+
+
+def _same_copy(source: Path, dest: Path) -> bool:
+    # copy2 keeps the source mtime, so a re-rendered source of the same size
+    # still differs from its old copy.
+    source_stat, dest_stat = source.stat(), dest.stat()
+    return source_stat.st_size == dest_stat.st_size and source_stat.st_mtime_ns == dest_stat.st_mtime_ns
+
+
+def _is_current(source: Path, dest: Path, mode: str) -> bool:
+    if mode == "symlink":
+        return dest.is_symlink() and os.readlink(dest) == str(source.resolve())
+    try:
+        if mode == "hardlink" and os.path.samefile(source, dest):
+            return True
+        # Copies, including hardlinks that fell back to a copy.
+        return _same_copy(source, dest)
+    except FileNotFoundError:
+        return False
+
+
+def sync_split_dir(files: list[Path], dest_dir: Path, mode: str) -> dict:
+    # Make dest_dir hold exactly `files`: add missing ones, relink changed ones,
+    # remove images that are no longer assigned here.
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    wanted = {source.name: source for source in files}
+    counts = {"kept": 0, "added": 0, "removed": 0, "copied": 0}
+
+    for dest in list_images(dest_dir):
+        if dest.name not in wanted:
+            dest.unlink()
+            counts["removed"] += 1
+
+    for name, source in wanted.items():
+        dest = dest_dir / name
+        if dest.exists() or dest.is_symlink():
+            if _is_current(source, dest, mode):
+                counts["kept"] += 1
+                continue
+            dest.unlink()
+        if _materialize(source, dest, mode) == "copy" and mode != "copy":
+            counts["copied"] += 1
+        counts["added"] += 1
+    return counts
+
+
+def split_samples(
+    source_dir: Path,
+    test_ratio: float = 0.5,
+    group_by: str = "unit",
+    seed: str = "",
+    render_manifest: Path | None = None,
+    pairs_index: Path | None = None,
+) -> list[tuple[Path, str, str]]:
+    units = load_render_manifest(render_manifest) if render_manifest and render_manifest.exists() else {}
+    pairs = load_pairs_index(pairs_index) if pairs_index and pairs_index.exists() else {}
+    assignments = []
+    for path in list_images(source_dir):
+        key = sample_key(path.name, group_by, units, pairs)
+        assignments.append((path, key, assign_split(key, test_ratio, seed)))
+    return assignments
+
+
+def write_split_manifest(assignments, path: Path) -> None:
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["file", "split", "key"])
+        for source, key, split in assignments:
+            writer.writerow([str(source), split, key])
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Split images into train/test by a stable hash of their unit.")
+    parser.add_argument("--source", type=Path, default=paths.fp_complete_dir(), help="Folder with images to split.")
+    parser.add_argument("--train-dir", type=Path, default=paths.data_root() / "splits" / "train")
+    parser.add_argument("--test-dir", type=Path, default=paths.data_root() / "splits" / "test")
+    parser.add_argument("--test-ratio", type=float, default=0.5, help="Expected share of samples in test.")
+    parser.add_argument(
+        "--group-by",
+        choices=["unit", "site"],
+        default="unit",
+        help="Hash the unit id, or the site id so no site appears on both sides.",
+    )
+    parser.add_argument("--seed", default="", help="Salt for the hash; change it to draw a different split.")
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        default=paths.fp_complete_dir() / "manifest.csv",
+        help="fp_renderer manifest mapping image names to site/unit ids.",
+    )
+    parser.add_argument(
+        "--pairs",
+        type=Path,
+        default=None,
+        help="make_pix2pix_pairs pairs.csv mapping pair images to their targets. Defaults to <source>/pairs.csv.",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["hardlink", "symlink", "copy", "manifest"],
+        default="hardlink",
+        help="How to materialize the split; manifest only writes a CSV.",
+    )
+    parser.add_argument(
+        "--split-manifest",
+        type=Path,
+        default=None,
+        help="CSV with file,split,key rows. Defaults to split.csv next to the train dir.",
+    )
+    return parser.parse_args(argv)
+
+
+def run(args: argparse.Namespace) -> None:
+    if not 0 <= args.test_ratio <= 1:
+        raise ValueError(f"--test-ratio must be in [0, 1], got {args.test_ratio}")
+    assignments = split_samples(
+        args.source,
+        test_ratio=args.test_ratio,
+        group_by=args.group_by,
+        seed=args.seed,
+        render_manifest=args.manifest,
+        pairs_index=args.pairs or args.source / "pairs.csv",
+    )
+    if not assignments:
+        print(f"No images found in {args.source}")
+        return
+
+    unresolved = sum(key.startswith("file:") for _source, key, _split in assignments)
+    if unresolved:
+        print(f"{unresolved} of {len(assignments)} images have no manifest entry; split by file name")
+
+    # Next to the splits rather than in the source folder, which belongs to the
+    # renderer or the pair builder.
+    split_manifest = args.split_manifest or args.train_dir.parent / "split.csv"
+    split_manifest.parent.mkdir(parents=True, exist_ok=True)
+    write_split_manifest(assignments, split_manifest)
+
+    for split, dest_dir in zip(SPLITS, (args.train_dir, args.test_dir)):
+        files = [source for source, _key, assigned in assignments if assigned == split]
+        if args.mode == "manifest":
+            print(f"{split}: {len(files)} images")
+            continue
+        counts = sync_split_dir(files, dest_dir, args.mode)
+        print(
+            f"{split}: {len(files)} images in {dest_dir} "
+            f"({counts['added']} added, {counts['removed']} removed, {counts['kept']} unchanged)"
+        )
+        if counts["copied"]:
+            print(f"  {counts['copied']} copied because {args.mode} is not supported there")
+    print(f"split written to {split_manifest}")
+
+
+def main() -> None:
+    run(parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+from pathlib import Path
+
+from . import paths
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+shapely = lazy_import("shapely")
+
+# Synthetic stand-in for the Swiss Dwellings geometries.csv, for benchmarks and
+# smoke runs without the licensed release. Sites hold buildings, buildings hold
+# stacked floors, floors hold apartments side by side along a corridor. Each
+# apartment footprint (35-160 m2) is split guillotine-style into rooms with
+# walls on the split lines and facade, doors between rooms, windows, bathroom
+# and kitchen fixtures and an optional balcony. Like the release it contains
+# MultiPolygons (facade walls broken by the entrance door, two-part balconies),
+# public staircases without an apartment id, repeated typical floors (content
+# duplicates for the render index) and maisonnettes spanning two floors.
+
+COLUMNS = [
+    "apartment_id",
+    "site_id",
+    "building_id",
+    "plan_id",
+    "floor_id",
+    "unit_id",
+    "area_id",
+    "unit_usage",
+    "entity_type",
+    "entity_subtype",
+    "geometry",
+]
+
+WALL = 0.25
+INNER_WALL = 0.12
+DOOR_WIDTH = 0.9
+CORRIDOR_DEPTH = 1.6
+
+
+def _apartment_id(seed: int, *key) -> str:
+    return hashlib.blake2b(f"{seed}:{key}".encode(), digest_size=16).hexdigest()
+
+
+def _split_rooms(rng, x0, y0, x1, y1, n_rooms: int):
+    # Guillotine split: keep cutting the largest room across its longer side.
+    # Returns the rooms and the cut lines as (axis, position, low, high).
+    rooms = [(x0, y0, x1, y1)]
+    cuts = []
+    while len(rooms) < n_rooms:
+        areas = [(r[2] - r[0]) * (r[3] - r[1]) for r in rooms]
+        rx0, ry0, rx1, ry1 = rooms.pop(int(np.argmax(areas)))
+        share = rng.uniform(0.35, 0.65)
+        if rx1 - rx0 >= ry1 - ry0:
+            x = rx0 + share * (rx1 - rx0)
+            rooms += [(rx0, ry0, x, ry1), (x, ry0, rx1, ry1)]
+            cuts.append(("x", x, ry0, ry1))
+        else:
+            y = ry0 + share * (ry1 - ry0)
+            rooms += [(rx0, ry0, rx1, y), (rx0, y, rx1, ry1)]
+            cuts.append(("y", y, rx0, rx1))
+    return rooms, cuts
+
+
+def _room_subtypes(rng, rooms, upper: bool = False) -> list[str]:
+    order = np.argsort([(r[2] - r[0]) * (r[3] - r[1]) for r in rooms])
+    subtypes = ["ROOM"] * len(rooms)
+    subtypes[order[0]] = "BATHROOM"
+    if upper:
+        if len(rooms) > 2:
+            subtypes[order[1]] = "CORRIDOR"
+        return subtypes
+    subtypes[order[-1]] = "LIVING_ROOM"
+    if len(rooms) > 2:
+        subtypes[order[1]] = "KITCHEN"
+    if len(rooms) > 3:
+        subtypes[order[2]] = "CORRIDOR"
+    if len(rooms) > 5 and rng.random() < 0.5:
+        subtypes[order[3]] = "STOREROOM"
+    return subtypes
+
+
+def _fixtures(rng, room, subtype: str):
+    # (entity_type, entity_subtype, geometry) placed along the room's walls.
+    x0, y0, x1, y1 = room
+    found = []
+    if subtype == "BATHROOM":
+        found.append(("feature", "TOILET", shapely.box(x0 + 0.1, y1 - 0.7, x0 + 0.5, y1 - 0.1)))
+        found.append(("feature", "SINK", shapely.box(x0 + 0.7, y1 - 0.5, x0 + 1.2, y1 - 0.1)))
+        if x1 - x0 > 1.9 and y1 - y0 > 1.9 and rng.random() < 0.5:
+            found.append(("feature", "BATHTUB", shapely.box(x1 - 0.85, y0 + 0.1, x1 - 0.1, y0 + 1.8)))
+        else:
+            found.append(("feature", "SHOWER", shapely.box(x1 - 1.0, y0 + 0.1, x1 - 0.1, y0 + 1.0)))
+        if rng.random() < 0.5:
+            found.append(("feature", "SHAFT", shapely.box(x0 + 0.1, y0 + 0.1, x0 + 0.5, y0 + 0.5)))
+    elif subtype == "KITCHEN":
+        length = min(x1 - x0 - 0.2, rng.uniform(1.8, 3.6))
+        found.append(("feature", "KITCHEN", shapely.box(x0 + 0.1, y1 - 0.7, x0 + 0.1 + length, y1 - 0.1)))
+        found.append(("feature", "SINK", shapely.box(x0 + 0.4, y1 - 0.6, x0 + 0.9, y1 - 0.2)))
+    return found
+
+
+def _apartment_rows(rng, x0, y0, width: float, depth: float, n_rooms: int, upper: bool = False):
+    # Rows of one apartment level as (entity_type, entity_subtype, geometry).
+    # The corridor side is y1, the facade y0.
+    x1, y1 = x0 + width, y0 + depth
+    rooms, cuts = _split_rooms(rng, x0, y0, x1, y1, n_rooms)
+    subtypes = _room_subtypes(rng, rooms, upper)
+    rows = [("area", subtype, shapely.box(*room)) for room, subtype in zip(rooms, subtypes)]
+    for room, subtype in zip(rooms, subtypes):
+        rows += _fixtures(rng, room, subtype)
+
+    for axis, position, low, high in cuts:
+        half = INNER_WALL / 2
+        door = rng.uniform(low + 0.2, max(low + 0.2, high - DOOR_WIDTH - 0.2))
+        if axis == "x":
+            rows.append(("separator", "WALL", shapely.box(position - half, low, position + half, high)))
+            rows.append(("opening", "DOOR", shapely.box(position - half, door, position + half, door + DOOR_WIDTH)))
+        else:
+            rows.append(("separator", "WALL", shapely.box(low, position - half, high, position + half)))
+            rows.append(("opening", "DOOR", shapely.box(door, position - half, door + DOOR_WIDTH, position + half)))
+
+    # Facade and party walls; the corridor wall is broken by the entrance door,
+    # which makes it a MultiPolygon like many walls in the release.
+    rows.append(("separator", "WALL", shapely.box(x0 - WALL, y0 - WALL, x1 + WALL, y0)))
+    rows.append(("separator", "WALL", shapely.box(x0 - WALL, y0, x0, y1)))
+    rows.append(("separator", "WALL", shapely.box(x1, y0, x1 + WALL, y1)))
+    if upper:
+        rows.append(("separator", "WALL", shapely.box(x0 - WALL, y1, x1 + WALL, y1 + WALL)))
+    else:
+        door = x0 + rng.uniform(0.3, width - DOOR_WIDTH - 0.3)
+        rows.append(
+            (
+                "separator",
+                "WALL",
+                shapely.multipolygons(
+                    [
+                        shapely.box(x0 - WALL, y1, door, y1 + WALL),
+                        shapely.box(door + DOOR_WIDTH, y1, x1 + WALL, y1 + WALL),
+                    ]
+                ),
+            )
+        )
+        rows.append(("opening", "ENTRANCE_DOOR", shapely.box(door, y1, door + DOOR_WIDTH, y1 + WALL)))
+
+    facade_rooms = [room for room in rooms if room[1] == y0]
+    for rx0, _ry0, rx1, _ry1 in facade_rooms:
+        span = rng.uniform(0.9, min(2.4, rx1 - rx0 - 0.4)) if rx1 - rx0 > 1.4 else None
+        if span:
+            start = rx0 + (rx1 - rx0 - span) / 2
+            rows.append(("opening", "WINDOW", shapely.box(start, y0 - WALL, start + span, y0)))
+
+    if not upper and rng.random() < 0.6:
+        bx0 = x0 + rng.uniform(0, width / 3)
+        bx1 = min(x1, bx0 + rng.uniform(2.5, 5.0))
+        bdepth = rng.uniform(1.4, 2.4)
+        if rng.random() < 0.25:
+            # Two-part balcony around a column.
+            middle = (bx0 + bx1) / 2
+            balcony = shapely.multipolygons(
+                [
+                    shapely.box(bx0, y0 - WALL - bdepth, middle - 0.15, y0 - WALL),
+                    shapely.box(middle + 0.15, y0 - WALL - bdepth, bx1, y0 - WALL),
+                ]
+            )
+            rows.append(("separator", "COLUMN", shapely.box(middle - 0.15, y0 - WALL - 0.3, middle + 0.15, y0 - WALL)))
+        else:
+            balcony = shapely.box(bx0, y0 - WALL - bdepth, bx1, y0 - WALL)
+        rows.append(("area", "BALCONY", balcony))
+        rows.append(
+            ("separator", "RAILING", shapely.box(bx0, y0 - WALL - bdepth - 0.05, bx1, y0 - WALL - bdepth))
+        )
+    return rows
+
+
+def _floor_plan(rng, n_apartments: int):
+    # Apartment slots of a typical floor: (x offset, width, depth, rooms).
+    slots = []
+    x = 0.0
+    for _ in range(n_apartments):
+        n_rooms = int(rng.integers(2, 8))
+        area = float(np.clip(rng.normal(18 + 17 * n_rooms, 10), 35, 160))
+        depth = float(np.clip(np.sqrt(area / rng.uniform(1.0, 1.8)), 6.0, 12.0))
+        width = area / depth
+        slots.append((x, width, depth, n_rooms, int(rng.integers(1 << 30))))
+        x += width + WALL
+    return slots, x
+
+
+def synthetic_geometries(
+    units: int = 1000,
+    seed: int = 0,
+    typical_floor_share: float = 0.4,
+    maisonnette_share: float = 0.03,
+) -> pd.DataFrame:
+    # geometries.csv-shaped frame with about `units` apartments (WKT geometry).
+    # typical_floor_share: chance a floor repeats the building's typical floor
+    # layout verbatim; maisonnette_share: chance an apartment takes the same
+    # slot on the floor above as its upper level.
+    rng = np.random.default_rng(seed)
+    records = []
+    counters = {"building": 0, "floor": 0, "unit": 0, "area": 0}
+    apartments = 0
+    site = 0
+
+    def emit(apartment_id, site_id, building_id, floor_id, unit_id, usage, rows, ox, oy):
+        for entity_type, subtype, geometry in rows:
+            area_id = None
+            if entity_type == "area":
+                counters["area"] += 1
+                area_id = counters["area"]
+            records.append(
+                (
+                    apartment_id,
+                    site_id,
+                    building_id,
+                    floor_id,
+                    floor_id,
+                    unit_id,
+                    area_id,
+                    usage,
+                    entity_type,
+                    subtype,
+                    shapely.transform(geometry, lambda coords: coords + (ox, oy)),
+                )
+            )
+
+    while apartments < units:
+        site += 1
+        site_x, site_y = rng.uniform(2_480_000, 2_830_000), rng.uniform(1_070_000, 1_290_000)
+        for building in range(int(rng.integers(1, 4))):
+            counters["building"] += 1
+            building_id = counters["building"]
+            ox, oy = site_x + building * 60.0, site_y + rng.uniform(-20, 20)
+            n_floors = int(rng.integers(2, 9))
+            typical, floor_width = _floor_plan(rng, int(rng.integers(2, 7)))
+            floor_ids = []
+            for _ in range(n_floors):
+                counters["floor"] += 1
+                floor_ids.append(counters["floor"])
+            upper_levels = {}
+
+            for level, floor_id in enumerate(floor_ids):
+                repeat = level == 0 or rng.random() < typical_floor_share
+                slots = typical if repeat else _floor_plan(rng, len(typical))[0]
+                scale = 1.0 if repeat else floor_width / max(sum(slot[1] + WALL for slot in slots), 1e-9)
+                for slot_number, (x, width, depth, n_rooms, layout_seed) in enumerate(slots):
+                    if (level, slot_number) in upper_levels:
+                        apartment_id, unit_id, upper = upper_levels.pop((level, slot_number))
+                        emit(apartment_id, site, building_id, floor_id, unit_id, "RESIDENTIAL", upper, ox, oy)
+                        continue
+                    counters["unit"] += 1
+                    apartments += 1
+                    apartment_id = _apartment_id(seed, site, building_id, floor_id, slot_number)
+                    # Repeated floors reuse the slot's layout seed, so their
+                    # apartments are geometrically identical after recentering.
+                    layout = np.random.default_rng(layout_seed) if repeat else rng
+                    rows = _apartment_rows(layout, x * scale, 0.0, width * scale, depth, n_rooms)
+                    emit(apartment_id, site, building_id, floor_id, counters["unit"], "RESIDENTIAL", rows, ox, oy)
+                    if level + 1 < n_floors and rng.random() < maisonnette_share:
+                        upper = _apartment_rows(rng, x * scale, 0.0, width * scale, depth, max(2, n_rooms - 1), upper=True)
+                        upper_levels[(level + 1, slot_number)] = (apartment_id, counters["unit"], upper)
+
+                # Public staircase and landing next to the apartments.
+                stairs = [
+                    ("area", "STAIRCASE", shapely.box(floor_width, 0.0, floor_width + 3.0, 6.0)),
+                    ("feature", "STAIRS", shapely.box(floor_width + 0.3, 0.3, floor_width + 1.4, 5.0)),
+                    ("area", "CORRIDOR", shapely.box(0.0, 12.0 + WALL, floor_width + 3.0, 12.0 + WALL + CORRIDOR_DEPTH)),
+                ]
+                counters["unit"] += 1
+                emit(None, site, building_id, floor_id, counters["unit"], "PUBLIC", stairs, ox, oy)
+
+    df = pd.DataFrame.from_records(records, columns=COLUMNS)
+    df["geometry"] = shapely.to_wkt(df["geometry"].to_numpy(), rounding_precision=4)
+    df["area_id"] = df["area_id"].astype("Float64")
+    return df
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Write a synthetic Swiss Dwellings-like geometries.csv.")
+    parser.add_argument("--units", type=int, default=1000, help="Approximate number of apartments.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same file.")
+    parser.add_argument(
+        "--typical-floor-share",
+        type=float,
+        default=0.4,
+        help="Chance a floor repeats its building's typical layout (content duplicates).",
+    )
+    parser.add_argument(
+        "--maisonnette-share",
+        type=float,
+        default=0.03,
+        help="Chance an apartment continues on the floor above.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=paths.data_root() / "synthetic" / "geometries.csv",
+        help="Output CSV path.",
+    )
+    return parser.parse_args(argv)
+
+
+def run(args: argparse.Namespace) -> pd.DataFrame:
+    df = synthetic_geometries(args.units, args.seed, args.typical_floor_share, args.maisonnette_share)
+    paths.ensure_dir(args.output.parent)
+    df.to_csv(args.output, index=False)
+    apartments = df["apartment_id"].nunique()
+    print(f"\n{len(df)} rows, {apartments} apartments on {df['floor_id'].nunique()} floors written to {args.output}")
+    return df
+
+
+def main() -> None:
+    run(parse_args())
+    print("goodbye")
+
+
+if __name__ == "__main__":
+    main()
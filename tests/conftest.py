@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import pytest
+
+from vssv1 import synthetic
+
+# Small deterministic Swiss Dwellings-like inputs from vssv1.synthetic.
+
+
+@pytest.fixture(scope="session")
+def geometries():
+    return synthetic.synthetic_geometries(units=40, seed=0)
+
+
+@pytest.fixture(scope="session")
+def geometries_csv(tmp_path_factory, geometries):
+    path = tmp_path_factory.mktemp("synthetic") / "geometries.csv"
+    geometries.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def output_root(tmp_path, monkeypatch):
+    # Keep rendered images, indexes and manifests out of the repository.
+    monkeypatch.setenv("VSS_OUTPUT_ROOT", str(tmp_path / "outputs"))
+    return tmp_path / "outputs"
+
+
+@pytest.fixture(scope="session")
+def recentered_parquet(tmp_path_factory, geometries):
+    from vssv1 import geostore, recenter
+
+    path = tmp_path_factory.mktemp("recentered") / "recentered.parquet"
+    geostore.write_geometries(recenter.recenter_geometries(geometries.copy(), "apartment_id"), path)
+    return path
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from vssv1 import boundaries, geostore
+
+
+@pytest.fixture(scope="module")
+def recentered(recentered_parquet):
+    return geostore.read_geometries(recentered_parquet, columns=["recentered_geometry"])
+
+
+def test_histogram_bounds_are_exact_to_one_bin(recentered):
+    histogram = boundaries.CoordinateHistogram(limit=50.0, resolution=0.01)
+    histogram.update(recentered["recentered_geometry"])
+
+    exact = boundaries.percentile_bounds(recentered, 5)
+    assert np.allclose(histogram.bounds(5), exact, atol=0.01)
+
+
+def test_merged_shards_equal_a_single_pass(recentered):
+    whole = boundaries.CoordinateHistogram()
+    whole.update(recentered["recentered_geometry"])
+    merged = boundaries.CoordinateHistogram()
+    for shard in np.array_split(recentered["recentered_geometry"].to_numpy(), 3):
+        part = boundaries.CoordinateHistogram()
+        part.update(shard)
+        merged.merge(part)
+
+    assert np.array_equal(merged.counts, whole.counts)
+    assert merged.bounds(5) == whole.bounds(5)
+
+
+def test_merge_rejects_other_grids():
+    with pytest.raises(ValueError):
+        boundaries.CoordinateHistogram(resolution=0.01).merge(boundaries.CoordinateHistogram(resolution=0.02))
+
+
+def test_saved_histograms_merge_like_the_cli(tmp_path, recentered_parquet):
+    whole = boundaries.stream_histogram(recentered_parquet, batch_size=500)
+    saved = whole.save(tmp_path / "shard.npz")
+
+    merged = boundaries.CoordinateHistogram.load(saved).merge(boundaries.CoordinateHistogram.load(saved))
+    assert merged.total == 2 * whole.total
+    assert np.allclose(merged.bounds(5), whole.bounds(5), atol=whole.resolution)
+
+
+def test_run_matches_the_exact_percentiles(recentered_parquet, recentered):
+    args = boundaries.parse_args(["--recentered", str(recentered_parquet), "--view", "none"])
+    assert boundaries.run(args) == boundaries.percentile_bounds(recentered, 5)
+
+
+def test_chunked_all_bounds_match_the_whole_set(recentered_parquet, recentered):
+    argv = ["--recentered", str(recentered_parquet), "--method", "all", "--view", "none", "--batch-size", "300"]
+    assert boundaries.run(boundaries.parse_args(argv)) == boundaries.all_bounds(recentered)
+
+
+def test_density_preview_is_built_from_chunks(tmp_path, recentered_parquet, recentered):
+    preview = tmp_path / "bounds.png"
+    argv = ["--recentered", str(recentered_parquet), "--batch-size", "300", "--output", str(preview)]
+    assert boundaries.run(boundaries.parse_args(argv)) == boundaries.percentile_bounds(recentered, 5)
+    assert preview.stat().st_size > 0
+
+    whole = boundaries.DensityGrid()
+    whole.update(recentered["recentered_geometry"])
+    chunked = boundaries.DensityGrid()
+    for geometries in boundaries.geometry_batches(recentered_parquet, batch_size=300):
+        chunked.update(geometries)
+    assert np.array_equal(chunked.counts, whole.counts)
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+import shapely
+
+from vssv1 import geostore
+
+
+@pytest.fixture
+def frame(geometries):
+    df = geometries[["site_id", "apartment_id", "area_id", "entity_type", "geometry"]].head(200).copy()
+    df["recentered_geometry"] = geostore.ensure_geometry(df["geometry"])
+    return df
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".csv"])
+def test_round_trip_keeps_geometries(tmp_path, frame, suffix):
+    path = geostore.write_geometries(frame, tmp_path / f"store{suffix}")
+    back = geostore.read_geometries(path)
+
+    assert list(back.columns) == list(frame.columns)
+    assert len(back) == len(frame)
+    expected = geostore.ensure_geometry(frame["geometry"])
+    assert shapely.equals(back["geometry"].to_numpy(), expected).all()
+    assert shapely.equals(back["recentered_geometry"].to_numpy(), expected).all()
+
+
+def test_parquet_stores_wkb_and_typed_ids(tmp_path, frame):
+    path = geostore.write_geometries(frame, tmp_path / "store.parquet")
+    schema = pq.read_schema(path)
+
+    assert str(schema.field("geometry").type) == "binary"
+    assert str(schema.field("site_id").type) == "int64"
+    assert geostore.is_wkb(geostore.read_geometries(path, parse=False)["geometry"])
+
+
+def test_chunked_writes_match_one_write(tmp_path, frame):
+    with geostore.GeometryWriter(tmp_path / "chunked.parquet") as writer:
+        for start in range(0, len(frame), 64):
+            writer.write(frame.iloc[start : start + 64])
+    whole = geostore.write_geometries(frame, tmp_path / "whole.parquet")
+
+    chunked = geostore.read_geometries(writer.path, parse=False)
+    assert chunked.equals(geostore.read_geometries(whole, parse=False))
+
+
+def test_iter_geometry_chunks_covers_the_store(tmp_path, frame):
+    path = geostore.write_geometries(frame, tmp_path / "store.parquet")
+    chunks = list(geostore.iter_geometry_chunks(path, columns=["site_id", "geometry"], batch_size=50))
+
+    assert [len(chunk) for chunk in chunks] == [50, 50, 50, 50]
+    assert np.concatenate([chunk["site_id"] for chunk in chunks]).tolist() == frame["site_id"].tolist()
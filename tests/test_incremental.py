@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import shapely
+
+from vssv1 import fp_renderer, geostore, incremental, paths, recenter
+
+
+def test_diff_units_labels_every_unit():
+    previous = pd.DataFrame({"site_id": [1, 1, 1], "unit": ["a", "b", "c"], "source_hash": ["1", "2", "3"]})
+    current = pd.DataFrame({"site_id": [1, 1, 1], "unit": ["a", "b", "d"], "source_hash": ["1", "9", "4"]})
+
+    diff = incremental.diff_units(current, previous, "unit")
+    status = dict(zip(diff["unit"], diff["status"]))
+    assert status == {
+        "a": incremental.UNCHANGED,
+        "b": incremental.CHANGED,
+        "c": incremental.DELETED,
+        "d": incremental.NEW,
+    }
+    assert set(incremental.diff_units(current, None, "unit")["status"]) == {incremental.NEW}
+
+
+def _stretch(frame, rows, factor):
+    stretched = shapely.transform(geostore.ensure_geometry(frame.loc[rows, "geometry"]), lambda coords: coords * factor)
+    frame.loc[rows, "geometry"] = shapely.to_wkt(stretched, rounding_precision=4)
+
+
+def _release(geometries, path, deleted=None, changed=None, added=None):
+    # Writes a release without `deleted`, with `changed` stretched by 2% along
+    # y and with `added` stretched along x, so it cannot duplicate a unit.
+    release = geometries[geometries["apartment_id"] != deleted].copy()
+    _stretch(release, release["apartment_id"] == changed, [1.0, 1.02])
+    _stretch(release, release["apartment_id"] == added, [1.03, 1.0])
+    release.to_csv(path, index=False)
+    return path
+
+
+def _recenter(input_csv, output, *extra):
+    argv = ["--input-csv", str(input_csv), "--group-id", "apartment_id", "--output", str(output), *extra]
+    recenter.run(recenter.parse_args(argv))
+
+
+def test_incremental_recenter_matches_a_full_run(tmp_path, geometries):
+    deleted, changed, added = geometries["apartment_id"].dropna().unique()[:3]
+    first = _release(geometries, tmp_path / "first.csv", deleted=added)
+    second = _release(geometries, tmp_path / "second.csv", deleted=deleted, changed=changed)
+    _recenter(first, tmp_path / "incremental.parquet", "--incremental")
+    _recenter(second, tmp_path / "incremental.parquet", "--incremental")
+    _recenter(second, tmp_path / "full.parquet")
+
+    incremental_rows = geostore.read_geometries(tmp_path / "incremental.parquet", parse=False)
+    assert incremental_rows.equals(geostore.read_geometries(tmp_path / "full.parquet", parse=False))
+
+
+def test_incremental_render_follows_the_release(tmp_path, output_root, geometries):
+    recentered = tmp_path / "recentered.parquet"
+    argv = ["--recentered", str(recentered), "--backend", "raster", "--size", "32", "--end-row", "100000"]
+    argv.append("--incremental")
+    manifest_path = Path(paths.fp_complete_dir()) / "manifest.csv"
+
+    def render(release):
+        _recenter(release, recentered, "--incremental")
+        fp_renderer.run(fp_renderer.parse_args(argv))
+        return incremental.read_manifest(manifest_path)
+
+    # Units sharing a fingerprint render once, so pick the deleted and changed
+    # unit among the ones the first release actually rendered.
+    added = geometries["apartment_id"].dropna().unique()[-1]
+    before = render(_release(geometries, tmp_path / "first.csv", deleted=added))
+    deleted, changed = sorted(before["apartment_id"])[:2]
+    after = render(_release(geometries, tmp_path / "second.csv", deleted=deleted, changed=changed, added=added))
+
+    assert deleted not in set(after["apartment_id"])
+    assert added in set(after["apartment_id"])
+    changed_before = before.loc[before["apartment_id"] == changed, "hash"].tolist()
+    changed_after = after.loc[after["apartment_id"] == changed, "hash"].tolist()
+    assert len(changed_after) == 1 and changed_after != changed_before
+    assert sorted(after["file"]) == sorted(path.name for path in Path(paths.fp_complete_dir()).glob("*.png"))
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import pandas as pd
+
+from vssv1 import bookie, geostore, maisonnette
+
+
+def _per_unit_flags(df, threshold):
+    units, unit_rows = bookie.build_unit_index(df, "apartment_id")
+    return [
+        bookie.has_significant_overlap(bookie.area_polygons(df.iloc[unit_rows[start:stop]]), threshold)
+        for start, stop in zip(units["start"], units["stop"])
+    ]
+
+
+def test_dataset_pass_matches_the_per_unit_check(recentered_parquet):
+    df = geostore.read_geometries(recentered_parquet)
+    for threshold in (0.3, 0.5):
+        flags = maisonnette.flag_units(df, "apartment_id", threshold)
+        assert flags["maisonnette"].tolist() == _per_unit_flags(df, threshold)
+
+
+def test_cache_is_kept_per_threshold(tmp_path, recentered_parquet):
+    recentered = tmp_path / recentered_parquet.name
+    recentered.write_bytes(recentered_parquet.read_bytes())
+    df = geostore.read_geometries(recentered)
+
+    loose = maisonnette.load_or_flag(recentered, df, "apartment_id", threshold=0.01)
+    default = maisonnette.load_or_flag(recentered, df, "apartment_id")
+
+    assert maisonnette.cache_path(recentered, "apartment_id", 0.01).exists()
+    assert maisonnette.cache_path(recentered, "apartment_id").exists()
+    assert loose["maisonnette"].sum() >= default["maisonnette"].sum()
+    pd.testing.assert_frame_equal(default, maisonnette.flag_units(df, "apartment_id"))
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from vssv1 import mixer
+
+
+def _write_pairs(folder, count, value):
+    folder.mkdir(parents=True, exist_ok=True)
+    for number in range(count):
+        Image.new("L", (16, 8), value + number).save(folder / f"pair_{number:03d}.png")
+
+
+def _write_mix(tmp_path, ratios, **settings):
+    sources = []
+    for value, (name, ratio) in enumerate(ratios.items(), start=1):
+        _write_pairs(tmp_path / name, 20, value * 50)
+        sources.append({"name": name, "path": name, "ratio": ratio})
+    path = tmp_path / "mix.json"
+    path.write_text(json.dumps({"seed": 0, "sources": sources, **settings}))
+    return path
+
+
+def test_apportion_keeps_the_total():
+    assert mixer.apportion(10, [0.8, 0.2]) == [8, 2]
+    assert mixer.apportion(7, [1, 1, 1]) == [3, 2, 2]
+    assert sum(mixer.apportion(1000, [0.3, 0.3, 0.4])) == 1000
+
+
+def test_mix_follows_ratios_and_is_deterministic(tmp_path):
+    manifest = _write_mix(tmp_path, {"floorplans": 0.75, "snowflakes": 0.25}, total=16)
+    mix = mixer.Mix.from_manifest(manifest)
+
+    assert [row["samples"] for row in mix.summary()] == [12, 4]
+    assert mix.entries == mixer.Mix.from_manifest(manifest).entries
+    assert list(mix.order(1)) == list(mixer.Mix.from_manifest(manifest).order(1))
+
+    # Raising a ratio only adds samples of that source.
+    wider = mixer.Mix.from_manifest(manifest, ratios={"snowflakes": 0.5})
+    before = {ref for position, ref in mix.entries if position == 1}
+    assert before <= {ref for position, ref in wider.entries if position == 1}
+
+    with pytest.raises(ValueError):
+        mixer.Mix.from_manifest(manifest, total=100)
+
+
+def test_pack_round_trips_through_a_source(tmp_path):
+    manifest = _write_mix(tmp_path, {"floorplans": 0.5, "snowflakes": 0.5}, total=10)
+    pack = tmp_path / "packs" / "mixed.npy"
+    mix = mixer.run(mixer.parse_args([str(manifest), "--pack", str(pack), "--pack-layout", "split"]))
+
+    packed = mixer.Source("mixed", pack, 1.0)
+    assert np.load(pack).shape == (10, 2, 8, 8)
+    for row, (_name, _ref, pixels) in enumerate(mix.samples()):
+        assert np.array_equal(packed.read(str(row)), pixels)
+
+
+def test_pack_refuses_to_overwrite_the_manifest(tmp_path):
+    manifest = _write_mix(tmp_path, {"floorplans": 1.0}, total=4)
+    text = manifest.read_text()
+
+    with pytest.raises(ValueError):
+        mixer.run(mixer.parse_args([str(manifest), "--pack", str(tmp_path / "mix.npy")]))
+    with pytest.raises(ValueError):
+        mixer.run(mixer.parse_args([str(manifest), "--pack", str(manifest)]))
+    assert manifest.read_text() == text
+    assert not (tmp_path / "mix.npy").exists()
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from vssv1 import fp_renderer, init_outline, paths
+
+
+def _names(folder) -> list:
+    return sorted(path.name for path in Path(folder).glob("*.png"))
+
+
+def test_in_memory_outlines_match_the_batch_mode(tmp_path, output_root, recentered_parquet):
+    argv = ["--recentered", str(recentered_parquet), "--backend", "raster", "--size", "64", "--end-unit", "20"]
+    fp_renderer.run(fp_renderer.parse_args([*argv, "--naming", "unit", "--outline", "--xray"]))
+    renders = _names(paths.fp_complete_dir())
+    assert renders
+
+    tasks = init_outline.batch_tasks(
+        paths.fp_complete_dir(), tmp_path / "outline", tmp_path / "xray", contour=True, xray=True
+    )
+    (tmp_path / "outline").mkdir()
+    (tmp_path / "xray").mkdir()
+    assert init_outline.run_batch(tasks, workers=2, chunksize=4) == len(renders)
+
+    for live, batch in ((paths.fp_outline_dir(), tmp_path / "outline"), (paths.fp_xray_dir(), tmp_path / "xray")):
+        assert _names(live) == _names(batch)
+        assert len(_names(live)) == len(renders)
+        for name in _names(live):
+            assert (Path(live) / name).read_bytes() == (batch / name).read_bytes()
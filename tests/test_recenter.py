@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+import shapely
+
+from vssv1 import geostore, recenter
+
+
+def _vertex_mean(geometries):
+    coords = geostore.exterior_coordinates(geometries)
+    return coords.mean(axis=0)
+
+
+def test_units_are_centered_on_their_vertex_mean(geometries):
+    out = recenter.recenter_geometries(geometries.copy(), "apartment_id")
+
+    for _unit_id, unit in out.groupby("apartment_id"):
+        original = geostore.ensure_geometry(unit["geometry"])
+        mean = _vertex_mean(original)
+        expected = shapely.transform(original, lambda coords: coords - mean)
+        assert np.allclose(_vertex_mean(unit["recentered_geometry"].to_numpy()), 0.0, atol=1e-6)
+        assert shapely.equals_exact(unit["recentered_geometry"].to_numpy(), expected, tolerance=1e-6).all()
+
+
+def test_rows_without_a_group_are_dropped(geometries):
+    stats = {"count": 0, "points": 0}
+    out = recenter.recenter_geometries(geometries.copy(), "apartment_id", stats)
+
+    grouped = geometries["apartment_id"].notna()
+    assert len(out) == grouped.sum()
+    assert out["apartment_id"].is_monotonic_increasing
+    assert stats["count"] == geometries.loc[grouped, "apartment_id"].nunique()
+
+
+def _recenter_cli(geometries_csv, output, *extra):
+    args = recenter.parse_args(
+        ["--input-csv", str(geometries_csv), "--group-id", "apartment_id", "--output", str(output), *extra]
+    )
+    recenter.run(args)
+    return geostore.read_geometries(output, parse=False)
+
+
+def test_stream_matches_full_run_after_sorting(tmp_path, geometries_csv):
+    full = _recenter_cli(geometries_csv, tmp_path / "full.parquet")
+    stream = _recenter_cli(geometries_csv, tmp_path / "stream.parquet", "--stream", "--chunksize", "300")
+
+    stream = stream.sort_values("apartment_id", kind="stable", ignore_index=True)
+    assert stream.dtypes.equals(full.dtypes)
+    assert stream.equals(full)
+
+
+@pytest.mark.parametrize("mode", [[], ["--stream", "--chunksize", "300"], ["--incremental"]])
+def test_workers_match_serial_run(tmp_path, geometries_csv, mode):
+    serial = _recenter_cli(geometries_csv, tmp_path / "serial.parquet", *mode)
+    parallel = _recenter_cli(geometries_csv, tmp_path / "parallel.parquet", *mode, "--workers", "2")
+
+    assert parallel.equals(serial)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+from pathlib import Path
+
+from vssv1 import fp_renderer, paths, render_index
+from vssv1.render_index import CLAIMED, RENDERED, RenderIndex
+
+
+def _dead_owner() -> str:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return f"{render_index.run_owner().rpartition(':')[0]}:{process.pid}"
+
+
+def test_claims_are_per_configuration(tmp_path):
+    path = tmp_path / "index.sqlite"
+    with RenderIndex(path, config="a") as first, RenderIndex(path, config="b") as other:
+        assert first.claim("h1")
+        assert not first.claim("h1")
+        assert other.claim("h1")
+        assert first.lookup("h1") == (CLAIMED, None)
+
+
+def test_rendered_unit_is_claimable_again_once_its_file_is_gone(tmp_path):
+    render = tmp_path / "FP_1.png"
+    render.write_bytes(b"png")
+    with RenderIndex(tmp_path / "index.sqlite") as index:
+        index.claim("h1")
+        index.finish("h1", render)
+        assert index.lookup("h1") == (RENDERED, str(render))
+        assert not index.claim("h1")
+
+        render.unlink()
+        assert index.claim("h1")
+
+
+def test_runs_release_only_their_own_claims(tmp_path):
+    path = tmp_path / "index.sqlite"
+    with RenderIndex(path, owner="run-a") as run_a, RenderIndex(path, owner="run-b") as run_b:
+        run_a.claim("h1")
+        run_b.claim("h2")
+
+        assert run_a.release_claims() == 1
+        assert run_a.lookup("h1") is None
+        assert run_a.lookup("h2") == (CLAIMED, None)
+
+
+def test_stale_claims_of_dead_runs_on_this_host_are_released(tmp_path):
+    path = tmp_path / "index.sqlite"
+    with RenderIndex(path, owner=_dead_owner()) as dead:
+        dead.claim("dead")
+    with RenderIndex(path, owner="elsewhere:1") as remote:
+        remote.claim("remote")
+
+    with RenderIndex(path) as index:
+        index.claim("live")
+        assert index.release_stale_claims() == 1
+        assert index.lookup("dead") is None
+        assert index.lookup("remote") == (CLAIMED, None)
+        assert index.lookup("live") == (CLAIMED, None)
+
+
+def _render(recentered, *extra):
+    argv = ["--recentered", str(recentered), "--backend", "raster", "--size", "32", "--end-unit", "40", *extra]
+    fp_renderer.run(fp_renderer.parse_args(argv))
+    return sorted(path.name for path in Path(paths.fp_complete_dir()).glob("*.png"))
+
+
+def test_rerun_skips_units_rendered_with_the_same_configuration(output_root, recentered_parquet):
+    manifest = Path(paths.fp_complete_dir()) / "manifest.csv"
+    first = _render(recentered_parquet, "--naming", "ordinal")
+    assert first
+    rows = manifest.read_text().splitlines()
+    assert len(rows) == len(first) + 1
+
+    assert _render(recentered_parquet, "--naming", "ordinal") == first
+    assert manifest.read_text().splitlines() == rows
+
+    _render(recentered_parquet, "--naming", "ordinal", "--color-by", "entity_subtype")
+    assert len(manifest.read_text().splitlines()) == 2 * len(first) + 1
+
+
+def test_lower_rank_takes_over_a_claim_of_the_same_run(tmp_path):
+    path = tmp_path / "index.sqlite"
+    renders = [tmp_path / "FP_3.png", tmp_path / "FP_5.png"]
+    for render in renders:
+        render.write_bytes(b"png")
+    with RenderIndex(path, owner="run") as late, RenderIndex(path, owner="run") as early:
+        assert late.claim("h1", rank=5)
+        assert early.claim("h1", rank=3)
+        late.finish("h1", renders[1])
+        assert early.lookup("h1") == (CLAIMED, None)
+
+        early.finish("h1", renders[0])
+        assert not late.claim("h1", rank=7)
+        assert early.lookup("h1") == (RENDERED, str(renders[0]))
+
+    with RenderIndex(path, owner="next-run") as rerun:
+        assert not rerun.claim("h1", rank=0)
+
+
+def test_parallel_render_keeps_the_units_of_a_serial_run(tmp_path, monkeypatch, recentered_parquet):
+    outputs = {}
+    for workers in ("1", "3"):
+        monkeypatch.setenv("VSS_OUTPUT_ROOT", str(tmp_path / workers))
+        files = _render(recentered_parquet, "--naming", "ordinal", "--no-index", "--workers", workers)
+        manifest = (Path(paths.fp_complete_dir()) / "manifest.csv").read_text().splitlines()
+        outputs[workers] = files, sorted(manifest)
+    assert outputs["3"] == outputs["1"]
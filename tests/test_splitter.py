@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import csv
+import os
+
+from PIL import Image
+
+from vssv1 import splitter
+
+
+def _write_images(folder, names, value=0):
+    folder.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        Image.new("L", (8, 8), value).save(folder / name)
+
+
+def _write_manifest(path, rows):
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["file", "site_id", "apartment_id", "hash"])
+        writer.writerows(rows)
+
+
+def _split(source, tmp_path, *extra):
+    argv = [
+        "--source", str(source),
+        "--train-dir", str(tmp_path / "splits" / "train"),
+        "--test-dir", str(tmp_path / "splits" / "test"),
+        "--manifest", str(source / "manifest.csv"),
+        *extra,
+    ]
+    splitter.run(splitter.parse_args(argv))
+    with open(tmp_path / "splits" / "split.csv", newline="") as handle:
+        return {os.path.basename(row["file"]): (row["split"], row["key"]) for row in csv.DictReader(handle)}
+
+
+def test_split_is_stable_and_keeps_units_together(tmp_path):
+    source = tmp_path / "renders"
+    names = [f"FP_{number:04d}.png" for number in range(40)]
+    _write_images(source, names)
+    rows = [[name, number // 6, f"unit{number // 2}", ""] for number, name in enumerate(names)]
+    _write_manifest(source / "manifest.csv", rows)
+
+    first = _split(source, tmp_path)
+    assert _split(source, tmp_path) == first
+    assert not (source / "split.csv").exists()
+
+    for number in range(0, 40, 2):
+        assert first[names[number]] == first[names[number + 1]]
+    assert {split for split, _key in first.values()} == {"train", "test"}
+    for split in splitter.SPLITS:
+        assigned = sorted(name for name, (side, _key) in first.items() if side == split)
+        assert sorted(path.name for path in splitter.list_images(tmp_path / "splits" / split)) == assigned
+
+
+def test_copies_are_refreshed_when_a_same_size_source_changes(tmp_path):
+    source = tmp_path / "renders"
+    _write_images(source, ["FP_0001.png"], value=10)
+    dest_dir = tmp_path / "copies"
+    files = splitter.list_images(source)
+
+    assert splitter.sync_split_dir(files, dest_dir, "copy")["added"] == 1
+    assert splitter.sync_split_dir(files, dest_dir, "copy")["kept"] == 1
+
+    _write_images(source, ["FP_0001.png"], value=200)
+    os.utime(source / "FP_0001.png", ns=(0, (dest_dir / "FP_0001.png").stat().st_mtime_ns + 10**9))
+    assert (source / "FP_0001.png").stat().st_size == (dest_dir / "FP_0001.png").stat().st_size
+    assert splitter.sync_split_dir(files, dest_dir, "copy")["added"] == 1
+    assert (dest_dir / "FP_0001.png").read_bytes() == (source / "FP_0001.png").read_bytes()
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Benchmark suite over synthetic Swiss Dwellings-like data (vssv1.synthetic).
+# Each benchmark runs in a fresh spawned process, so its peak RSS is its own;
+# results (throughput and peak RSS) are printed, appended to a JSON-lines file
+# and optionally compared against an earlier run to catch regressions.
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+BENCHMARKS = ("recenter", "bounds", "render_matplotlib", "render_raster", "outline", "pairs")
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+
+def bench_recenter(work: Path, args) -> tuple[int, str, float]:
+    from vssv1 import recenter
+
+    stage_args = recenter.parse_args(
+        [
+            "--input-csv", str(work / "geometries.csv"),
+            "--group-id", "apartment_id",
+            "--output", str(work / "recentered.parquet"),
+            "--workers", str(args.workers),
+        ]
+    )
+    start = time.perf_counter()
+    df = recenter.run(stage_args)
+    return df["apartment_id"].nunique(), "units", time.perf_counter() - start
+
+
+def bench_bounds(work: Path, args) -> tuple[int, str, float]:
+    from vssv1 import boundaries, geostore
+
+    df = geostore.read_geometries(work / "recentered.parquet", columns=["apartment_id", "recentered_geometry"])
+    start = time.perf_counter()
+    boundaries.percentile_bounds(df, 5)
+    return df["apartment_id"].nunique(), "units", time.perf_counter() - start
+
+
+def bench_render_matplotlib(work: Path, args) -> tuple[int, str, float]:
+    # The full fp_renderer run (unit index, dedupe, manifest) on the matplotlib
+    # backend, serial like render_raster.
+    from vssv1 import bookie, fp_renderer, geostore
+
+    df = geostore.read_geometries(work / "recentered.parquet", columns=["site_id", "apartment_id"])
+    units, _unit_rows = bookie.build_unit_index(df, "apartment_id")
+    stage_args = fp_renderer.parse_args(
+        [
+            "--recentered", str(work / "recentered.parquet"),
+            "--backend", "matplotlib",
+            "--end-row", str(args.render_rows - 1),
+            "--no-index",
+        ]
+    )
+    start = time.perf_counter()
+    fp_renderer.run(stage_args)
+    return int((units["start"] < args.render_rows).sum()), "units", time.perf_counter() - start
+
+
+def bench_render_raster(work: Path, args) -> tuple[int, str, float]:
+    from vssv1 import bookie, fp_renderer, geostore
+    from vssv1.render_index import RenderIndex
+
+    # Separate output root so these renders do not feed outline/pairs.
+    os.environ["VSS_OUTPUT_ROOT"] = str(work / "raster")
+    df = geostore.read_geometries(work / "recentered.parquet")
+    units, unit_rows = bookie.build_unit_index(df, "apartment_id")
+    units = units[units["start"] < args.render_rows]
+    index = RenderIndex()
+    start = time.perf_counter()
+    for unit in units.itertuples(index=False):
+        fp_renderer.render_unit(
+            df.iloc[unit_rows[unit.start : unit.stop]], index, "entity_type", 12, 2.0, 600, False,
+            backend="raster", size=args.size,
+        )
+    return len(units), "units", time.perf_counter() - start
+
+
+def bench_outline(work: Path, args) -> tuple[int, str, float]:
+    from vssv1 import init_outline, paths
+
+    tasks = init_outline.batch_tasks(
+        paths.fp_complete_dir(),
+        paths.ensure_dir(paths.fp_outline_dir()),
+        paths.ensure_dir(paths.fp_xray_dir()),
+        contour=True,
+        xray=True,
+        overwrite=True,
+    )
+    start = time.perf_counter()
+    done = init_outline.run_batch(tasks, args.workers, chunksize=16)
+    return done, "images", time.perf_counter() - start
+
+
+def bench_pairs(work: Path, args) -> tuple[int, str, float]:
+    from vssv1 import pairs, paths
+
+    output_dir = work / "pairs"
+    sys.argv = [
+        "make_pix2pix_pairs.py",
+        "--input-dir", str(paths.fp_outline_dir()),
+        "--target-dir", str(paths.fp_complete_dir()),
+        "--output-dir", str(output_dir),
+        "--size", str(args.size),
+        "--match", "order",
+        "--workers", str(args.workers),
+        "--overwrite",
+    ]
+    start = time.perf_counter()
+    pairs.main()
+    elapsed = time.perf_counter() - start
+    return len(pairs.list_images(output_dir)), "pairs", elapsed
+
+
+def _run_one(name: str, work: Path, args, quiet: bool) -> dict:
+    # Runs in the spawned child.
+    sink = open(os.devnull, "w") if quiet else None
+    with contextlib.ExitStack() as stack:
+        if sink:
+            stack.enter_context(sink)
+            stack.enter_context(contextlib.redirect_stdout(sink))
+            stack.enter_context(contextlib.redirect_stderr(sink))
+        import matplotlib
+
+        matplotlib.use("Agg")
+        baseline = peak_rss_mb()
+        items, unit, seconds = globals()[f"bench_{name}"](work, args)
+    return {
+        "benchmark": name,
+        "items": items,
+        "unit": unit,
+        "seconds": round(seconds, 4),
+        "throughput": round(items / seconds, 3) if seconds > 0 else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "import_rss_mb": round(baseline, 1),
+    }
+
+
+def run_isolated(name: str, work: Path, args) -> dict:
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_run_one, name, work, args, not args.verbose).result()
+
+
+def git_revision() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def load_baseline(path: Path) -> dict:
+    # Last result per benchmark in a JSON-lines results file.
+    baseline = {}
+    for line in path.read_text().splitlines():
+        if line.strip():
+            record = json.loads(line)
+            baseline[record["benchmark"]] = record
+    return baseline
+
+
+def regressions(result: dict, reference: dict, tolerance: float) -> list[str]:
+    found = []
+    if result["throughput"] and reference.get("throughput"):
+        if result["throughput"] < reference["throughput"] * (1 - tolerance):
+            found.append(f"throughput {result['throughput']:.2f} < {reference['throughput']:.2f} {result['unit']}/s")
+    if reference.get("peak_rss_mb") and result["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + tolerance):
+        found.append(f"peak RSS {result['peak_rss_mb']:.0f} > {reference['peak_rss_mb']:.0f} MB")
+    return found
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic floorplans.")
+    parser.add_argument("--units", type=int, default=200, help="Approximate number of synthetic apartments.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data.")
+    parser.add_argument(
+        "--render-rows",
+        type=int,
+        default=2000,
+        help="Render the units starting in the first N rows (rendering dominates the runtime).",
+    )
+    parser.add_argument("--size", type=int, default=512, help="Raster render and pair size in pixels.")
+    parser.add_argument("--workers", type=int, default=1, help="Workers for stages that support a process pool.")
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=BENCHMARKS,
+        default=None,
+        help="Run only these benchmarks (later ones need the outputs of earlier ones).",
+    )
+    parser.add_argument("--workdir", type=Path, default=None, help="Keep data and outputs here instead of a temp dir.")
+    parser.add_argument(
+        "--results",
+        type=Path,
+        default=None,
+        help="Append results as JSON lines to this file.",
+    )
+    parser.add_argument("--baseline", type=Path, default=None, help="JSON-lines results to compare against.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative throughput drop / peak RSS growth against --baseline.",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Show the stages' own output.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    with contextlib.ExitStack() as stack:
+        work = args.workdir or Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="vssv1_bench_")))
+        work.mkdir(parents=True, exist_ok=True)
+        # Children inherit these, so every stage reads and writes inside work.
+        os.environ["VSS_DATA_ROOT"] = str(work / "data")
+        os.environ["VSS_OUTPUT_ROOT"] = str(work / "outputs")
+
+        from vssv1 import synthetic
+
+        csv_path = work / "geometries.csv"
+        if not csv_path.exists():
+            synthetic.run(synthetic.parse_args(["--units", str(args.units), "--seed", str(args.seed), "--output", str(csv_path)]))
+
+        baseline = load_baseline(args.baseline) if args.baseline else {}
+        run_info = {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "units": args.units,
+            "seed": args.seed,
+            "workers": args.workers,
+            "size": args.size,
+        }
+        results = []
+        failed = []
+        print(f"\n{'benchmark':<18}{'items':>8}{'seconds':>10}{'throughput':>18}{'peak RSS':>12}")
+        for name in args.only or BENCHMARKS:
+            result = run_isolated(name, work, args)
+            results.append(result)
+            rate = f"{result['throughput']:.2f} {result['unit']}/s" if result["throughput"] else "-"
+            print(
+                f"{name:<18}{result['items']:>8}{result['seconds']:>10.2f}{rate:>18}{result['peak_rss_mb']:>9.0f} MB"
+            )
+            if name in baseline:
+                for problem in regressions(result, baseline[name], args.tolerance):
+                    failed.append(f"{name}: {problem}")
+
+        if args.results:
+            args.results.parent.mkdir(parents=True, exist_ok=True)
+            with open(args.results, "a") as handle:
+                for result in results:
+                    handle.write(json.dumps({**run_info, **result}) + "\n")
+            print(f"\nresults appended to {args.results}")
+
+    if failed:
+        print("\nregressions against the baseline:")
+        for problem in failed:
+            print(f"  {problem}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmark import REPO_ROOT, git_revision, load_baseline
+
+# Startup benchmark for the vssv1 CLI. Each case runs `python -m vssv1 ...` in
+# a fresh interpreter, best of --repeat, and records which heavy third-party
+# modules the run imported. Importing a module outside a case's allowance
+# fails the run (deterministic, unlike timings); so does a startup time more
+# than --tolerance slower than --baseline.
+
+HEAVY_MODULES = ("numpy", "pandas", "shapely", "pyarrow", "PIL", "cv2", "matplotlib", "geopandas", "line_profiler")
+
+# case name -> (CLI arguments, heavy modules the case may import). The stage
+# modules defer numpy, pandas, shapely, pyarrow and cv2 through vssv1.lazy, so
+# their --help loads none of them.
+CASES = {
+    "help": (["--help"], set()),
+    "synthetic": (["synthetic", "--help"], set()),
+    "recenter": (["recenter", "--help"], set()),
+    "render": (["render", "--help"], set()),
+    "outline": (["outline", "--help"], set()),
+    "bounds": (["bounds", "--help"], set()),
+    "pipeline": (["pipeline", "--help"], set()),
+    "pairs": (["pairs", "--help"], {"numpy", "PIL"}),
+    "split": (["split", "--help"], set()),
+    "mix": (["mix", "--help"], {"numpy", "PIL"}),
+}
+
+# vssv1.lazy registers deferred modules in sys.modules up front; they only
+# count once executed, when they stop being _LazyModule instances.
+_PROBE = """
+import json, sys
+from vssv1 import cli
+try:
+    cli.main({argv!r})
+except SystemExit:
+    pass
+modules = {{name: sys.modules[name] for name in {heavy!r} if name in sys.modules}}
+loaded = [name for name, module in modules.items() if type(module).__name__ != "_LazyModule"]
+print("\\n" + json.dumps(sorted(loaded)))
+"""
+
+
+def run_case(argv: list[str], env: dict) -> tuple[float, list[str]]:
+    code = _PROBE.format(argv=argv, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - start
+    return elapsed, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def interpreter_startup(env: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Time vssv1 CLI startup and check which heavy modules it imports.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case; the fastest counts.")
+    parser.add_argument("--only", nargs="+", choices=CASES, default=None, help="Run only these cases.")
+    parser.add_argument("--results", type=Path, default=None, help="Append results as JSON lines to this file.")
+    parser.add_argument("--baseline", type=Path, default=None, help="JSON-lines results to compare against.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative startup time growth against --baseline.",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_ROOT / "src"), os.getenv("PYTHONPATH")]))}
+    # Warm the bytecode and filesystem caches so the first case is not penalized.
+    run_case(["--help"], env)
+
+    base = min(interpreter_startup(env) for _ in range(args.repeat))
+    baseline = load_baseline(args.baseline) if args.baseline else {}
+    run_info = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "interpreter_seconds": round(base, 4),
+    }
+    results = []
+    failed = []
+    print(f"\n{'case':<12}{'seconds':>10}{'over python':>14}  heavy modules")
+    for name in args.only or CASES:
+        argv, allowed = CASES[name]
+        timings = []
+        for _ in range(args.repeat):
+            seconds, loaded = run_case(argv, env)
+            timings.append(seconds)
+        seconds = min(timings)
+        result = {"benchmark": f"startup:{name}", "argv": argv, "seconds": round(seconds, 4), "modules": loaded}
+        results.append(result)
+        print(f"{name:<12}{seconds:>10.3f}{seconds - base:>14.3f}  {', '.join(loaded) or '-'}")
+
+        unexpected = sorted(set(loaded) - allowed)
+        if unexpected:
+            failed.append(f"{name}: imports {', '.join(unexpected)}")
+        reference = baseline.get(result["benchmark"])
+        if reference and seconds > reference["seconds"] * (1 + args.tolerance):
+            failed.append(f"{name}: {seconds:.3f}s > {reference['seconds']:.3f}s")
+
+    if args.results:
+        args.results.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.results, "a") as handle:
+            for result in results:
+                handle.write(json.dumps({**run_info, **result}) + "\n")
+        print(f"\nresults appended to {args.results}")
+
+    if failed:
+        print("\nstartup regressions:")
+        for problem in failed:
+            print(f"  {problem}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()